@@ -0,0 +1,120 @@
+import contextlib
+import json
+import multiprocessing
+import os
+import pickle
+
+# 工作进程使用的 (词法分析器, 语法分析器)
+workerAnalyzers = None
+
+
+def initWorker(blob):
+    """
+    工作进程初始化，不支持fork的平台上从序列化的分析器恢复
+    """
+    global workerAnalyzers
+    if blob is not None:
+        workerAnalyzers = pickle.loads(blob)
+
+
+def compileFile(codeFile):
+    """
+    在工作进程中对一个源文件做词法分析和语法分析，分析过程的输出全部丢弃
+
+    Returns:
+        {"file": 源文件, "status": ok / io_error / decode_error / lexical_error / syntax_error,
+        "line": 第一个错误的行号, "errors": 所有语法错误的行号, "tokens": token数}；
+        源文件无法读取或解码时只影响这一个文件的结果
+    """
+    LA, SA = workerAnalyzers
+    if not os.path.isfile(codeFile):
+        return {"file": codeFile, "status": "io_error", "line": None, "errors": [], "tokens": 0}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        LA.analyze(codeFile)
+        if LA.error is not None and "reason" in LA.error:
+            return {"file": codeFile, "status": LA.error["reason"], "line": LA.error["line"], "errors": [],
+                    "tokens": len(LA.TokenStream)}
+        if LA.error is not None:
+            return {"file": codeFile, "status": "lexical_error", "line": LA.error["line"],
+                    "errors": [LA.error["line"]], "tokens": len(LA.TokenStream)}
+        result = SA.parse(LA.TokenStream)
+        if result["accepted"]:
+            return {"file": codeFile, "status": "ok", "line": None, "errors": [], "tokens": len(LA.TokenStream)}
+        lines = [LA.TokenStream.line(i) if i < len(LA.TokenStream) else -1 for i in result["errors"]]
+        return {"file": codeFile, "status": "syntax_error", "line": SA.error["line"] if SA.error else None,
+                "errors": lines, "tokens": len(LA.TokenStream)}
+
+
+class BatchCompile:
+    """
+    多文件批量分析
+
+    文法只构建一次，源文件分发到进程池中并行分析。支持fork的平台上工作进程直接继承
+    已构建的分析器，否则把分析器序列化后传给每个工作进程。
+
+    Attributes:
+        LA: 词法分析器
+        SA: 语法分析器
+        jobs: 工作进程数
+    """
+    LA = None
+    SA = None
+    jobs = 1
+
+    def __init__(self, LA, SA, jobs=None):
+        """
+        Args:
+            LA: LexicalAnalyze对象
+            SA: SyntaxAnalyzer对象
+            jobs: 工作进程数，为None时使用CPU核数
+        """
+        self.LA = LA
+        self.SA = SA
+        self.jobs = jobs if jobs is not None else os.cpu_count() or 1
+
+    def collectFiles(self, paths):
+        """
+        展开命令行给出的路径，目录按文件名顺序递归展开为其中的所有文件
+        """
+        files = list()
+        for path in paths:
+            if os.path.isdir(path):
+                for root, dirs, names in os.walk(path):
+                    dirs.sort()
+                    for name in sorted(names):
+                        files.append(os.path.join(root, name))
+            else:
+                files.append(path)
+        return files
+
+    def run(self, paths):
+        """
+        批量分析
+
+        Args:
+            paths: 源文件或目录列表
+
+        Returns:
+            每个源文件的分析结果列表，顺序与输入相同，格式见compileFile
+        """
+        global workerAnalyzers
+        files = self.collectFiles(paths)
+        workerAnalyzers = (self.LA, self.SA)
+        if self.jobs <= 1 or len(files) <= 1:
+            return [compileFile(codeFile) for codeFile in files]
+        if multiprocessing.get_start_method() == "fork":
+            blob = None  # 工作进程fork时继承workerAnalyzers
+        else:
+            blob = pickle.dumps(workerAnalyzers, protocol=pickle.HIGHEST_PROTOCOL)
+        chunkSize = max(1, len(files) // (self.jobs * 8))
+        with multiprocessing.Pool(self.jobs, initializer=initWorker, initargs=(blob,)) as pool:
+            return pool.map(compileFile, files, chunkSize)
+
+    def summary(self, results):
+        """
+        Returns:
+            json格式的汇总结果
+        """
+        failed = [result for result in results if result["status"] != "ok"]
+        return json.dumps({"total": len(results), "ok": len(results) - len(failed), "failed": len(failed),
+                           "files": results}, ensure_ascii=False, indent=2)
@@ -0,0 +1,216 @@
+from collections import deque
+
+
+class GrammarAnalysis:
+    """
+    二型文法分析，计算nullable、FIRST集和FOLLOW集
+
+    终结符和非终结符分别编号，<#> 固定为0号终结符，出现在产生式左部的符号为非终结符，
+    其余符号均为终结符。FIRST集和FOLLOW集用整数按位表示，第i位为1表示包含i号终结符，
+    FIRST集中不再存放 <#>，能否推导出空由nullable单独记录。
+
+    Attributes:
+        productions: 拓展后的产生式列表，0号产生式为开始产生式
+        terminals, nonterminals: 按编号排列的终结符和非终结符
+        terminalIDs, nonterminalIDs: 符号到编号的映射
+        nullable: nullable[非终结符编号] 为该非终结符能否推导出空
+        first: first[非终结符编号] 为其FIRST集
+        follow: follow[非终结符编号] 为其FOLLOW集
+        suffixFirst: suffixFirst[产生式][i] 为产生式右部第i个符号起的符号串的 (FIRST集, 能否推导出空)
+    """
+    productions = None
+    terminals = None
+    nonterminals = None
+    terminalIDs = None
+    nonterminalIDs = None
+    nullable = None
+    first = None
+    follow = None
+    suffixFirst = None
+
+    def __init__(self, productions):
+        self.productions = productions
+        self.__numberSymbols()
+        self.__getNullable()
+        self.__getFirst()
+        self.__getSuffixFirst()
+        self.__getFollow()
+
+    def __numberSymbols(self):
+        """
+        给文法符号编号，非终结符按左部出现的顺序，终结符按右部出现的顺序
+        """
+        self.terminals = ["<#>"]
+        self.nonterminals = list()
+        self.terminalIDs = {"<#>": 0}
+        self.nonterminalIDs = dict()
+        for eachProduction in self.productions:
+            if eachProduction['left'] not in self.nonterminalIDs:
+                self.nonterminalIDs[eachProduction['left']] = len(self.nonterminals)
+                self.nonterminals.append(eachProduction['left'])
+        for eachProduction in self.productions:
+            for eachRight in eachProduction['right']:
+                if eachRight not in self.nonterminalIDs and eachRight not in self.terminalIDs:
+                    self.terminalIDs[eachRight] = len(self.terminals)
+                    self.terminals.append(eachRight)
+
+    def __propagate(self, sets, includes):
+        """
+        集合包含关系求解，即DeRemer-Pennello的digraph算法：
+        按深度优先找出强连通分量，同一分量内的集合相同，每条包含关系只做一次并集，
+        计算量与文法规模成线性关系
+
+        Args:
+            sets: 每个非终结符的初始集合，原地更新为最终结果
+            includes: includes[i] 为集合被sets[i]包含的非终结符编号列表
+        """
+        depth = [0] * len(sets)
+        entry = [0] * len(sets)  # 进入节点时的栈深度
+        finished = len(sets) + 1
+        stack = list()
+        for root in range(len(sets)):
+            if depth[root] != 0:
+                continue
+            stack.append(root)
+            depth[root] = entry[root] = len(stack)
+            path = [(root, iter(includes[root]))]
+            while path:
+                x, successors = path[-1]
+                y = next(successors, None)
+                if y is not None:
+                    if depth[y] == 0:
+                        stack.append(y)
+                        depth[y] = entry[y] = len(stack)
+                        path.append((y, iter(includes[y])))
+                    else:
+                        depth[x] = min(depth[x], depth[y])
+                        sets[x] |= sets[y]
+                    continue
+                path.pop()
+                if path:
+                    parent = path[-1][0]
+                    depth[parent] = min(depth[parent], depth[x])
+                    sets[parent] |= sets[x]
+                if depth[x] == entry[x]:
+                    # x是强连通分量的根，分量内的集合与根相同
+                    while True:
+                        top = stack.pop()
+                        depth[top] = finished
+                        sets[top] = sets[x]
+                        if top == x:
+                            break
+
+    def __getNullable(self):
+        """
+        nullable计算，记录每条产生式右部中还不确定能推导出空的符号数量，
+        某个非终结符确定能推导出空时，只更新右部含有它的产生式
+        """
+        self.nullable = [False] * len(self.nonterminals)
+        remaining = list()
+        occurrences = [[] for i in self.nonterminals]
+        workList = deque()
+        for productionIdx in range(len(self.productions)):
+            right = self.productions[productionIdx]['right']
+            remaining.append(len(right))
+            for eachRight in right:
+                if eachRight in self.nonterminalIDs:
+                    occurrences[self.nonterminalIDs[eachRight]].append(productionIdx)
+            if len(right) == 0:
+                workList.append(self.nonterminalIDs[self.productions[productionIdx]['left']])
+        while workList:
+            symbol = workList.popleft()
+            if self.nullable[symbol]:
+                continue
+            self.nullable[symbol] = True
+            for productionIdx in occurrences[symbol]:
+                remaining[productionIdx] -= 1
+                if remaining[productionIdx] == 0:
+                    workList.append(self.nonterminalIDs[self.productions[productionIdx]['left']])
+
+    def __getFirst(self):
+        """
+        FIRST集计算，A -> Y1 Y2 ... 中 Y1...Yi-1 均可推导出空时 FIRST(A) 包含 FIRST(Yi)
+        """
+        self.first = [0] * len(self.nonterminals)
+        includes = [[] for i in self.nonterminals]
+        for eachProduction in self.productions:
+            left = self.nonterminalIDs[eachProduction['left']]
+            for eachRight in eachProduction['right']:
+                if eachRight in self.nonterminalIDs:
+                    symbol = self.nonterminalIDs[eachRight]
+                    if symbol != left:
+                        includes[left].append(symbol)
+                    if not self.nullable[symbol]:
+                        break
+                else:
+                    self.first[left] |= 1 << self.terminalIDs[eachRight]
+                    break
+        self.__propagate(self.first, includes)
+
+    def __getSuffixFirst(self):
+        """
+        预先计算每条产生式右部每个后缀的FIRST集
+        """
+        self.suffixFirst = list()
+        for eachProduction in self.productions:
+            right = eachProduction['right']
+            suffix = [None] * len(right) + [(0, True)]
+            for i in range(len(right) - 1, -1, -1):
+                if right[i] in self.nonterminalIDs:
+                    symbol = self.nonterminalIDs[right[i]]
+                    if self.nullable[symbol]:
+                        suffix[i] = (self.first[symbol] | suffix[i + 1][0], suffix[i + 1][1])
+                    else:
+                        suffix[i] = (self.first[symbol], False)
+                else:
+                    suffix[i] = (1 << self.terminalIDs[right[i]], False)
+            self.suffixFirst.append(suffix)
+
+    def __getFollow(self):
+        """
+        FOLLOW集计算，A -> αBβ 中 FOLLOW(B) 包含 FIRST(β)，β可推导出空时还包含 FOLLOW(A)
+        """
+        self.follow = [0] * len(self.nonterminals)
+        self.follow[self.nonterminalIDs[self.productions[0]['left']]] = 1 << self.terminalIDs["<#>"]
+        includes = [[] for i in self.nonterminals]
+        for productionIdx in range(len(self.productions)):
+            right = self.productions[productionIdx]['right']
+            left = self.nonterminalIDs[self.productions[productionIdx]['left']]
+            for i in range(len(right)):
+                if right[i] in self.nonterminalIDs:
+                    symbol = self.nonterminalIDs[right[i]]
+                    first, nullable = self.suffixFirst[productionIdx][i + 1]
+                    self.follow[symbol] |= first
+                    if nullable and symbol != left:
+                        includes[symbol].append(left)
+        self.__propagate(self.follow, includes)
+
+    def isNonterminal(self, symbol):
+        return symbol in self.nonterminalIDs
+
+    def symbolsOf(self, bits):
+        """
+        将按位表示的终结符集合转换为按编号排列的终结符元组
+        """
+        result = list()
+        terminalID = 0
+        while bits:
+            if bits & 1:
+                result.append(self.terminals[terminalID])
+            bits >>= 1
+            terminalID += 1
+        return tuple(result)
+
+    def firstOf(self, symbol):
+        """
+        Returns:
+            非终结符的FIRST集中的终结符元组
+        """
+        return self.symbolsOf(self.first[self.nonterminalIDs[symbol]])
+
+    def followOf(self, symbol):
+        """
+        Returns:
+            非终结符的FOLLOW集中的终结符元组
+        """
+        return self.symbolsOf(self.follow[self.nonterminalIDs[symbol]])
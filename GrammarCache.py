@@ -0,0 +1,180 @@
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+from array import array
+
+# 缓存格式版本，缓存内容的结构发生变化时需要递增
+CACHE_FORMAT_VERSION = 14
+CACHE_MAGIC = b"GRMC"
+# 文件头: 魔数(4字节) + 格式版本(2字节) + 文法内容摘要(32字节)
+CACHE_HEADER = struct.Struct("<4sH32s")
+# 文件头之后: 元数据json的字节数(4字节)
+CACHE_META = struct.Struct("<I")
+
+
+class GrammarCache:
+    """
+    编译后文法的磁盘缓存
+
+    以文法文件名区分缓存文件，文件头记录格式版本和文法文件内容的摘要，
+    加载时两者任意一个不一致即视为过期缓存，删除后重新生成。
+
+    缓存的对象是 {名称: 值} 的字典，值为array的按机器字节序原样写在元数据之后，读取时从映射的文件直接复制为array；
+    其余的值写在元数据json中，必须能用json表示 (元组读回后为列表，字典的键必须是字符串)。
+
+    Attributes:
+        cacheDir: 缓存目录
+    """
+    cacheDir = ""
+
+    def __init__(self, cacheDir=".grammarcache"):
+        self.cacheDir = cacheDir
+
+    def __digest(self, grammarFile, kind, options):
+        """
+        计算文法文件内容摘要，构建选项不同的结果也要区分开
+
+        Returns:
+            32字节的sha256摘要，文法文件无法读取时返回None
+        """
+        try:
+            content = open(grammarFile, "rb").read()
+        except OSError:
+            return None
+        sha = hashlib.sha256()
+        sha.update(content)
+        sha.update(("\0%s\0%s" % (kind, repr(options))).encode("utf-8"))
+        return sha.digest()
+
+    def __path(self, grammarFile, kind, options):
+        """
+        缓存文件路径，同一文法文件同一类型同一选项只保留一份缓存
+        """
+        pathHash = hashlib.sha1(("%s\0%s" % (os.path.abspath(grammarFile), repr(options))).encode("utf-8"))
+        pathHash = pathHash.hexdigest()[:16]
+        name = "%s_%s_%s.bin" % (kind, os.path.splitext(os.path.basename(grammarFile))[0], pathHash)
+        return os.path.join(self.cacheDir, name)
+
+    def load(self, grammarFile, kind, options=()):
+        """
+        读取缓存
+
+        Args:
+            grammarFile: 文法文件
+            kind: 缓存类型，如lexical，syntax
+            options: 影响构建结果的选项
+
+        Returns:
+            缓存的对象，缓存不存在或已过期时返回None
+        """
+        digest = self.__digest(grammarFile, kind, options)
+        if digest is None:
+            return None
+        path = self.__path(grammarFile, kind, options)
+        try:
+            f = open(path, "rb")
+        except OSError:
+            return None
+        with f:
+            try:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                mm = None  # 空文件无法映射
+            if mm is None or len(mm) < CACHE_HEADER.size:
+                stale = True
+            else:
+                magic, version, savedDigest = CACHE_HEADER.unpack_from(mm, 0)
+                stale = magic != CACHE_MAGIC or version != CACHE_FORMAT_VERSION or savedDigest != digest
+            result = None
+            if not stale:
+                view = memoryview(mm)
+                try:
+                    result = self.__decode(view)
+                except Exception:
+                    stale = True  # 缓存文件损坏
+                finally:
+                    view.release()
+                if result is None:
+                    stale = True
+            if mm is not None:
+                mm.close()
+        if stale:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return result
+
+    def __decode(self, view):
+        """
+        解析文件头之后的元数据和数组
+
+        Returns:
+            缓存的字典，字节序或数组元素大小与本机不同时返回None
+        """
+        (metaLength,) = CACHE_META.unpack_from(view, CACHE_HEADER.size)
+        metaStart = CACHE_HEADER.size + CACHE_META.size
+        meta = json.loads(bytes(view[metaStart:metaStart + metaLength]).decode("utf-8"))
+        if meta["byteorder"] != sys.byteorder:
+            return None
+        result = meta["values"]
+        dataStart = metaStart + metaLength
+        for name, (typecode, itemSize, offset, count) in meta["arrays"].items():
+            table = array(typecode)
+            start = dataStart + offset
+            if table.itemsize != itemSize or start + itemSize * count > len(view):
+                return None
+            with view[start:start + itemSize * count] as data:
+                table.frombytes(data)
+            result[name] = table
+        return result
+
+    def store(self, grammarFile, kind, obj, options=()):
+        """
+        写入缓存，先写临时文件再替换，避免并发读到写了一半的文件。
+        mkstemp创建的临时文件权限为0600，替换前按umask改为普通文件的权限，其他用户也能读到共享的缓存
+        """
+        digest = self.__digest(grammarFile, kind, options)
+        if digest is None:
+            return
+        values = dict()
+        arrays = dict()
+        offset = 0
+        for name, value in obj.items():
+            if isinstance(value, array):
+                arrays[name] = [value.typecode, value.itemsize, offset, len(value)]
+                offset += value.itemsize * len(value)
+            else:
+                values[name] = value
+        meta = json.dumps({"byteorder": sys.byteorder, "values": values, "arrays": arrays},
+                          ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        tmpPath = None
+        try:
+            os.makedirs(self.cacheDir, exist_ok=True)
+            fd, tmpPath = tempfile.mkstemp(dir=self.cacheDir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(CACHE_HEADER.pack(CACHE_MAGIC, CACHE_FORMAT_VERSION, digest))
+                f.write(CACHE_META.pack(len(meta)))
+                f.write(meta)
+                for name in arrays:
+                    obj[name].tofile(f)
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(tmpPath, 0o666 & ~umask)
+            os.replace(tmpPath, self.__path(grammarFile, kind, options))
+        except OSError:
+            print("文法缓存写入失败: " + self.cacheDir)
+            if tmpPath is not None and os.path.exists(tmpPath):
+                os.remove(tmpPath)
+
+    def clear(self):
+        """
+        清空缓存目录
+        """
+        if os.path.isdir(self.cacheDir):
+            shutil.rmtree(self.cacheDir, ignore_errors=True)
@@ -1,7 +1,35 @@
 import json
 import re
+from array import array
+from bisect import bisect_left, bisect_right
 from graphviz import Digraph
-import prettytable as pt
+from TokenStore import TokenStore
+from TraceSink import TableSink
+from Stats import measure
+
+# 三型文法文件中各类token的顺序
+TOKEN_TYPES = ["keyword", "identifier", "constant", "operator", "delimiter"]
+# 同样长度的匹配按此顺序决定token类型，靠前的优先
+TOKEN_PRIORITY = ["keyword", "constant", "identifier", "operator", "delimiter"]
+MAX_CODE_POINT = 0x10FFFF
+# 三型文法中字符别名对应的码点区间
+CHAR_ALIASES = {
+    "digit": ((0x30, 0x39),),
+    "letter": ((0x41, 0x5A), (0x61, 0x7A)),
+    "dot1": ((0, 9), (11, 12), (14, 33), (35, MAX_CODE_POINT)),  # 除 \n \r " 之外的任意字符
+    "dot2": ((0, 9), (11, 12), (14, 38), (40, MAX_CODE_POINT)),  # 除 \n \r ' 之外的任意字符
+    "empty": ()
+}
+# 词法分析过程记录的表头
+LEXICAL_TRACE_FIELDS = ["行号", "类型", "单词"]
+# 词法分析时每次读取源文件的字符数
+CHUNK_SIZE = 1 << 16
+# 字符类中的转义字符
+ESCAPE_CHARS = {"n": "\n", "r": "\r", "t": "\t"}
+# 保留字表最多展开的关键字个数，超过时不使用保留字表
+RESERVED_WORD_LIMIT = 4096
+# 惰性DFA默认最多缓存的状态数
+LAZY_CACHE_SIZE = 4096
 
 
 class NFANode:
@@ -33,13 +61,18 @@ class DFANode:
     Attributes:
         index: DFA节点的编号
         stateType: DFA节点类型，START_NODE, NORMAL_NODE, END_NODE
-        NFAIndex: 该DFA节点等价的NFA节点
+        NFAIndex: 该DFA节点等价的NFA节点编号的frozenset，从缓存加载的DFA中为None
         nextStates: DFA节点后继节点的编号列表
+        tokenType: 接受节点识别出的token类型，非接受节点为None
+        transitions: 等价类到后继节点编号的映射，与nextStates内容相同，供词法分析时查找；
+            惰性DFA中已确认没有转移的等价类映射到None
     """
     index = 0
     stateType = ""
     NFAIndex = None
     nextStates = None
+    tokenType = None
+    transitions = None
 
     def __init__(self, idx, stateType):
         self.index = idx
@@ -50,30 +83,395 @@ class DFANode:
 class LexicalAnalyze:
     """
     词法分析类
+
+    Attributes:
+        grammarFile: 三型文法文件
+        NFAs: 每类token的NFA
+        NFA: 所有类型的NFA合并得到的NFA，接受节点带有token类型；
+            从缓存加载时NFAs和NFA都不构建，为None，打印时由getNFA从文法文件构建
+        DFA: 由NFA确定化得到的DFA，词法分析只使用这一个DFA
+        DFAs: 每类token单独的DFA，只在需要打印时构建
+        classRanges: DFA使用的字符等价类，按码点排序的 (起始码点, 结束码点, 等价类编号) 列表
+        TokenStream: analyze得到的token序列，为TokenStore对象
+        code: 源代码缓冲区，只含有尚未分析的部分
+        codeOffset: 缓冲区开头在源文件中的位置
+        lineCount: 当前分析到的行号
+        maxLookahead: 已分析的token中最大的lookahead，增量分析时用来确定受影响的范围
+        error: 最近一次词法分析出错的位置 {"line": 行号, "token": 出错的行}，分析成功时为None；
+            源文件无法打开、读取或解码时为 {"line": 出错时的行号, "token": 源文件, "reason": "io_error" / "decode_error"}
+        stats: Stats对象，为None时不统计
+        reservedWords: 保留字表，为None时关键字由DFA识别；否则DFA中不含关键字，
+            识别出的单词在表中时改为关键字
+        reservedTypes: 不含关键字的DFA把各个关键字识别为的token类型，只有这些类型的单词才需要查保留字表
+        lazyCacheSize: 惰性DFA最多缓存的状态数，为None时预先构建完整的DFA；
+            惰性DFA的状态和转移在词法分析第一次用到时才计算，DFA中只有已经用到的部分
+        lazyFlushes: 惰性DFA缓存已满被清空的次数
     """
+    grammarFile = None
+    NFAs = None
+    NFA = None
+    DFA = None
+    classRanges = None
     DFAs = None
     TokenStream = None
-    restCode = ""
+    minimize = True
+    code = ""
+    codeOffset = 0
     lineCount = 1
+    maxLookahead = 1
+    error = None
+    stats = None
+    reservedWords = None
+    reservedTypes = None
+    lazyCacheSize = None
+    lazyFlushes = 0
 
-    def __init__(self, grammarFile):
+    def __init__(self, grammarFile, cache=None, minimize=True, stats=None, reservedWords=False, lazyCacheSize=None):
+        """
+        Args:
+            grammarFile: 三型文法文件
+            cache: GrammarCache对象，为None时不使用缓存
+            minimize: 是否对子集构造得到的DFA做最小化
+            stats: Stats对象，统计各阶段的耗时、内存和计数，为None时不统计
+            reservedWords: 是否用保留字表识别关键字，只有关键字有限且不含关键字的DFA能完整识别每个关键字
+                (通常识别为标识符) 时才使用，否则仍由DFA识别关键字
+            lazyCacheSize: 不为None时使用惰性DFA，最多缓存这么多个状态，缓存满时清空重建，不做最小化也不使用缓存；
+                至少为3，保证清空后仍能放下开始状态、当前状态和次态
+        """
         self.DFAs = dict()
-        self.NFAs = dict()
+        self.grammarFile = grammarFile
+        self.minimize = minimize
+        self.stats = stats
+        if lazyCacheSize is not None:
+            self.lazyCacheSize = max(lazyCacheSize, 3)
+            cache = None
+        if cache is not None:
+            with measure(stats, "lexical.cacheLoad"):
+                compiled = cache.load(grammarFile, "lexical", (minimize, reservedWords))
+                if compiled is not None:
+                    self.__unpackDFA(compiled)
+                    self.__buildClassLookup()
+            if compiled is not None:
+                return
+        self.__buildNFAs()
+        if reservedWords:
+            self.reservedWords = self.__getReservedWords()
+        self.__buildDFA()
+        if self.reservedWords is not None:
+            self.reservedTypes = frozenset(self.__wordType(word) for word in self.reservedWords)
+            if None in self.reservedTypes:
+                print("有关键字不能被其他类型的token完整识别，不使用保留字表")
+                self.reservedWords = self.reservedTypes = None
+                self.__buildDFA()
+        if stats is not None:
+            if self.reservedWords is not None:
+                stats.count("lexical.reservedWords", len(self.reservedWords))
+            stats.count("lexical.nfaStates", len(self.NFA))
+            stats.count("lexical.charClasses", len(set(classID for lo, hi, classID in self.classRanges)))
+            if self.lazyCacheSize is None:
+                stats.count("lexical.dfaStates", len(self.DFA))
+                stats.count("lexical.dfaTransitions", sum(len(node.nextStates) for node in self.DFA))
+        if cache is not None:
+            with measure(stats, "lexical.cacheStore"):
+                cache.store(grammarFile, "lexical", self.__packDFA(), (minimize, reservedWords))
+
+    def __buildNFAs(self):
+        """
+        读入三型文法文件，构建每类token的NFA
+        """
         try:
-            grammar = json.load(open(grammarFile, "r"))
+            grammar = json.load(open(self.grammarFile, "r"))
         except Exception as e:
             print("文法文件打开失败")
             exit(0)
-        self.NFAs['keyword'] = self.__getNFA(grammar[0]["contents"])
-        self.DFAs['keyword'] = self.__getDFA(self.NFAs['keyword'])
-        self.NFAs['identifier'] = self.__getNFA(grammar[1]["contents"])
-        self.DFAs['identifier'] = self.__getDFA(self.NFAs['identifier'])
-        self.NFAs['constant'] = self.__getNFA(grammar[2]["contents"])
-        self.DFAs['constant'] = self.__getDFA(self.NFAs['constant'])
-        self.NFAs['operator'] = self.__getNFA(grammar[3]["contents"])
-        self.DFAs['operator'] = self.__getDFA(self.NFAs['operator'])
-        self.NFAs['delimiter'] = self.__getNFA(grammar[4]["contents"])
-        self.DFAs['delimiter'] = self.__getDFA(self.NFAs['delimiter'])
+        self.NFAs = dict()
+        with measure(self.stats, "lexical.nfa"):
+            for i in range(len(TOKEN_TYPES)):
+                self.NFAs[TOKEN_TYPES[i]] = self.__getNFA(grammar[i]["contents"])
+
+    def __combinedTypes(self):
+        """
+        参与合并的token类型，使用保留字表时不合并关键字的NFA
+        """
+        return [typeName for typeName in TOKEN_PRIORITY if self.reservedWords is None or typeName != "keyword"]
+
+    def __buildDFA(self):
+        """
+        合并NFA并确定化为词法分析使用的DFA
+        """
+        with measure(self.stats, "lexical.nfa"):
+            self.NFA, accepts = self.__combineNFA(self.__combinedTypes())
+        if self.lazyCacheSize is not None:
+            self.__initLazyDFA(accepts)
+        else:
+            self.DFA, self.classRanges = self.__getDFA(self.NFA, accepts, "all")
+        self.__buildClassLookup()
+
+    def __packDFA(self):
+        """
+        把DFA的转移和字符等价类展开为一维数组写入缓存，不保存NFA和DFA节点对象。
+        第s个状态的转移在 transitionStarts[s] 到 transitionStarts[s + 1] 之间，classNames为各等价类边上的名称
+        """
+        starts = array('i', [0])
+        classes = array('i')
+        targets = array('i')
+        classNames = dict()
+        for node in self.DFA:
+            for nextState in node.nextStates:
+                classes.append(nextState['class'])
+                targets.append(nextState['index'])
+                classNames[nextState['class']] = nextState['character']
+            starts.append(len(classes))
+        return {
+            "tokenTypes": [node.tokenType for node in self.DFA],
+            "classNames": [classNames.get(i, "") for i in range(max(classNames, default=-1) + 1)],
+            "transitionStarts": starts,
+            "transitionClasses": classes,
+            "transitionTargets": targets,
+            "rangeStarts": array('i', [lo for lo, hi, classID in self.classRanges]),
+            "rangeEnds": array('i', [hi for lo, hi, classID in self.classRanges]),
+            "rangeClasses": array('i', [classID for lo, hi, classID in self.classRanges]),
+            "reservedWords": None if self.reservedWords is None else sorted(self.reservedWords),
+            "reservedTypes": None if self.reservedTypes is None else sorted(self.reservedTypes)
+        }
+
+    def __unpackDFA(self, compiled):
+        """
+        由缓存中的一维数组还原DFA节点和字符等价类，见__packDFA
+        """
+        starts = compiled["transitionStarts"]
+        classes = compiled["transitionClasses"]
+        targets = compiled["transitionTargets"]
+        classNames = compiled["classNames"]
+        self.DFA = list()
+        for state, tokenType in enumerate(compiled["tokenTypes"]):
+            if state == 0:
+                node = DFANode(state, "START_NODE")
+            else:
+                node = DFANode(state, "NORMAL_NODE" if tokenType is None else "END_NODE")
+            node.tokenType = tokenType
+            for i in range(starts[state], starts[state + 1]):
+                node.nextStates.append({"character": classNames[classes[i]], "class": classes[i],
+                                        "index": targets[i]})
+            node.transitions = dict(zip(classes[starts[state]:starts[state + 1]],
+                                        targets[starts[state]:starts[state + 1]]))
+            self.DFA.append(node)
+        self.classRanges = list(zip(compiled["rangeStarts"], compiled["rangeEnds"], compiled["rangeClasses"]))
+        if compiled["reservedWords"] is not None:
+            self.reservedWords = frozenset(compiled["reservedWords"])
+            self.reservedTypes = frozenset(compiled["reservedTypes"])
+
+    def getNFA(self, typeName):
+        """
+        获取某一类token的NFA，用于打印，从缓存加载时先由文法文件构建
+
+        Args:
+            typeName: token类型，all表示合并后的NFA
+
+        Returns:
+            NFA节点列表，不存在该类型时返回None
+        """
+        if self.NFA is None:
+            self.__buildNFAs()
+            self.NFA = self.__combineNFA(self.__combinedTypes())[0]
+        if typeName == "all":
+            return self.NFA
+        return self.NFAs.get(typeName)
+
+    def __getReservedWords(self):
+        """
+        由关键字的DFA枚举出所有关键字
+
+        Returns:
+            关键字集合，关键字有无穷多个或超过RESERVED_WORD_LIMIT个时返回None
+        """
+        DFA, classRanges = self.__getDFA(self.NFAs["keyword"], {1: "keyword"}, "keyword")
+        self.DFAs["keyword"] = DFA
+        classChars = dict()
+        for lo, hi, classID in classRanges:
+            if hi - lo >= RESERVED_WORD_LIMIT:
+                print("关键字过多，不使用保留字表")
+                return None
+            classChars.setdefault(classID, []).extend(chr(codePoint) for codePoint in range(lo, hi + 1))
+        words = set()
+        stack = [(0, "", frozenset([0]))]  # (DFA节点, 已读入的前缀, 路径上的节点)
+        while stack:
+            state, prefix, path = stack.pop()
+            if DFA[state].tokenType is not None:
+                words.add(prefix)
+            for classID, nextState in DFA[state].transitions.items():
+                if nextState in path:
+                    print("关键字有无穷多个，不使用保留字表")
+                    return None
+                for char in classChars[classID]:
+                    stack.append((nextState, prefix + char, path | {nextState}))
+            if len(words) + len(stack) > RESERVED_WORD_LIMIT:
+                print("关键字过多，不使用保留字表")
+                return None
+        return frozenset(words)
+
+    def __wordType(self, word):
+        """
+        Returns:
+            整个单词在DFA上匹配得到的token类型，不能完整匹配时返回None
+        """
+        state = self.DFA[0]
+        for char in word:
+            classID = self.__classOf(char)
+            nextState = state.transitions.get(classID)
+            if nextState is None and self.lazyCacheSize is not None and classID not in state.transitions:
+                nextState = self.__lazyStep(state, classID)
+            if nextState is None:
+                return None
+            state = self.DFA[nextState]
+        return state.tokenType
+
+    def __initLazyDFA(self, accepts):
+        """
+        惰性DFA只预先计算字符等价类、NFA节点的空闭包和按等价类索引的边，DFA中只有开始状态
+
+        Args:
+            accepts: {NFA结束节点编号: token类型}
+        """
+        with measure(self.stats, "lexical.lazyInit"):
+            self.classRanges, labelClasses, self.__lazyClassNames = self.__getCharClasses(self.NFA)
+            self.__lazyClosures = self.__emptyClosures(self.NFA)
+            # 每个NFA节点的非空边，{等价类编号: [后继节点编号]}
+            self.__lazyEdges = list()
+            for node in self.NFA:
+                edges = dict()
+                for nextState in node.nextStates:
+                    if nextState['character'] != "empty":
+                        for eachClass in labelClasses[nextState['character']]:
+                            edges.setdefault(eachClass, []).append(nextState['index'])
+                self.__lazyEdges.append(edges)
+            self.__lazyAccepts = accepts
+            self.DFA = list()
+            self.__lazyIndex = dict()  # NFA节点集合到DFA节点编号的映射
+            self.lazyFlushes = 0
+            self.__addLazyState(self.__lazyClosures[0])
+
+    def __addLazyState(self, NFAIndex):
+        """
+        Returns:
+            新DFA节点的编号
+        """
+        if not self.DFA:
+            node = DFANode(0, "START_NODE")
+        else:
+            acceptTypes = [self.__lazyAccepts[i] for i in NFAIndex if i in self.__lazyAccepts]
+            node = DFANode(len(self.DFA), "END_NODE" if acceptTypes else "NORMAL_NODE")
+            if acceptTypes:
+                node.tokenType = min(acceptTypes, key=TOKEN_PRIORITY.index)
+        node.NFAIndex = NFAIndex
+        node.transitions = dict()
+        self.DFA.append(node)
+        self.__lazyIndex[NFAIndex] = node.index
+        if self.stats is not None:
+            self.stats.count("lexical.lazyStates")
+        return node.index
+
+    def __lazyStep(self, state, classID):
+        """
+        计算惰性DFA中state经等价类classID的转移并缓存，需要新状态而缓存已满时，
+        像RE2一样清空所有状态，只保留开始状态并重新加入state，已经分析到的位置不受影响
+
+        Returns:
+            次态编号，没有转移时返回None，并在transitions中记为None，下次不必再计算
+        """
+        moveStates = set()
+        for i in state.NFAIndex:
+            moveStates.update(self.__lazyEdges[i].get(classID, ()))
+        if not moveStates:
+            state.transitions[classID] = None
+            return None
+        closure = self.__emptyClosure(self.__lazyClosures, moveStates)
+        nextState = self.__lazyIndex.get(closure)
+        if nextState is None:
+            if len(self.DFA) >= self.lazyCacheSize:
+                state = self.__flushLazyDFA(state)
+                nextState = self.__lazyIndex.get(closure)
+            if nextState is None:
+                nextState = self.__addLazyState(closure)
+        state.transitions[classID] = nextState
+        state.nextStates.append({"character": self.__lazyClassNames[classID], "class": classID,
+                                 "index": nextState})
+        return nextState
+
+    def __flushLazyDFA(self, state):
+        """
+        清空惰性DFA的缓存，原地修改DFA列表，正在匹配的__matchToken持有的列表仍然有效
+
+        Returns:
+            重新加入的state对应的新节点
+        """
+        start = self.DFA[0]
+        del self.DFA[1:]
+        start.transitions = dict()
+        start.nextStates = list()
+        self.__lazyIndex = {start.NFAIndex: 0}
+        self.lazyFlushes += 1
+        if self.stats is not None:
+            self.stats.count("lexical.lazyFlushes")
+        if state is start:
+            return start
+        return self.DFA[self.__addLazyState(state.NFAIndex)]
+
+    def __combineNFA(self, typeNames):
+        """
+        合并各类token的NFA，新的开始节点经空边到达各类NFA的开始节点
+
+        Args:
+            typeNames: 参与合并的token类型
+
+        Returns:
+            (合并后的NFA, {结束节点编号: token类型})
+        """
+        result = [NFANode(0, "start", "START")]
+        accepts = dict()
+        for typeName in typeNames:
+            offset = len(result)
+            for node in self.NFAs[typeName]:
+                newNode = NFANode(node.index + offset, node.description, node.stateName)
+                for nextState in node.nextStates:
+                    newNode.nextStates.append({"character": nextState["character"],
+                                               "index": nextState["index"] + offset})
+                result.append(newNode)
+            result[0].nextStates.append({"character": "empty", "index": offset})
+            accepts[offset + 1] = typeName  # 每类NFA的1号节点为结束节点
+        return result, accepts
+
+    def getClassDFA(self, typeName):
+        """
+        获取某一类token单独的DFA，用于打印
+
+        Args:
+            typeName: token类型，all表示合并后的DFA
+        """
+        if typeName == "all":
+            return self.DFA
+        if typeName not in self.DFAs:
+            self.DFAs[typeName] = self.__getDFA(self.getNFA(typeName), {1: typeName}, typeName)[0]
+        return self.DFAs[typeName]
+
+    def __buildClassLookup(self):
+        """
+        构建字符到等价类编号的查找表，ASCII字符直接查表，其余字符二分查找classRanges
+        """
+        self.__classStarts = [lo for lo, hi, classID in self.classRanges]
+        self.__charClass = dict()
+        for codePoint in range(128):
+            self.__charClass[chr(codePoint)] = self.__classOf(chr(codePoint))
+
+    def __classOf(self, char):
+        """
+        Returns:
+            字符所属的等价类编号，不属于任何等价类时返回-1
+        """
+        i = bisect_right(self.__classStarts, ord(char)) - 1
+        if i >= 0 and ord(char) <= self.classRanges[i][1]:
+            return self.classRanges[i][2]
+        return -1
 
     def __findState(self, NFAList, s_idx, state):
         """
@@ -108,7 +506,8 @@ class LexicalAnalyze:
                 dot.node(name=str(i), label=XFAList[i].stateName,
                          shape="doublecircle" if XFAList[i].stateName == "END" else "circle")
             elif FA == "DFA":
-                dot.node(name=str(i), label=str(i),
+                label = str(i) if XFAList[i].tokenType is None else "%d\n%s" % (i, XFAList[i].tokenType)
+                dot.node(name=str(i), label=label,
                          shape="doublecircle" if XFAList[i].stateType == "END_NODE" else "circle")
         for i in range(len(XFAList)):
             if XFAList[i].nextStates:
@@ -171,273 +570,642 @@ class LexicalAnalyze:
                 result[prevStateIDX].nextStates.append({"character": chars, "index": nextStateIDX})
         return result
 
-    def __charEXT(self, charName):
-        """
-        字符拓展函数，用于拓展3型文法中的别名，如digit
-        """
-        charset = set()
-        if charName == "digit":
-            for i in range(10):
-                charset.add(str(i))
-        elif charName == "letter":
-            for i in range(26):
-                charset.add(chr(ord('a') + i))
-                charset.add(chr(ord('A') + i))
-        elif charName == "dot1":
-            for i in range(128):
-                if i != 13 and i != 10 and i != 34:
-                    charset.add(chr(i))
-        elif charName == "dot2":
-            for i in range(128):
-                if i != 13 and i != 10 and i != 39:
-                    charset.add(chr(i))
-        elif charName == "empty":
-            pass
-        else:
-            print("未知符号: " + charName)
-        return charset
+    def __charRanges(self, charName):
+        """
+        字符拓展函数，将3型文法中的终结符转换为码点区间，终结符可以是单个字符、
+        别名如digit，或者用方括号声明的字符类如 [a-zA-Z_]、[\\u4e00-\\u9fff]，
+        方括号内可用 \\ 转义，支持 \\n \\r \\t 和 \\uXXXX
 
-    def __getCharset(self, NFAList):
+        Returns:
+            按码点排序且互不相交的 (起始码点, 结束码点) 元组
         """
-        获取该NFA的字符集
+        if len(charName) == 1:
+            return (ord(charName), ord(charName)),
+        if charName in CHAR_ALIASES:
+            return CHAR_ALIASES[charName]
+        if len(charName) > 2 and charName[0] == "[" and charName[-1] == "]":
+            body = charName[1:-1]
+            chars = list()  # [(字符, 是否为转义字符)]
+            i = 0
+            while i < len(body):
+                if body[i] == "\\" and body[i + 1:i + 2] == "u" and re.match("[0-9a-fA-F]{4}$", body[i + 2:i + 6]):
+                    chars.append((chr(int(body[i + 2:i + 6], 16)), True))
+                    i += 6
+                elif body[i] == "\\" and i + 1 < len(body):
+                    chars.append((ESCAPE_CHARS.get(body[i + 1], body[i + 1]), True))
+                    i += 2
+                else:
+                    chars.append((body[i], False))
+                    i += 1
+            ranges = list()
+            i = 0
+            while i < len(chars):
+                if i + 2 < len(chars) and chars[i + 1] == ("-", False):
+                    ranges.append((ord(chars[i][0]), ord(chars[i + 2][0])))
+                    i += 3
+                else:
+                    ranges.append((ord(chars[i][0]), ord(chars[i][0])))
+                    i += 1
+            ranges.sort()
+            merged = list()
+            for lo, hi in ranges:
+                if merged and lo <= merged[-1][1] + 1:
+                    merged[-1] = (merged[-1][0], max(merged[-1][1], hi))
+                else:
+                    merged.append((lo, hi))
+            return tuple(merged)
+        print("未知符号: " + charName)
+        return ()
+
+    def __rangeLabel(self, ranges):
+        """
+        码点区间的可读形式，用于DFA可视化
+        """
+        def charLabel(codePoint):
+            char = chr(codePoint)
+            return char if char.isprintable() and char != "," else "\\u%04x" % codePoint
+        parts = [charLabel(lo) if lo == hi else charLabel(lo) + "-" + charLabel(hi) for lo, hi in ranges]
+        if len(parts) > 4:
+            parts = parts[:4] + ["..."]
+        return ",".join(parts)
+
+    def __getCharClasses(self, NFAList):
         """
-        charset = set()
+        把NFA边上的字符划分为等价类，同一等价类中的字符在每条边上的表现都相同，
+        子集构造只需要对每个等价类计算一次move集，与字符集的大小无关
+
+        Returns:
+            (classRanges, labelClasses, classNames)
+            classRanges: 按码点排序的 (起始码点, 结束码点, 等价类编号) 列表，不属于任何等价类的字符不出现
+            labelClasses: {边上的终结符: 它包含的等价类编号列表}
+            classNames: 每个等价类的可读名称
+        """
+        labelRanges = dict()
         for node in NFAList:
-            for nextNode in node.nextStates:
-                char = nextNode["character"]
-                if len(char) == 1:
-                    charset.add(char)
-                else:
-                    for char in self.__charEXT(char):
-                        charset.add(char)
-        return charset
+            for nextState in node.nextStates:
+                if nextState["character"] != "empty" and nextState["character"] not in labelRanges:
+                    labelRanges[nextState["character"]] = self.__charRanges(nextState["character"])
+        # 所有区间的端点把码点轴切分为若干段，每段内的字符被同样的终结符覆盖
+        boundaries = sorted(set(lo for ranges in labelRanges.values() for lo, hi in ranges) |
+                            set(hi + 1 for ranges in labelRanges.values() for lo, hi in ranges))
+        covers = [[] for i in boundaries]
+        labels = list(labelRanges.keys())
+        for labelIdx in range(len(labels)):
+            for lo, hi in labelRanges[labels[labelIdx]]:
+                for i in range(bisect_left(boundaries, lo), bisect_left(boundaries, hi + 1)):
+                    covers[i].append(labelIdx)
+        # 被同一组终结符覆盖的段属于同一个等价类
+        classIDs = dict()
+        classRanges = list()
+        labelClasses = {label: [] for label in labels}
+        classSegments = list()
+        for i in range(len(boundaries) - 1):
+            if not covers[i]:
+                continue
+            signature = tuple(covers[i])
+            if signature not in classIDs:
+                classIDs[signature] = len(classIDs)
+                classSegments.append([])
+                for labelIdx in signature:
+                    labelClasses[labels[labelIdx]].append(classIDs[signature])
+            classID = classIDs[signature]
+            lo, hi = boundaries[i], boundaries[i + 1] - 1
+            if classRanges and classRanges[-1][2] == classID and classRanges[-1][1] + 1 == lo:
+                classRanges[-1] = (classRanges[-1][0], hi, classID)
+                classSegments[classID][-1] = (classSegments[classID][-1][0], hi)
+            else:
+                classRanges.append((lo, hi, classID))
+                classSegments[classID].append((lo, hi))
+        # 与某个终结符完全一致的等价类直接用终结符命名
+        rangeNames = {ranges: label for label, ranges in labelRanges.items()}
+        classNames = [rangeNames.get(tuple(segments), self.__rangeLabel(segments)) for segments in classSegments]
+        return classRanges, labelClasses, classNames
 
-    def __emptyNext(self, NFAList, index):
+    def __emptyClosures(self, NFAList):
         """
-        空闭包算法
+        空闭包算法，预先计算每个NFA节点的空闭包
+
+        用显式栈沿空边遍历，已到达的节点不再重复访问，空边成环时也能终止；
+        遇到已经算好空闭包的节点直接合并其结果
 
         Args:
             NFAList: NFA
-            index: 空闭包算法开始节点
 
         Returns:
-            返回由开始节点进行空闭包算法到达的节点编号
-        """
-        resultSet = set()
-        targetNFANode = NFAList[index]
-        for nextNFANode in targetNFANode.nextStates:
-            if nextNFANode["character"] == "empty":
-                resultSet.add(nextNFANode["index"])
-                # 递归处理
-                recurResultList = self.__emptyNext(NFAList, nextNFANode["index"])
-                if recurResultList:
-                    for i in recurResultList:
-                        resultSet.add(i)
-        return list(resultSet)
-
-    def __emptyClosure(self, NFAList, indexes):
+            closures[i] 为i号节点经空边能到达的NFA节点编号(含自身)的frozenset
+        """
+        closures = [None] * len(NFAList)
+        for start in range(len(NFAList)):
+            reached = {start}
+            stack = [start]
+            while stack:
+                index = stack.pop()
+                for nextNFANode in NFAList[index].nextStates:
+                    nextIndex = nextNFANode["index"]
+                    if nextNFANode["character"] != "empty" or nextIndex in reached:
+                        continue
+                    if closures[nextIndex] is not None:
+                        reached |= closures[nextIndex]
+                    else:
+                        reached.add(nextIndex)
+                        stack.append(nextIndex)
+            closures[start] = frozenset(reached)
+        return closures
+
+    def __emptyClosure(self, closures, indexes):
         """
         子集空闭包算法
 
         Args:
-            NFAList: NFA
+            closures: __emptyClosures得到的每个NFA节点的空闭包
             indexes: NFA节点子集
 
         Returns:
-            返回由子集进行空闭包算法能到达的NFA节点编号列表
-        """
-        result = indexes[:]
-        for i in indexes:
-            tmp = self.__emptyNext(NFAList, i)
-            if tmp:
-                for j in tmp:
-                    if j not in result:
-                        result.append(j)
-        return result
+            由子集进行空闭包算法能到达的NFA节点编号的frozenset
+        """
+        return frozenset().union(*[closures[i] for i in indexes])
 
-    def __NFA2DFA(self, NFAList):
+    def __NFA2DFA(self, NFAList, accepts):
         """
         NFA确定化成DFA的算法
 
         Args:
             NFAList: 待确定化的NFA
+            accepts: {NFA结束节点编号: token类型}，DFA节点含有多个结束节点时取优先级最高的类型
 
         Returns:
-            NFA确定化得到的DFA
+            (DFA, classRanges)，DFA的边以字符等价类为单位，classRanges见__getCharClasses
         """
-        # charset of NFA
-        charset = self.__getCharset(NFAList)
+        # NFA的字符等价类
+        classRanges, labelClasses, classNames = self.__getCharClasses(NFAList)
+        closures = self.__emptyClosures(NFAList)
+        # 每个NFA节点的非空边，按等价类展开为 (等价类编号, 后继节点编号)
+        classEdges = [[(eachClass, nextState['index']) for nextState in node.nextStates
+                       if nextState['character'] != "empty" for eachClass in labelClasses[nextState['character']]]
+                      for node in NFAList]
         # DFA初始节点是NFA初始节点的空闭包
         startNode = DFANode(0, "START_NODE")
-        startNode.NFAIndex = self.__emptyClosure(NFAList, [0])
+        startNode.NFAIndex = closures[0]
         DFANodeList = [startNode]
+        DFANodeIndex = {startNode.NFAIndex: 0}  # NFA节点集合到DFA节点编号的映射
         DFANodePTR = 0  # 算法收敛于DFA节点集合不再变大
         while len(DFANodeList) != DFANodePTR:
             curDFANode = DFANodeList[DFANodePTR]  # 逐个DFA节点进行处理
             DFANodePTR += 1
-            for eachChar in charset:
-                moveStates = set()  # move集的计算
-                for eachNFANodeIDX in curDFANode.NFAIndex:
-                    NFANode = NFAList[eachNFANodeIDX]
-                    for eachNextState in NFANode.nextStates:
-                        if len(eachNextState['character']) == 1:
-                            if eachNextState['character'] == eachChar:
-                                moveStates.add(eachNextState['index'])
-                        else:
-                            cableCharset = self.__charEXT(eachNextState['character'])
-                            if eachChar in cableCharset:
-                                moveStates.add(eachNextState['index'])
+            # move集的计算，一次遍历得到每个等价类的move集
+            classMoveStates = dict()
+            for eachNFANodeIDX in curDFANode.NFAIndex:
+                for eachClass, nextIndex in classEdges[eachNFANodeIDX]:
+                    classMoveStates.setdefault(eachClass, set()).add(nextIndex)
+            for eachClass in sorted(classMoveStates):
                 # 计算emp-closure(move(I,a))
-                moveStatesClosure = self.__emptyClosure(NFAList, list(moveStates))
-                isNewDFANode = True  # 假设得到一个新的DFA节点
-                for eachDFANodeIDX in range(len(DFANodeList)):
-                    if str(moveStatesClosure) == str(DFANodeList[eachDFANodeIDX].NFAIndex):
-                        isNewDFANode = False  # 已存在，状态转移链
-                        DFANodeList[DFANodePTR - 1].nextStates.append({"character": eachChar, "index": eachDFANodeIDX})
-                        break
-                if isNewDFANode and len(moveStatesClosure) != 0:
-                    newDFANodeIDX = len(DFANodeList)  # 新的DFA节点，加入到列表中
-                    if 1 in moveStatesClosure:  # 区分结束状态的DFA节点，即包含有结束状态的NFA节点
-                        newDFANode = DFANode(newDFANodeIDX, "END_NODE")
+                moveStatesClosure = self.__emptyClosure(closures, classMoveStates[eachClass])
+                nextDFANodeIDX = DFANodeIndex.get(moveStatesClosure)
+                if nextDFANodeIDX is None:
+                    nextDFANodeIDX = len(DFANodeList)  # 新的DFA节点，加入到列表中
+                    acceptTypes = [accepts[i] for i in moveStatesClosure if i in accepts]
+                    if acceptTypes:  # 区分结束状态的DFA节点，即包含有结束状态的NFA节点
+                        newDFANode = DFANode(nextDFANodeIDX, "END_NODE")
+                        newDFANode.tokenType = min(acceptTypes, key=TOKEN_PRIORITY.index)
                     else:
-                        newDFANode = DFANode(newDFANodeIDX, "NORMAL_NODE")
+                        newDFANode = DFANode(nextDFANodeIDX, "NORMAL_NODE")
                     newDFANode.NFAIndex = moveStatesClosure
                     DFANodeList.append(newDFANode)
-                    DFANodeList[DFANodePTR - 1].nextStates.append({"character": eachChar, "index": newDFANodeIDX})
-            # print DFANodeList
-        return DFANodeList
+                    DFANodeIndex[moveStatesClosure] = nextDFANodeIDX
+                curDFANode.nextStates.append({"character": classNames[eachClass],
+                                              "class": eachClass, "index": nextDFANodeIDX})
+        return DFANodeList, classRanges
+
+    def __minimizeDFA(self, DFANodeList):
+        """
+        Hopcroft DFA最小化算法
 
-    def __getDFA(self, NFA):
-        return self.__NFA2DFA(NFA)
+        先按节点类型划分，再不断用 "经过某个字符能到达某个划分块" 的前驱集合切分划分块，
+        每次只把切分后较小的一块放回工作表。缺少的转移看作到达一个单独的死状态，
+        死状态自成一块，不与任何已有节点合并，保证最小化前后的匹配过程完全一致。
+
+        Args:
+            DFANodeList: 子集构造得到的DFA
+
+        Returns:
+            最小化后的DFA，0号节点仍为开始节点
+        """
+        dead = len(DFANodeList)
+        charset = list()
+        for node in DFANodeList:
+            for nextState in node.nextStates:
+                if nextState['class'] not in charset:
+                    charset.append(nextState['class'])
+        # 反向转移: inverse[字符等价类][节点] 为经过该等价类到达该节点的节点列表
+        inverse = {eachChar: [[] for i in range(dead + 1)] for eachChar in charset}
+        for node in DFANodeList:
+            moved = set()
+            for nextState in node.nextStates:
+                inverse[nextState['class']][nextState['index']].append(node.index)
+                moved.add(nextState['class'])
+            for eachChar in charset:
+                if eachChar not in moved:
+                    inverse[eachChar][dead].append(node.index)
+        for eachChar in charset:
+            inverse[eachChar][dead].append(dead)
+        # 初始划分: 按节点是否接受及接受的token类型划分，死状态单独一块
+        groups = dict()
+        for node in DFANodeList:
+            groups.setdefault((node.stateType == "END_NODE", node.tokenType), set()).add(node.index)
+        blocks = list(groups.values()) + [{dead}]
+        blockOf = [0] * (dead + 1)
+        for i in range(len(blocks)):
+            for j in blocks[i]:
+                blockOf[j] = i
+        initialBlockCnt = len(blocks)
+        workList = set(range(len(blocks)))
+        while workList:
+            splitter = set(blocks[workList.pop()])
+            for eachChar in charset:
+                # 经过eachChar到达splitter的前驱，按所在划分块分组
+                touched = dict()
+                for target in splitter:
+                    for source in inverse[eachChar][target]:
+                        touched.setdefault(blockOf[source], set()).add(source)
+                for blockIdx, members in touched.items():
+                    if len(members) == len(blocks[blockIdx]):
+                        continue
+                    blocks[blockIdx] -= members
+                    newBlockIdx = len(blocks)
+                    blocks.append(members)
+                    for j in members:
+                        blockOf[j] = newBlockIdx
+                    if blockIdx in workList or len(members) <= len(blocks[blockIdx]):
+                        workList.add(newBlockIdx)
+                    else:
+                        workList.add(blockIdx)
+        if self.stats is not None:
+            self.stats.count("lexical.minimizeSplits", len(blocks) - initialBlockCnt)
+        # 从开始节点所在块出发按广度优先重新编号
+        newIndex = {blockOf[0]: 0}
+        order = [blockOf[0]]
+        result = list()
+        for blockIdx in order:
+            node = DFANodeList[min(blocks[blockIdx])]
+            newNode = DFANode(len(result), node.stateType if blockIdx != blockOf[0] else "START_NODE")
+            newNode.tokenType = node.tokenType
+            newNode.NFAIndex = frozenset().union(*[DFANodeList[j].NFAIndex for j in blocks[blockIdx]])
+            for nextState in node.nextStates:
+                nextBlockIdx = blockOf[nextState['index']]
+                if nextBlockIdx not in newIndex:
+                    newIndex[nextBlockIdx] = len(order)
+                    order.append(nextBlockIdx)
+                newNode.nextStates.append({"character": nextState['character'], "class": nextState['class'],
+                                           "index": newIndex[nextBlockIdx]})
+            result.append(newNode)
+        return result
+
+    def __getDFA(self, NFA, accepts, typeName):
+        """
+        Returns:
+            (DFA, classRanges)
+        """
+        with measure(self.stats, "lexical.subset"):
+            DFA, classRanges = self.__NFA2DFA(NFA, accepts)
+        if self.stats is not None:
+            self.stats.count("lexical.subsetStates", len(DFA))
+            self.stats.count("lexical.subsetTransitions", sum(len(node.nextStates) for node in DFA))
+        if self.minimize:
+            with measure(self.stats, "lexical.minimize"):
+                minimizedDFA = self.__minimizeDFA(DFA)
+            print("%s DFA最小化: %d -> %d 个状态" % (typeName, len(DFA), len(minimizedDFA)))
+            DFA = minimizedDFA
+        for node in DFA:
+            node.transitions = {nextState['class']: nextState['index'] for nextState in node.nextStates}
+        return DFA, classRanges
 
     def __getNFA(self, contents):
         return self.__production2NFA(contents)
 
-    def __matchNode(self, typeName, DFAIDX, codeOFS):
+    def __matchToken(self, pos, state=None):
         """
-        DFA节点匹配函数
+        从pos处开始在合并后的DFA上匹配一个token，取最长的匹配，长度相同时按TOKEN_PRIORITY决定类型
 
         Args:
-            typeName: 根据3型文法产生的DFA
-            DFAIDX: 开始匹配的节点
-            codeOFS: 源代码字符流指针
+            pos: 缓冲区中的开始位置
+            state: 开始匹配时所在的DFA节点，为None时从开始节点匹配；token跨越块边界时传入上一块末尾所在的节点
 
         Returns:
-            返回一个字典对象，"token"记录着成功匹配的字符序列，"matched"记录匹配成功与否
-        """
-        # 从给定节点处开始匹配
-        DFANode = self.DFAs[typeName][DFAIDX]
-        for nextEdge in DFANode.nextStates:
-            if nextEdge['character'] == self.restCode[codeOFS]:
-                if len(self.restCode) - 1 == codeOFS:  # 源代码尾
-                    return {"token": nextEdge['character'], "matched": True}
-                # 递归匹配
-                nextResult = self.__matchNode(typeName, nextEdge['index'], codeOFS + 1)
-                if nextResult['matched']:
-                    return {"token": nextEdge['character'] + nextResult['token'], "matched": True}
-                else:
-                    return {"token": "", "matched": False}
-        if DFANode.stateType == "END_NODE":
-            return {"token": "", "matched": True}  # 尾部节点
-        return {"token": "", "matched": False}
+            (token结束位置, token类型, 停止匹配的位置, 停止时所在的DFA节点)，匹配失败时前两项为 (-1, None)，
+            停止位置等于缓冲区长度说明token可能延续到下一块
+        """
+        code = self.code
+        DFA = self.DFA
+        charClass = self.__charClass
+        lazy = self.lazyCacheSize is not None
+        if state is None:
+            state = DFA[0]
+        lastEnd, lastType = -1, None
+        i = pos
+        while i < len(code):
+            classID = charClass.get(code[i])
+            if classID is None:
+                classID = charClass[code[i]] = self.__classOf(code[i])
+            nextState = state.transitions.get(classID)
+            if nextState is None:
+                # 惰性DFA中还没有计算过的转移在这里计算
+                if not lazy or classID in state.transitions:
+                    break
+                nextState = self.__lazyStep(state, classID)
+                if nextState is None:
+                    break
+            state = DFA[nextState]
+            i += 1
+            if state.tokenType is not None:
+                lastEnd, lastType = i, state.tokenType  # 记录最后一次到达接受节点的位置
+        return lastEnd, lastType, i, state
+
+    def __readChunk(self, codeFile, chunkSize):
+        """
+        读取下一块源代码作为新的缓冲区，调用时原缓冲区必须已经分析完
 
-    def __matchType(self, typeName):
+        Returns:
+            是否读到了新的内容
         """
-        DFA匹配函数
+        chunk = codeFile.read(chunkSize)
+        if not chunk:
+            return False
+        self.codeOffset += len(self.code)
+        self.code = chunk
+        return True
+
+    def __continueMatch(self, codeFile, pos, end, tokenType, state, chunkSize):
+        """
+        token匹配到缓冲区末尾时，逐块读入后续内容，从保存的DFA节点接着匹配，已检查过的字符不再重新匹配；
+        读入的块先存放在列表中，匹配结束后只拼接一次，跨越多块的长token的耗时与长度成正比
 
         Args:
-            typeName: 指定类型的DFA
+            pos: token在缓冲区中的开始位置
+            end, tokenType, state: 在当前缓冲区中的匹配结果和停止时所在的DFA节点
 
         Returns:
-            匹配成功，返回True
-        """
-        # 从DFA初始节点开始
-        result = self.__matchNode(typeName, 0, 0)
-        if result['matched']:
-            # 匹配成功，若是keyword类的token，后续字符需要特殊处理一下
-            if (typeName == "keyword" or typeName == "constant") and len(result['token']) != len(self.restCode):
-                nextChar = self.restCode[len(result['token'])]
-                nextC = self.__matchNode("delimiter", 0, len(result['token']))
-                if not nextC["matched"]:
-                    if nextChar != ' ' and nextChar != '\n':
-                        return False
-
-            # 匹配成功，记录到token流中
-            self.TokenStream.append({"line": self.lineCount, "type": typeName, "token": result['token']})
-            if result['token'] == '\n':
-                self.lineCount += 1
-            return True
-        return False
-
-    def analyze(self, codeFile):
-        """
-        词法分析函数
-        """
-        self.TokenStream = []
+            (token结束位置, token类型, 停止匹配的位置)，返回后缓冲区从token的开始位置起
+        """
+        pieces = [self.code[pos:]]
+        self.codeOffset += pos
+        base = stop = len(pieces[0])  # 已读入的部分在token中的长度
+        if end != -1:
+            end -= pos
+        while stop == base:
+            chunk = codeFile.read(chunkSize)
+            if not chunk:
+                break
+            pieces.append(chunk)
+            self.code = chunk
+            chunkEnd, chunkType, chunkStop, state = self.__matchToken(0, state)
+            if chunkEnd != -1:
+                end, tokenType = base + chunkEnd, chunkType
+            stop = base + chunkStop
+            base += len(chunk)
+        self.code = "".join(pieces)
+        return end, tokenType, stop
+
+    def __errorLine(self, codeFile, pos, chunkSize):
+        """
+        Returns:
+            缓冲区中从pos处到行尾的内容，行尾不在缓冲区中时继续读取源文件
+        """
+        lineEnd = self.code.find("\n", pos)
+        if lineEnd != -1:
+            return self.code[pos:lineEnd]
+        pieces = [self.code[pos:]]
+        while True:
+            chunk = codeFile.read(chunkSize)
+            lineEnd = chunk.find("\n")
+            if lineEnd != -1:
+                pieces.append(chunk[:lineEnd])
+                break
+            if not chunk:
+                break
+            pieces.append(chunk)
+        return "".join(pieces)
+
+    def __scan(self, codeFile, chunkSize):
+        """
+        分块读取源文件，逐个匹配token
+
+        缓冲区只保留当前的块，跨越块边界的token保存匹配到的DFA节点后接着匹配下一块，
+        内存占用只与块大小和最长的token有关；调用者停止迭代时词法分析随即停止
+
+        Yields:
+            (token类型, 单词, 在源文件中的位置, 行号, lookahead)，
+            lookahead为匹配时越过token末尾多检查的字符数，文件末尾也算一个字符
+        """
+        self.lineCount = 1
+        self.code = ""
+        self.codeOffset = 0
+        self.error = None
         try:
-            self.restCode = open(codeFile, "r").read()
+            f = open(codeFile, "r")
         except Exception as e:
             print("代码文件打开失败")
-        if len(self.restCode) == 0:
-            return self.TokenStream.copy()
-        # 处理头空
-        while self.restCode[0] == ' ' or self.restCode[0] == '\n' or self.restCode[0] == '\r':
-            if self.restCode[0] == '\n':
-                self.lineCount += 1
-                self.restCode = self.restCode[1:]
+            self.error = {"line": None, "token": codeFile, "reason": "io_error"}
+            return
+        tokenCnt = 0
+        examined = 0  # 匹配时检查过的字符数，包括越过token末尾的部分
+        reservedWords = self.reservedWords
+        reservedTypes = self.reservedTypes
+        try:
+            with f:
+                pos = 0
+                while True:
+                    code = self.code
+                    # 跳过空白
+                    while pos < len(code) and (code[pos] == ' ' or code[pos] == '\n' or code[pos] == '\r'):
+                        if code[pos] == '\n':
+                            self.lineCount += 1
+                        pos += 1
+                    if pos == len(code):
+                        if self.__readChunk(f, chunkSize):
+                            pos = 0
+                            continue
+                        break
+                    end, tokenType, stop, state = self.__matchToken(pos)
+                    if stop == len(code):
+                        # token可能延续到下一块
+                        end, tokenType, stop = self.__continueMatch(f, pos, end, tokenType, state, chunkSize)
+                        code = self.code
+                        pos = 0
+                    if end == -1:
+                        # 读到行尾再报告出错的行
+                        errorLine = self.__errorLine(f, pos, chunkSize)
+                        print("发生错误匹配(%d 行): %s" % (self.lineCount, errorLine))
+                        self.error = {"line": self.lineCount, "token": errorLine}
+                        return
+                    # 匹配成功，产生token
+                    token = code[pos:end]
+                    if reservedWords is not None and tokenType in reservedTypes and token in reservedWords:
+                        tokenType = "keyword"
+                    tokenCnt += 1
+                    examined += stop - pos
+                    lookahead = stop - end + 1
+                    if lookahead > self.maxLookahead:
+                        self.maxLookahead = lookahead
+                    yield tokenType, token, self.codeOffset + pos, self.lineCount, lookahead
+                    self.lineCount += token.count("\n")
+                    pos = end
+        except UnicodeDecodeError as e:
+            print("代码文件解码失败(%d 行之后): %s" % (self.lineCount, e.reason))
+            self.error = {"line": self.lineCount, "token": codeFile, "reason": "decode_error"}
+        except OSError as e:
+            print("代码文件读取失败(%d 行之后)" % self.lineCount)
+            self.error = {"line": self.lineCount, "token": codeFile, "reason": "io_error"}
+        finally:
+            if self.stats is not None:
+                self.stats.count("lexical.tokens", tokenCnt)
+                self.stats.count("lexical.examinedChars", examined)
+
+    def tokens(self, codeFile, chunkSize=CHUNK_SIZE):
+        """
+        词法分析生成器，分块读取源文件，按需逐个产生token
+
+        Args:
+            codeFile: 源代码文件
+            chunkSize: 每次读取的字符数
+
+        Yields:
+            {"line": 行号, "type": token类型, "token": 单词, "offset": 在源文件中的位置,
+             "lookahead": 匹配时越过token末尾多检查的字符数，文件末尾也算一个字符}
+        """
+        for tokenType, token, offset, line, lookahead in self.__scan(codeFile, chunkSize):
+            yield {"line": line, "type": tokenType, "token": token, "offset": offset, "lookahead": lookahead}
+
+    def analyze(self, codeFile, sink=None):
+        """
+        词法分析函数，分析整个源文件，token序列以列式存储保存在TokenStream中
+
+        Args:
+            codeFile: 源代码文件
+            sink: 记录分析过程的对象，见TraceSink，每个token记录一行 [行号, 类型, 单词]，
+                分析结束时调用其close；为None时不记录
+        """
+        self.TokenStream = TokenStore(TOKEN_TYPES)
+        with measure(self.stats, "lexical.analyze"):
+            for eachToken in self.__scan(codeFile, CHUNK_SIZE):
+                self.TokenStream.append(*eachToken)
+                if sink is not None:
+                    sink.record([eachToken[3], eachToken[0], eachToken[1]])
+        self.TokenStream.truncated = self.error is not None
+        if sink is not None:
+            sink.close()
+
+    def relex(self, source, tokens, offset, deleteLength, insertLength):
+        """
+        增量词法分析，源代码被编辑后只重新分析受影响的部分
+
+        从匹配时检查过编辑位置的第一个token开始重新匹配，新token与旧token在编辑位置之后
+        从同一位置开始时，后面的匹配结果必然相同，此时停止匹配，其后的旧token由TokenStore记下
+        位置和行号的平移量，不逐个修改，耗时只与重新匹配的范围有关。
+        编辑前的token序列因词法错误截断时，重新同步后还要从最后一个旧token之后接着分析，
+        重新报告错误或确认错误已经消除
+
+        Args:
+            source: 编辑后的源代码
+            tokens: 编辑前由本对象分析得到的TokenStore，原地更新为编辑后的token序列
+            offset: 编辑位置
+            deleteLength: 删除的字符数
+            insertLength: 插入的字符数
+
+        Returns:
+            (first, oldStop, newStop)，编辑前的 tokens[first:oldStop] 被替换为编辑后的 tokens[first:newStop]
+        """
+        self.error = None
+        self.code = code = source
+        delta = insertLength - deleteLength
+        editEnd = offset + insertLength  # 编辑后的源代码中编辑部分的结束位置
+        # 找到第一个受影响的token，token的结束位置单调递增，结束位置加上最大的lookahead
+        # 都不超过编辑位置时，它和它之前的token都不受影响
+        low, high = 0, len(tokens)  # 二分查找第一个从编辑位置或之后开始的token
+        while low < high:
+            middle = (low + high) // 2
+            if tokens.offset(middle) < offset:
+                low = middle + 1
             else:
-                self.restCode = self.restCode.lstrip(' ')
-            if len(self.restCode) == 0:
+                high = middle
+        first = restart = low
+        while restart > 0:
+            end = tokens.end(restart - 1)
+            if end + self.maxLookahead <= offset:
                 break
-        preSpace = False
-        # 对源代码字符流进行逐种token类型的匹配，优先顺序
-        while len(self.restCode) > 0:
-            if self.__matchType("keyword"):
-                tokenLength = len(self.TokenStream[-1]['token'])
-                self.restCode = self.restCode[tokenLength:]
-            elif self.__matchType("constant"):
-                tokenLength = len(self.TokenStream[-1]['token'])
-                self.restCode = self.restCode[tokenLength:]
-            elif self.__matchType("identifier"):
-                tokenLength = len(self.TokenStream[-1]['token'])
-                self.restCode = self.restCode[tokenLength:]
-                # 标识符合法性检测 1true, 1 true
-                # if len(self.TokenStream) > 1 and self.TokenStream[-2]['type'] == 'constant' and preSpace is False:
-                #     print("发生错误匹配123(%d 行): %s" %
-                #           (self.lineCount, self.TokenStream[-2]['token'] + self.TokenStream[-1]['token']))
-                #     break
-            elif self.__matchType("operator"):
-                tokenLength = len(self.TokenStream[-1]['token'])
-                self.restCode = self.restCode[tokenLength:]
-            elif self.__matchType("delimiter"):
-                tokenLength = len(self.TokenStream[-1]['token'])
-                self.restCode = self.restCode[tokenLength:]
-            else:
-                print("发生错误匹配(%d 行): %s" % (self.lineCount,
-                                            self.restCode[0:self.restCode.index("\n") if "\n" in self.restCode else 0]))
+            if end + tokens.lookaheads[restart - 1] > offset:
+                first = restart - 1
+            restart -= 1
+        if first > 0:
+            pos = tokens.end(first - 1)
+            self.lineCount = tokens.line(first - 1) + tokens.text(first - 1).count("\n")
+        else:
+            pos = 0
+            self.lineCount = 1
+        oldCount = len(tokens)
+        newTokens = list()
+        oldStop = first  # 第一个可能与新token重合的旧token
+        synced = False
+        lineDelta = 0
+        tail = None  # 截断的旧token序列重新同步后，在最后一个旧token之后分析出的第一个新token在newTokens中的下标
+        while True:
+            # 跳过空白
+            while pos < len(code) and (code[pos] == ' ' or code[pos] == '\n' or code[pos] == '\r'):
+                if code[pos] == '\n':
+                    self.lineCount += 1
+                pos += 1
+            if tail is None and pos >= editEnd:
+                # 编辑位置之后，新旧token从同一位置开始即重新同步
+                while oldStop < oldCount and tokens.offset(oldStop) + delta < pos:
+                    oldStop += 1
+                if oldStop < oldCount and tokens.offset(oldStop) + delta == pos and \
+                        tokens.offset(oldStop) >= offset + deleteLength:
+                    synced = True
+                    lineDelta = self.lineCount - tokens.line(oldStop)
+                    if not tokens.truncated:
+                        break
+                    # 旧token序列在出错处截断，出错处之前不算重新同步，复用剩下的旧token后接着分析到出错处
+                    last = oldCount - 1
+                    pos = tokens.end(last) + delta
+                    self.lineCount = tokens.line(last) + lineDelta + tokens.text(last).count("\n")
+                    tail = len(newTokens)
+                    continue
+            if pos == len(code):
                 break
-            if len(self.restCode) == 0:
+            end, tokenType, stop, state = self.__matchToken(pos)
+            if end == -1:
+                lineEnd = code.find("\n", pos)
+                errorLine = code[pos:lineEnd if lineEnd != -1 else len(code)]
+                print("发生错误匹配(%d 行): %s" % (self.lineCount, errorLine))
+                self.error = {"line": self.lineCount, "token": errorLine}
                 break
-            if self.restCode[0] != ' ' and self.restCode[0] != '\n' and self.restCode[0] != '\r':
-                preSpace = False
-            else:
-                preSpace = True
-            while self.restCode[0] == ' ' or self.restCode[0] == '\n' or self.restCode[0] == '\r':
-                if len(self.restCode) == 0:
-                    break
-                if self.restCode[0] == '\n':
-                    self.lineCount += 1
-                    self.restCode = self.restCode[1:]
-                else:
-                    self.restCode = self.restCode.lstrip(' ')
+            token = code[pos:end]
+            if self.reservedWords is not None and tokenType in self.reservedTypes and token in self.reservedWords:
+                tokenType = "keyword"
+            lookahead = stop - end + 1
+            if lookahead > self.maxLookahead:
+                self.maxLookahead = lookahead
+            newTokens.append((tokenType, token, pos, self.lineCount, lookahead))
+            self.lineCount += token.count("\n")
+            pos = end
+        if synced:
+            # 平移重新同步之后的旧token
+            if delta != 0 or lineDelta != 0:
+                tokens.shift(oldStop, delta, lineDelta)
+        else:
+            oldStop = oldCount  # 没有重新同步，与analyze相同，出错后的token全部丢弃
+        tokens.truncated = self.error is not None
+        if tail is None or tail == len(newTokens):
+            tokens.splice(first, oldStop, newTokens[:tail])
+            return first, oldStop, first + len(newTokens[:tail])
+        tokens.splice(first, oldStop, newTokens[:tail])
+        tokens.splice(len(tokens), len(tokens), newTokens[tail:])
+        return first, oldCount, len(tokens)
 
     def show(self):
-        tb = pt.PrettyTable()
-        tb.field_names = ["行号", "类型", "单词"]
+        sink = TableSink(LEXICAL_TRACE_FIELDS)
         for i in self.TokenStream:
-            tb.add_row([i['line'], i['type'], i['token']])
-            # print("%d\t%10s\t%s" % (i['line'], i['type'], i['token']))
-        print(tb)
+            sink.record([i['line'], i['type'], i['token']])
+        sink.close()
 
 
 if __name__ == '__main__':
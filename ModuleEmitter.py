@@ -0,0 +1,332 @@
+import sys
+import zlib
+from array import array
+
+# 生成的模块中使用的驱动程序，表格定义写在它之前
+DRIVER = r'''
+
+def _unpack(typecode, data):
+    table = array(typecode)
+    table.frombytes(zlib.decompress(data))
+    if sys.byteorder != BYTE_ORDER:
+        table.byteswap()
+    return table
+
+
+CLASS_STARTS = _unpack(*CLASS_STARTS)
+CLASS_ENDS = _unpack(*CLASS_ENDS)
+CLASS_IDS = _unpack(*CLASS_IDS)
+ASCII_CLASSES = _unpack(*ASCII_CLASSES)
+LEXICAL_TABLE = _unpack(*LEXICAL_TABLE)
+LEXICAL_ACCEPTS = _unpack(*LEXICAL_ACCEPTS)
+ACTION_BASE = _unpack(*ACTION_BASE)
+ACTION_CHECK = _unpack(*ACTION_CHECK)
+ACTION_VALUE = _unpack(*ACTION_VALUE)
+DEFAULT_REDUCTIONS = _unpack(*DEFAULT_REDUCTIONS)
+GOTO_BASE = _unpack(*GOTO_BASE)
+GOTO_CHECK = _unpack(*GOTO_CHECK)
+GOTO_VALUE = _unpack(*GOTO_VALUE)
+PRODUCTION_LEFTS = _unpack(*PRODUCTION_LEFTS)
+PRODUCTION_LENGTHS = _unpack(*PRODUCTION_LENGTHS)
+RESERVED_WORDS = frozenset(RESERVED_WORDS)
+RESERVED_TYPES = frozenset(RESERVED_TYPES)
+TERMINAL_IDS = {name: i for i, name in enumerate(TERMINALS)}
+END_TERMINAL = TERMINAL_IDS["<#>"]
+TYPE_TERMINALS = {typeName: TERMINAL_IDS.get("<" + typeName + ">", -1) for typeName in ("identifier", "constant")}
+
+
+def _classOf(char):
+    """
+    Returns:
+        字符所属的等价类编号，不属于任何等价类时返回-1
+    """
+    codePoint = ord(char)
+    if codePoint < 128:
+        return ASCII_CLASSES[codePoint]
+    i = bisect_right(CLASS_STARTS, codePoint) - 1
+    if i >= 0 and codePoint <= CLASS_ENDS[i]:
+        return CLASS_IDS[i]
+    return -1
+
+
+def tokenize(source):
+    """
+    词法分析，取最长的匹配
+
+    Returns:
+        (tokens, error)，tokens为 (token类型, 单词, 行号) 列表，
+        error为第一个无法匹配的位置 {"line": 行号, "token": 所在行的剩余部分}，没有错误时为None
+    """
+    tokens = list()
+    line = 1
+    pos = 0
+    length = len(source)
+    while True:
+        while pos < length and source[pos] in " \n\r":
+            if source[pos] == "\n":
+                line += 1
+            pos += 1
+        if pos == length:
+            return tokens, None
+        state = 0
+        lastEnd, lastType = -1, -1
+        i = pos
+        while i < length:
+            classID = _classOf(source[i])
+            if classID < 0:
+                break
+            nextState = LEXICAL_TABLE[state * LEXICAL_CLASS_COUNT + classID]
+            if nextState == 0:
+                break
+            state = nextState - 1
+            i += 1
+            if LEXICAL_ACCEPTS[state] >= 0:
+                lastEnd, lastType = i, LEXICAL_ACCEPTS[state]
+        if lastEnd == -1:
+            lineEnd = source.find("\n", pos)
+            return tokens, {"line": line, "token": source[pos:lineEnd if lineEnd != -1 else length]}
+        text = source[pos:lastEnd]
+        typeName = TOKEN_TYPES[lastType]
+        if typeName in RESERVED_TYPES and text in RESERVED_WORDS:
+            typeName = "keyword"
+        tokens.append((typeName, text, line))
+        line += text.count("\n")
+        pos = lastEnd
+
+
+def _action(state, terminal):
+    i = ACTION_BASE[state] + terminal
+    return ACTION_VALUE[i] if ACTION_CHECK[i] == state else 0
+
+
+def _goto(state, nonterminal):
+    i = GOTO_BASE[state] + nonterminal
+    return GOTO_VALUE[i] if GOTO_CHECK[i] == state else -1
+
+
+def _queryKind(state, kind):
+    action = 0 if kind[0] < 0 else _action(state, kind[0])
+    if action == 0 and kind[1] >= 0:
+        action = _action(state, kind[1])
+    return action
+
+
+def _recoveryPoint(stack, kind):
+    """
+    从栈顶向下找到第一个状态，它经某个非终结符转移后的状态能接受当前token
+
+    Returns:
+        (弹出的状态数, 次态)，找不到时返回None
+    """
+    for depth in range(len(stack)):
+        for nonterminal in range(len(NONTERMINALS)):
+            target = _goto(stack[-1 - depth], nonterminal)
+            if target >= 0 and _queryKind(target, kind) != 0:
+                return depth, target
+    return None
+
+
+def parse(tokens):
+    """
+    LR语法分析，出错时做恐慌模式恢复，一次报告所有错误
+
+    Args:
+        tokens: tokenize得到的token列表
+
+    Returns:
+        {"accepted": 是否无错误地接受,
+         "errors": [{"line": 行号, "token": 单词, "expected": 期望的终结符列表}]}
+    """
+    stack = [0]
+    errors = list()
+    index = 0
+    lastError = -1
+    endKind = (END_TERMINAL, -1)
+    while True:
+        # 默认规约的状态不必查向前看符号
+        action = DEFAULT_REDUCTIONS[stack[-1]]
+        if action == 0:
+            if index < len(tokens):
+                typeName, text, line = tokens[index]
+                kind = (TERMINAL_IDS.get(text, -1), TYPE_TERMINALS.get(typeName, -1))
+            else:
+                text, line, kind = "<#>", -1, endKind
+            action = _queryKind(stack[-1], kind)
+        if action == 0:
+            # 同一位置再次出错说明恢复后无法前进，先丢弃当前token，这个token已经报告过，不再重复报告
+            skip = index == lastError
+            lastError = index
+            if not skip:
+                errors.append({"line": line, "token": text,
+                               "expected": [TERMINALS[i] for i in range(len(TERMINALS)) if _action(stack[-1], i) != 0]})
+            point = None
+            while True:
+                if skip:
+                    if index >= len(tokens):
+                        return {"accepted": False, "errors": errors}
+                    index += 1
+                    if index < len(tokens):
+                        typeName, text, line = tokens[index]
+                        kind = (TERMINAL_IDS.get(text, -1), TYPE_TERMINALS.get(typeName, -1))
+                    else:
+                        kind = endKind
+                point = _recoveryPoint(stack, kind)
+                if point is not None:
+                    break
+                skip = True
+            del stack[len(stack) - point[0]:]
+            stack.append(point[1])
+        elif action > 0:
+            stack.append(action - 1)
+            index += 1
+        elif action != -1:
+            production = -action - 1
+            del stack[len(stack) - PRODUCTION_LENGTHS[production]:]
+            stack.append(_goto(stack[-1], PRODUCTION_LEFTS[production]))
+        else:
+            return {"accepted": not errors, "errors": errors}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("用法: python %s 源文件" % sys.argv[0])
+        sys.exit(2)
+    with open(sys.argv[1], "r") as codeFile:
+        tokens, error = tokenize(codeFile.read())
+    if error is not None:
+        print("发生错误匹配(%d 行): %s" % (error["line"], error["token"]))
+        sys.exit(1)
+    result = parse(tokens)
+    for error in result["errors"]:
+        print("语法错误(第 %d 行): %s，期望的单词: %s" % (error["line"], error["token"], " ".join(error["expected"])))
+    print("语法分析成功" if result["accepted"] else "语法分析失败，共 %d 处错误" % len(result["errors"]))
+    sys.exit(0 if result["accepted"] else 1)
+'''
+
+
+class ModuleEmitter:
+    """
+    把词法DFA和语法分析表导出为独立的Python模块
+
+    生成的模块只依赖标准库，表格以压缩后的bytes字面量存放，导入时解压还原为array，
+    不需要构建NFA、DFA或分析表，也不导入graphviz和prettytable。
+    模块提供 tokenize(source) 和 parse(tokens) 两个函数，也可以直接运行分析一个源文件。
+
+    Attributes:
+        LA: 词法分析器
+        SA: 语法分析器
+    """
+    LA = None
+    SA = None
+
+    def __init__(self, LA, SA):
+        """
+        Args:
+            LA: LexicalAnalyze对象，需要完整的DFA，不能使用惰性DFA
+            SA: SyntaxAnalyzer对象
+        """
+        self.LA = LA
+        self.SA = SA
+
+    def __pack(self, values):
+        """
+        选择能容纳所有值的最小的有符号整数类型
+
+        Returns:
+            (array类型码, 按本机字节序排列并经zlib压缩的bytes)，稀疏的分析表压缩后只有原来的几十分之一
+        """
+        low = min(values, default=0)
+        high = max(values, default=0)
+        for typecode in ("b", "h", "i"):
+            bits = array(typecode).itemsize * 8
+            if -(1 << (bits - 1)) <= low and high < 1 << (bits - 1):
+                return typecode, zlib.compress(array(typecode, values).tobytes(), 9)
+        print("表格中的数值超出范围")
+        return "q", zlib.compress(array("q", values).tobytes(), 9)
+
+    def __lexicalTables(self):
+        """
+        Returns:
+            {名称: 值}，词法DFA展开为 状态 * 等价类数 + 等价类 的稠密数组，0表示没有转移，n表示转移到状态n-1；
+            词法分析器使用保留字表时一并导出
+        """
+        LA = self.LA
+        classCount = max((classID for lo, hi, classID in LA.classRanges), default=-1) + 1
+        table = [0] * (len(LA.DFA) * classCount)
+        accepts = list()
+        tokenTypes = sorted(set(node.tokenType for node in LA.DFA if node.tokenType is not None))
+        for node in LA.DFA:
+            for classID, nextState in node.transitions.items():
+                table[node.index * classCount + classID] = nextState + 1
+            accepts.append(tokenTypes.index(node.tokenType) if node.tokenType is not None else -1)
+        asciiClasses = [-1] * 128
+        for lo, hi, classID in LA.classRanges:
+            for codePoint in range(lo, min(hi, 127) + 1):
+                asciiClasses[codePoint] = classID
+        return {
+            "TOKEN_TYPES": tokenTypes,
+            "LEXICAL_CLASS_COUNT": classCount,
+            "CLASS_STARTS": self.__pack([lo for lo, hi, classID in LA.classRanges]),
+            "CLASS_ENDS": self.__pack([hi for lo, hi, classID in LA.classRanges]),
+            "CLASS_IDS": self.__pack([classID for lo, hi, classID in LA.classRanges]),
+            "ASCII_CLASSES": self.__pack(asciiClasses),
+            "LEXICAL_TABLE": self.__pack(table),
+            "LEXICAL_ACCEPTS": self.__pack(accepts),
+            "RESERVED_WORDS": sorted(LA.reservedWords or ()),
+            "RESERVED_TYPES": sorted(LA.reservedTypes or ()),
+        }
+
+    def __syntaxTables(self):
+        """
+        Returns:
+            {名称: 值}，ACTION和GOTO表为SyntaxAnalyzer中行位移压缩后的表，编码相同
+        """
+        SA = self.SA
+        return {
+            "TERMINALS": list(SA.terminals),
+            "NONTERMINALS": list(SA.nonterminals),
+            "ACTION_BASE": self.__pack(list(SA.ACTIONBase)),
+            "ACTION_CHECK": self.__pack(list(SA.ACTIONCheck)),
+            "ACTION_VALUE": self.__pack(list(SA.ACTIONValue)),
+            "DEFAULT_REDUCTIONS": self.__pack(list(SA.defaultReductions)),
+            "GOTO_BASE": self.__pack(list(SA.GOTOBase)),
+            "GOTO_CHECK": self.__pack(list(SA.GOTOCheck)),
+            "GOTO_VALUE": self.__pack(list(SA.GOTOValue)),
+            "PRODUCTION_LEFTS": self.__pack([SA.nonterminalIDs[production['left']]
+                                             for production in SA.productions]),
+            "PRODUCTION_LENGTHS": self.__pack([len(production['right']) for production in SA.productions]),
+        }
+
+    def source(self):
+        """
+        Returns:
+            生成的模块的源代码
+        """
+        lines = ['"""',
+                 "由 main.py --EmitModule 生成的词法分析和语法分析模块，请勿手动修改",
+                 '"""',
+                 "import sys",
+                 "import zlib",
+                 "from array import array",
+                 "from bisect import bisect_right",
+                 "",
+                 "BYTE_ORDER = %r" % sys.byteorder]
+        for name, value in list(self.__lexicalTables().items()) + list(self.__syntaxTables().items()):
+            lines.append("%s = %r" % (name, value))
+        return "\n".join(lines) + "\n" + DRIVER
+
+    def emit(self, moduleFile):
+        """
+        把生成的模块写入moduleFile
+        """
+        if self.LA.lazyCacheSize is not None:
+            print("惰性DFA只有用到过的部分，不能导出模块")
+            return False
+        try:
+            with open(moduleFile, "w", encoding="utf-8") as f:
+                f.write(self.source())
+        except Exception as e:
+            print("模块文件写入失败")
+            return False
+        print("已生成模块: " + moduleFile)
+        return True
@@ -0,0 +1,113 @@
+from array import array
+
+# 没有子节点、兄弟节点或对应token时的编号
+NO_NODE = -1
+
+
+class ParseTree:
+    """
+    以并列数组存放的语法树，每个节点只占各数组中的一格，不为节点创建Python对象
+
+    节点的子节点用 "第一个子节点 + 下一个兄弟节点" 的方式串联，叶子节点对应一个token。
+    符号编号中终结符在前，非终结符的编号为 len(terminals) + 非终结符编号。
+    节点的起始token下标相对于父节点的起始token下标保存，编辑后增量分析时编辑位置之后的子树可以原样接入新的语法树。
+
+    Attributes:
+        symbolNames: 符号编号到符号名的映射
+        symbols: 每个节点的符号编号
+        productions: 内部节点规约时使用的产生式编号，叶子节点为NO_NODE
+        firstChild: 每个节点的第一个子节点
+        nextSibling: 每个节点的下一个兄弟节点
+        offsets: 每个节点的起始token下标与父节点起始token下标的差，根节点和还没有父节点的节点为起始token下标本身
+        spans: 每个节点覆盖的token个数，包括不加入语法树的token
+        states: 分析出每个节点之前的栈顶状态，即移进节点第一个token时的状态，增量分析时用来判断节点能否复用
+        root: 根节点
+        garbage: 增量分析替换下来、不再被引用的节点数，这些节点仍占着数组中的位置，见compact
+    """
+    symbolNames = None
+    symbols = None
+    productions = None
+    firstChild = None
+    nextSibling = None
+    offsets = None
+    spans = None
+    states = None
+    root = NO_NODE
+    garbage = 0
+
+    def __init__(self, symbolNames):
+        self.symbolNames = symbolNames
+        self.symbols = array("i")
+        self.productions = array("i")
+        self.firstChild = array("i")
+        self.nextSibling = array("i")
+        self.offsets = array("i")
+        self.spans = array("i")
+        self.states = array("i")
+
+    def addNode(self, symbol, production, firstChild, start, span, state):
+        """
+        Args:
+            start: 节点的起始token下标，节点加入父节点时再换算为相对下标
+
+        Returns:
+            新节点的编号
+        """
+        self.symbols.append(symbol)
+        self.productions.append(production)
+        self.firstChild.append(firstChild)
+        self.nextSibling.append(NO_NODE)
+        self.offsets.append(start)
+        self.spans.append(span)
+        self.states.append(state)
+        return len(self.symbols) - 1
+
+    def isLeaf(self, node):
+        return self.productions[node] == NO_NODE
+
+    def children(self, node):
+        child = self.firstChild[node]
+        while child != NO_NODE:
+            yield child
+            child = self.nextSibling[child]
+
+    def compact(self):
+        """
+        去掉不再被引用的节点，从根节点按先序重新编号，节点编号随之改变
+        """
+        order = list()
+        stack = [self.root] if self.root != NO_NODE else []
+        while stack:
+            node = stack.pop()
+            order.append(node)
+            stack.extend(reversed(list(self.children(node))))
+        newIndex = {node: i for i, node in enumerate(order)}
+        newIndex[NO_NODE] = NO_NODE
+        self.symbols = array("i", [self.symbols[node] for node in order])
+        self.productions = array("i", [self.productions[node] for node in order])
+        self.firstChild = array("i", [newIndex[self.firstChild[node]] for node in order])
+        self.nextSibling = array("i", [newIndex[self.nextSibling[node]] for node in order])
+        self.offsets = array("i", [self.offsets[node] for node in order])
+        self.spans = array("i", [self.spans[node] for node in order])
+        self.states = array("i", [self.states[node] for node in order])
+        self.root = 0 if order else NO_NODE
+        self.garbage = 0
+
+    def show(self, tokens=None):
+        """
+        按缩进打印语法树，给出tokens时叶子节点打印对应的单词
+        """
+        lines = list()
+        stack = [(self.root, 0, 0)] if self.root != NO_NODE else []
+        while stack:
+            node, depth, parentStart = stack.pop()
+            start = parentStart + self.offsets[node]
+            label = self.symbolNames[self.symbols[node]]
+            if self.isLeaf(node) and tokens is not None and tokens.text(start) != label:
+                label += " " + tokens.text(start)
+            lines.append("  " * depth + label)
+            stack.extend((child, depth + 1, start) for child in reversed(list(self.children(node))))
+        print("\n".join(lines))
+
+    def __len__(self):
+        return len(self.symbols)
@@ -0,0 +1,120 @@
+import contextlib
+import json
+import time
+import tracemalloc
+import prettytable as pt
+
+# 命令行可选的统计报告格式
+STATS_KINDS = ["text", "json"]
+# 报告中附带的比值: (名称, 分子计数, 分母计数)
+RATIOS = [
+    ("lexical.examinedCharsPerToken", "lexical.examinedChars", "lexical.tokens"),
+    ("syntax.closureItemsPerCall", "syntax.closureItems", "syntax.closureCalls"),
+    ("syntax.actionLookupsPerToken", "syntax.actionLookups", "syntax.tokens"),
+    ("syntax.gotoLookupsPerToken", "syntax.gotoLookups", "syntax.tokens"),
+]
+
+
+class Stats:
+    """
+    分析流程各阶段的耗时、内存峰值和计数
+
+    词法分析器和语法分析器在构造时传入Stats对象才会统计，不传入时只多一次是否为None的判断。
+    阶段可以嵌套，内层阶段的内存峰值也计入外层阶段；同名阶段多次进入时耗时累加，内存峰值取最大。
+
+    Attributes:
+        phases: {阶段名: {"seconds": 累计耗时, "calls": 进入次数, "peakBytes": 阶段内相对开始时新增内存的峰值}}
+        counters: {计数名: 值}
+        traceMemory: 是否用tracemalloc统计内存峰值，开启后分析过程会明显变慢
+    """
+    phases = None
+    counters = None
+    traceMemory = True
+
+    def __init__(self, traceMemory=True):
+        self.phases = dict()
+        self.counters = dict()
+        self.traceMemory = traceMemory
+        self.__stack = list()  # 正在进行的阶段的 [开始时已分配的内存, 内层阶段达到的峰值]
+        if traceMemory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        统计一个阶段，用法为 with stats.phase("syntax.dfa"): ...
+        """
+        if self.traceMemory:
+            current, peak = tracemalloc.get_traced_memory()
+            if self.__stack:
+                self.__stack[-1][1] = max(self.__stack[-1][1], peak)
+            tracemalloc.reset_peak()
+            self.__stack.append([current, current])
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            elapsed = time.perf_counter() - start
+            record = self.phases.setdefault(name, {"seconds": 0.0, "calls": 0, "peakBytes": None})
+            record["seconds"] += elapsed
+            record["calls"] += 1
+            if self.traceMemory:
+                base, innerPeak = self.__stack.pop()
+                peak = max(tracemalloc.get_traced_memory()[1], innerPeak)
+                record["peakBytes"] = max(record["peakBytes"] or 0, peak - base)
+                if self.__stack:
+                    self.__stack[-1][1] = max(self.__stack[-1][1], peak)
+
+    def stopTracing(self):
+        """
+        停止统计内存峰值，之后进入的阶段不再记录内存；fork出的子进程会继承tracemalloc，
+        在启动进程池之前调用以免拖慢工作进程
+        """
+        if self.traceMemory and not self.__stack:
+            self.traceMemory = False
+            tracemalloc.stop()
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def ratios(self):
+        """
+        Returns:
+            {比值名: 值}，只包含分子分母都统计到的比值
+        """
+        return {name: self.counters[numerator] / self.counters[denominator]
+                for name, numerator, denominator in RATIOS
+                if numerator in self.counters and self.counters.get(denominator)}
+
+    def report(self, kind="text"):
+        """
+        Args:
+            kind: STATS_KINDS之一
+
+        Returns:
+            统计报告
+        """
+        if kind == "json":
+            return json.dumps({"phases": self.phases, "counters": self.counters, "ratios": self.ratios()},
+                              ensure_ascii=False, indent=2)
+        phaseTable = pt.PrettyTable()
+        phaseTable.field_names = ["阶段", "耗时(ms)", "次数", "内存峰值(KB)"]
+        for name, record in self.phases.items():
+            peak = "-" if record["peakBytes"] is None else "%.1f" % (record["peakBytes"] / 1024)
+            phaseTable.add_row([name, "%.3f" % (record["seconds"] * 1000), record["calls"], peak])
+        counterTable = pt.PrettyTable()
+        counterTable.field_names = ["计数", "值"]
+        for name, value in self.counters.items():
+            counterTable.add_row([name, value])
+        for name, value in self.ratios().items():
+            counterTable.add_row([name, "%.3f" % value])
+        return str(phaseTable) + "\n" + str(counterTable)
+
+
+def measure(stats, name):
+    """
+    stats为None时返回什么都不做的上下文，调用者不必区分是否开启了统计
+    """
+    if stats is None:
+        return contextlib.nullcontext()
+    return stats.phase(name)
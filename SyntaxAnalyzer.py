@@ -1,6 +1,27 @@
 import json
+from array import array
+from collections import deque
 from graphviz import Digraph
 import prettytable as pt
+from GrammarAnalysis import GrammarAnalysis
+from ParseTree import ParseTree, NO_NODE
+from Stats import measure
+from TokenStore import TokenStore, TokenReader
+
+# ACTION表的编码: 0 出错，正数 n 表示移进到状态 n-1，负数 -n 表示用产生式 n-1 规约，
+# 用产生式0 (S'->CODE) 规约即为接受
+ACTION_ERROR = 0
+ACTION_ACCEPT = -1
+# GOTO表中没有转移的格子
+GOTO_ERROR = -1
+# 压缩表的check数组中不属于任何状态的位置
+CHECK_EMPTY = -1
+# LALR(1)向前搜索符传播算法中使用的哑符号，不会出现在文法中
+LALR_DUMMY = "<LALR#>"
+# 语法分析过程记录的表头
+SYNTAX_TRACE_FIELDS = ["分析动作", "单词", "产生式"]
+# 增量分析逐层尝试单独重新分析包含编辑位置的节点时，各次尝试合计最多执行的分析步数，超过时从根节点重新分析
+REPARSE_NODE_BUDGET = 1 << 14
 
 
 class LRDFANode:
@@ -13,12 +34,14 @@ class LRDFANode:
         dotPosList: 存放每条产生式中的 · 的位置的列表
         symbolsList: 存放每条产生式的向前搜索符的列表
         nextStatesList: 次态节点编号列表
+        kernelSize: 核心项目的数量，列表中前kernelSize条为核心项目，其后为闭包加入的项目
     """
     index = 0
     productionIDXList = None
     dotPosList = None
     symbolsList = None
     nextStatesList = None
+    kernelSize = 0
 
     def __init__(self, idx):
         self.index = idx
@@ -29,20 +52,136 @@ class LRDFANode:
 
 
 class SyntaxAnalyzer:
+    """
+    LR(1)语法分析类
+
+    Attributes:
+        algorithm: 分析表构建算法，lr1 为规范LR(1)，lalr 为LALR(1)
+        grammar: GrammarAnalysis对象，文法的nullable、FIRST集和FOLLOW集
+        ACTION, GOTO: 以字典列表形式存放的分析表，用于打印
+        terminals, nonterminals: 按编号排列的终结符和非终结符，<#> 的编号为0
+        terminalIDs, nonterminalIDs: 符号到编号的映射
+        ACTIONTable: 状态数 × 终结符数 的稠密ACTION表，编码见ACTION_ERROR，只在构建分析表时使用，压缩后为None
+        GOTOTable: 状态数 × 非终结符数 的稠密GOTO表，同上
+        ACTIONBase, ACTIONCheck, ACTIONValue: 行位移压缩后的ACTION表，状态s遇到终结符t时
+            i = ACTIONBase[s] + t，ACTIONCheck[i] == s 时动作为ACTIONValue[i]，否则出错
+        GOTOBase, GOTOCheck, GOTOValue: 行位移压缩后的GOTO表，查法同上，check不符时为GOTO_ERROR
+        defaultReductions: defaultReductions[状态] 为该状态的默认规约，状态中唯一的动作是同一个规约时
+            不查向前看符号直接规约，否则为ACTION_ERROR
+        conflicts: 构建稠密表时发现的冲突，先出现的动作优先
+        mergeConflicts: LALR(1)分析表中合并同心状态引入的归约-归约冲突，格式同conflicts，规范LR(1)时为空
+        leftProductions: 左部非终结符到其产生式编号列表的映射
+        suffixFirst: suffixFirst[产生式][i] 为该产生式右部第i个符号起的符号串的 (FIRST集, 能否推导出空)
+        expected: expected[状态] 为该状态下ACTION表不出错的终结符元组，用于报告语法错误
+        recoveryGotos: recoveryGotos[状态] 为该状态下GOTO表有转移的 (非终结符编号, 次态) 元组，用于错误恢复
+        errorItems: errorItems[状态] 为该状态中去重后的 (产生式编号, · 的位置) 元组，用于报告可能出错的产生式
+        productionFile: 二型文法文件，从缓存加载时用来重新构建打印所需的DFA和ACTION/GOTO表
+        error: 最近一次分析遇到的第一个错误 {"line": 行号, "token": 单词}，分析成功时为None
+        errors: 最近一次analyze遇到的所有错误
+        tree: 最近一次analyze构建的语法树，没有要求构建或分析出错时为None
+        stats: Stats对象，为None时不统计
+    """
+    algorithm = "lr1"
+    productionFile = None
     productions = None
-    First = None
+    grammar = None
     DFA = None
     moveNodeCnt = 0
     GOTO = None
     ACTION = None
+    terminals = None
+    nonterminals = None
+    terminalIDs = None
+    nonterminalIDs = None
+    ACTIONTable = None
+    GOTOTable = None
+    ACTIONBase = None
+    ACTIONCheck = None
+    ACTIONValue = None
+    GOTOBase = None
+    GOTOCheck = None
+    GOTOValue = None
+    defaultReductions = None
+    conflicts = None
+    mergeConflicts = None
+    leftProductions = None
+    suffixFirst = None
+    expected = None
+    recoveryGotos = None
+    errorItems = None
+    error = None
+    errors = None
+    tree = None
+    stats = None
+    # 写入文法缓存的属性，只有分析时用到的压缩表，DFA和ACTION/GOTO表只在打印时由文法文件重新构建，
+    # 符号编号、expected和recoveryGotos在加载时由这些属性推出
+    CACHED_ATTRIBUTES = ("productions", "terminals", "nonterminals", "ACTIONBase", "ACTIONCheck", "ACTIONValue",
+                         "GOTOBase", "GOTOCheck", "GOTOValue", "defaultReductions", "conflicts", "mergeConflicts")
 
-    def __init__(self, productionFile):
+    def __init__(self, productionFile, cache=None, algorithm="lr1", stats=None):
+        """
+        Args:
+            productionFile: 二型文法文件
+            cache: GrammarCache对象，为None时不使用缓存
+            algorithm: lr1 构建规范LR(1)分析表，lalr 构建LALR(1)分析表
+            stats: Stats对象，统计各阶段的耗时、内存和计数，为None时不统计
+        """
         self.productions = list()
-        self.First = dict()
-        self.__EXTProductions(productionFile)
-        self.__getFIRST()
-        self.__getDFA()
-        self.__getTable()
+        self.productionFile = productionFile
+        self.algorithm = algorithm
+        self.stats = stats
+        if cache is not None:
+            with measure(stats, "syntax.cacheLoad"):
+                compiled = cache.load(productionFile, "syntax", (algorithm,))
+                if compiled is not None:
+                    for name in self.CACHED_ATTRIBUTES:
+                        setattr(self, name, compiled[name])
+                    self.__getSymbolIDs()
+                    self.__getRecoveryTable()
+                    self.__unpackErrorItems(compiled)
+            if compiled is not None:
+                self.__reportReduceConflicts()
+                return
+        with measure(stats, "syntax.grammar"):
+            self.__EXTProductions(productionFile)
+            self.grammar = GrammarAnalysis(self.productions)
+            self.__indexProductions()
+        with measure(stats, "syntax.dfa"):
+            if algorithm == "lalr":
+                self.__getLALRDFA()
+            else:
+                self.__getDFA()
+        with measure(stats, "syntax.table"):
+            self.__getTable()
+            self.__getDenseTable()
+        with measure(stats, "syntax.compress"):
+            self.__getCompressedTable()
+        self.__getRecoveryTable()
+        self.__getErrorItems()
+        self.mergeConflicts = list()
+        if algorithm == "lalr":
+            with measure(stats, "syntax.mergeConflicts"):
+                self.mergeConflicts = self.__getMergeConflicts()
+        self.__reportReduceConflicts()
+        if stats is not None:
+            stats.count("syntax.productions", len(self.productions))
+            stats.count("syntax.terminals", len(self.terminals))
+            stats.count("syntax.nonterminals", len(self.nonterminals))
+            stats.count("syntax.states", len(self.DFA))
+            stats.count("syntax.items", sum(len(node.productionIDXList) for node in self.DFA))
+            stats.count("syntax.transitions", sum(len(node.nextStatesList) for node in self.DFA))
+            stats.count("syntax.actionEntries", len(self.ACTION))
+            stats.count("syntax.gotoEntries", len(self.GOTO))
+            stats.count("syntax.conflicts", len(self.conflicts))
+            stats.count("syntax.denseCells", len(self.DFA) * (len(self.terminals) + len(self.nonterminals)))
+            stats.count("syntax.compressedCells", len(self.ACTIONValue) + len(self.GOTOValue))
+            stats.count("syntax.defaultReductionStates",
+                        sum(1 for action in self.defaultReductions if action != ACTION_ERROR))
+        if cache is not None:
+            with measure(stats, "syntax.cacheStore"):
+                compiled = {name: getattr(self, name) for name in self.CACHED_ATTRIBUTES}
+                compiled.update(self.__packErrorItems())
+                cache.store(productionFile, "syntax", compiled, (algorithm,))
 
     def __EXTProductions(self, productionFile):
         """
@@ -81,164 +220,79 @@ class SyntaxAnalyzer:
             print("(%2d) %s -> %s" % (cnt, eachProduction['left'], right))
             cnt += 1
 
-    def __getTokenType(self, token):
+    def __indexProductions(self):
         """
-        判断token类型
+        按左部非终结符索引产生式，并把文法分析得到的产生式后缀FIRST集转换为终结符元组，
+        闭包运算时直接查表，不需要再逐个符号推导
         """
-        if token is not None and token[0] == "<" and token[-1] == ">":
-            if token in ["<constant>", "<identifier>", "<#>"]:
-                return "alias"  # 终结符
-            return "state"  # 非终结符
-        return "common"  # 终结符
-
-    def __getFIRST(self):
-        """
-        First集创建算法
-        """
-        for eachProduction in self.productions:
-            self.First[eachProduction['left']] = []
-        # 算法停止标志
-        reached = True
-        while reached:
-            reached = False
-            # 遍历每个产生式
-            for eachProduction in self.productions:
-                # 查看每个产生式的右部，如果某产生式的右部非空，即该产生式一定能推导
-                if len(eachProduction['right']) != 0:  # not A-><#>
-                    # 判断当前产生式的右部的第一个符号是否为非终结符
-                    if self.__getTokenType(eachProduction['right'][0]) == "state":
-                        # 判断是否为左递归
-                        if eachProduction['right'][0] == eachProduction['left']:
-                            continue  # 左递归跳过该条产生式
-                        # 非左递归，则看其右部每个符号，首个满足的就跳出
-                        isAllHASH = True  # 假设左边全都为可推出空的非终结符
-                        for eachRight in eachProduction['right']:
-                            # 判断该符号是否为非终结符
-                            if self.__getTokenType(eachRight) == 'state':
-                                # 若为非终结符，看该非终结符的FIRST集是否为空
-                                if len(self.First[eachRight]) != 0:
-                                    # 该非终结符的FIRST集不为空，逐个查看
-                                    for eachSymbol in self.First[eachRight]:
-                                        # 判断右部这个非终结符的FIRST集中的终结符是否存在左部的FIRST集中
-                                        if eachSymbol != "<#>" and \
-                                                eachSymbol not in self.First[eachProduction['left']]:
-                                            self.First[eachProduction['left']].append(eachSymbol)
-                                            reached = True
-                                    if "<#>" not in self.First[eachRight]:
-                                        isAllHASH = False  # 左边存在不可推出空的非终结符
-                                        break  # 该非终结符不可推导出空，不再看它右边的符号
-                                else:
-                                    isAllHASH = False  # 左边还有没处理过的非终结符
-                                    break  # FIRST为空，不再看该产生式右部的符号，等下一轮
-                            elif eachRight not in self.First[eachProduction['left']]:
-                                # 非终结符，加入到FIRST集中
-                                self.First[eachProduction['left']].append(eachRight)
-                                isAllHASH = False  # 左边存在非终结符
-                                reached = True
-                                break
-                        if isAllHASH and "<#>" not in self.First[eachProduction['left']]:
-                            self.First[eachProduction['left']].append("<#>")
-                    else:  # 不是非终结符，则将其加入到First中
-                        if eachProduction['right'][0] not in self.First[eachProduction['left']]:
-                            self.First[eachProduction['left']].append(eachProduction['right'][0])
-                            reached = True
-                else:  # 右部为空，则其可能存在其他产生式，保留
-                    if "<#>" not in self.First[eachProduction['left']]:
-                        self.First[eachProduction['left']].append("<#>")
-                        reached = True
+        self.leftProductions = dict()
+        for productionIdx in range(len(self.productions)):
+            self.leftProductions.setdefault(self.productions[productionIdx]['left'], []).append(productionIdx)
+        self.suffixFirst = [[(self.grammar.symbolsOf(bits), nullable) for bits, nullable in suffix]
+                            for suffix in self.grammar.suffixFirst]
 
     def __closure(self, node):
         """
         LR(1)状态集DFA闭包算法
+
+        以工作表的方式计算，项目的向前搜索符集合变大后重新放回工作表，
+        把新增的向前搜索符继续传播给由它加入的项目
         """
-        productionCnt = 0
-        # 遍历该节点中的产生式
-        while productionCnt < len(node.productionIDXList):
-            # DFA中的一条产生式所做的动作
-            curProduction = node.productionIDXList[productionCnt]  # 取出产生式
-            curProductionRightList = self.productions[curProduction]['right']  # 右部
-            dotPos = node.dotPosList[productionCnt]  # 点的位置
-            if dotPos < len(curProductionRightList) and self.__getTokenType(curProductionRightList[dotPos]) == 'state':
-                # 点的右部是一个非终结符
-                symbol = set()
-                step = 1
-                empCnt = 0
-                while dotPos + step < len(curProductionRightList):  # 搜索符号集的计算
-                    if self.__getTokenType(curProductionRightList[dotPos + step]) == "state":
-                        # 后面还有非终结符
-                        reachEmp = False
-                        for eachTmpState in self.First[curProductionRightList[dotPos + step]]:
-                            if eachTmpState != "<#>":
-                                symbol.add(eachTmpState)
-                            else:
-                                reachEmp = True
-                                empCnt += 1  # 记录可到达<#>的非终结集数量
-                        if not reachEmp:
-                            break  # 这个状态不能到达<#>，不用再继续搜索
-                    else:
-                        # 后面不是非终结符，不再继续搜素
-                        symbol.add(curProductionRightList[dotPos + step])
-                        break
-                    step += 1
-                if empCnt + 1 == len(curProductionRightList) - dotPos:  # 圆点后面的非终结符都可以推导出空
-                    for eachSymbol in node.symbolsList[productionCnt]:
-                        symbol.add(eachSymbol)  # 当前产生式的向前搜索
-                # recalculateStart = -1
-                for productionIdx in range(len(self.productions)):
-                    if self.productions[productionIdx]['left'] == curProductionRightList[dotPos]:
-                        # 闭包，将右部中点右边的非终结符的产生式加入到当前节点中
-                        canCombine = False
-                        for k in range(len(node.productionIDXList)):
-                            # 看当前节点已经记录有的产生式，[k]
-                            if node.productionIDXList[k] == productionIdx and node.dotPosList[k] == 0:
-                                # 当前节点已有的产生式的圆点在开头
-                                canCombine = True
-                                for eachSymbol in symbol:
-                                    if eachSymbol not in node.symbolsList[k]:
-                                        node.symbolsList[k].append(eachSymbol)  # 合并
-                                        # if recalculateStart == -1 and k < productionCnt:
-                                        #     recalculateStart = k - 1
-                                break
-                        if not canCombine:
-                            # 新的产生式，插入
-                            node.productionIDXList.append(productionIdx)
-                            node.dotPosList.append(0)
-                            node.symbolsList.append(list(symbol))
-                # if recalculateStart != -1:
-                #     productionCnt = recalculateStart
-            productionCnt += 1
+        itemPos = dict()  # (产生式编号, 点的位置) -> 项目在节点中的下标
+        symbolSets = list()
+        for k in range(len(node.productionIDXList)):
+            itemPos[(node.productionIDXList[k], node.dotPosList[k])] = k
+            symbolSets.append(set(node.symbolsList[k]))
+        workList = deque(range(len(node.productionIDXList)))
+        inWorkList = set(workList)
+        while workList:
+            k = workList.popleft()
+            inWorkList.discard(k)
+            curProduction = node.productionIDXList[k]
+            curProductionRightList = self.productions[curProduction]['right']
+            dotPos = node.dotPosList[k]
+            if dotPos == len(curProductionRightList) or curProductionRightList[dotPos] not in self.leftProductions:
+                continue  # 点的右边不是非终结符
+            # 向前搜索符为圆点后非终结符之后的符号串的FIRST集，该符号串可推导出空时还包括当前项目的向前搜索符
+            first, nullable = self.suffixFirst[curProduction][dotPos + 1]
+            symbol = list(first)
+            if nullable:
+                symbol.extend(i for i in node.symbolsList[k] if i not in first)
+            for productionIdx in self.leftProductions[curProductionRightList[dotPos]]:
+                pos = itemPos.get((productionIdx, 0))
+                if pos is None:
+                    # 新的产生式，插入
+                    pos = len(node.productionIDXList)
+                    itemPos[(productionIdx, 0)] = pos
+                    node.productionIDXList.append(productionIdx)
+                    node.dotPosList.append(0)
+                    node.symbolsList.append(symbol[:])
+                    symbolSets.append(set(symbol))
+                else:
+                    # 已有的项目，合并向前搜索符
+                    grown = [i for i in symbol if i not in symbolSets[pos]]
+                    if not grown:
+                        continue
+                    node.symbolsList[pos].extend(grown)
+                    symbolSets[pos].update(grown)
+                if pos not in inWorkList:
+                    workList.append(pos)
+                    inWorkList.add(pos)
+        if self.stats is not None:
+            self.stats.count("syntax.closureCalls")
+            self.stats.count("syntax.closureItems", len(node.productionIDXList))
         return node
 
-    def __isSameNode(self, newNode, oldNode):
+    def __kernelKey(self, node):
         """
-        判断两个节点是否一致，判断产生式列表和点的位置还有符号
+        计算节点核心项目的哈希键，核心项目相同的LR(1)项目集闭包也相同，
+        因此只比较核心即可判断两个节点是否一致
+
+        Returns:
+            由 (产生式编号, 点的位置, 向前搜索符集合) 组成的frozenset
         """
-        # if newNode.index == 170 and oldNode.index == 71:
-        #     print(newNode)
-        #     print(oldNode)
-        if len(newNode.productionIDXList) != len(oldNode.productionIDXList):
-            # logger.info("%d-%d-%s" % (newNode.index, oldNode.index, "false"))
-            return False
-        newProductionCombined = list()
-        for i in range(len(newNode.productionIDXList)):
-            newNode.symbolsList[i].sort()
-            newProductionCombined.append({
-                "productionIDX": newNode.productionIDXList[i],
-                "dotPos": newNode.dotPosList[i],
-                "symbols": newNode.symbolsList[i]
-            })
-        for i in range(len(oldNode.productionIDXList)):
-            oldNode.symbolsList[i].sort()
-            oldProductionCombined = {
-                "productionIDX": oldNode.productionIDXList[i],
-                "dotPos": oldNode.dotPosList[i],
-                "symbols": oldNode.symbolsList[i]
-            }
-            if oldProductionCombined not in newProductionCombined:
-                # logger.info("%d-%d-%s" % (newNode.index, oldNode.index, "false"))
-                return False
-        # logger.info("%d-%d-%s" % (newNode.index, oldNode.index, "true"))
-        return True
+        return frozenset((node.productionIDXList[i], node.dotPosList[i], frozenset(node.symbolsList[i]))
+                         for i in range(node.kernelSize))
 
     def __go(self):
         """
@@ -249,63 +303,42 @@ class SyntaxAnalyzer:
             # DFANodeIdx是当前正在分析的节点
             DFANodeIdx = self.moveNodeCnt
             DFANode = self.DFA[DFANodeIdx]
-            # print(",".join([str(i) for i in DFANode.productionIDXList]))
-            moveInTokens = list()  # 该节点可以移进的符号集
+            # 按移进符号对项目分组，保持符号第一次出现的顺序
+            moveInItems = dict()
             for i in range(len(DFANode.productionIDXList)):
-                productionIdx = DFANode.productionIDXList[i]
-                productionRight = self.productions[productionIdx]['right']
+                productionRight = self.productions[DFANode.productionIDXList[i]]['right']
                 dotPos = DFANode.dotPosList[i]
-                if dotPos < len(productionRight):
-                    moveInTokens.append(productionRight[dotPos])
-                else:
-                    moveInTokens.append("")
-            for i in range(len(DFANode.productionIDXList)):
-                productionIdx = DFANode.productionIDXList[i]
-                productionRight = self.productions[productionIdx]['right']
-                dotPos = DFANode.dotPosList[i]
-                if dotPos < len(productionRight):  # 不是规约状态               这个判断条件用于限制只有第一次字符出现才计算
-                    if productionRight[dotPos] in moveInTokens and moveInTokens.index(productionRight[dotPos]) == i:
-                        # 移进，创建一个新的项目集状态节点
-                        newDFANodeIdx = len(self.DFA)
-                        newDFANode = LRDFANode(newDFANodeIdx)
-                        for j in range(i, len(DFANode.productionIDXList)):
-                            if productionRight[dotPos] == moveInTokens[j]:  # 同字符移进的产生式j
-                                canCombine = False  # 判断是否可以合并产生式
-                                # for k in range(len(newDFANode.productionIDXList)):
-                                #     if newDFANode.productionIDXList[k] == DFANode.productionIDXList[j] and \
-                                #             newDFANode.dotPosList[k] == DFANode.dotPosList[j] + 1:
-                                #         # 新节点中的产生式k是旧节点中产生式j的移进
-                                #         for eachSymbol in DFANode.symbolsList:
-                                #             if eachSymbol not in newDFANode.symbolsList[k]:
-                                #                 newDFANode.symbolsList[k].append(eachSymbol)
-                                #         canCombine = True
-                                #         break
-                                if not canCombine:
-                                    # 不可以合并，单独存一条产生式
-                                    newDFANode.productionIDXList.append(DFANode.productionIDXList[j])
-                                    newDFANode.dotPosList.append(DFANode.dotPosList[j] + 1)
-                                    newDFANode.symbolsList.append(DFANode.symbolsList[j])
-                        # 新节点闭包运算
-                        newDFANode = self.__closure(newDFANode)
-                        findNodeIdx = -1
-                        for j in range(len(self.DFA)):
-                            # 看该新节点是否已存在
-                            if self.__isSameNode(newDFANode, self.DFA[j]):
-                                findNodeIdx = j
-                                break
-                        if findNodeIdx == -1:
-                            self.DFA.append(newDFANode)
-                            self.DFA[DFANodeIdx].nextStatesList.append({
-                                "character": productionRight[dotPos],
-                                "index": newDFANodeIdx
-                            })
-                        else:
-                            self.DFA[DFANodeIdx].nextStatesList.append({
-                                "character": productionRight[dotPos],
-                                "index": findNodeIdx
-                            })
+                if dotPos < len(productionRight):  # 不是规约项目
+                    moveInItems.setdefault(productionRight[dotPos], []).append(i)
+            for moveInToken, items in moveInItems.items():
+                # 移进，创建一个新的项目集状态节点，同一项目的向前搜索符合并
+                newDFANode = LRDFANode(len(self.DFA))
+                itemPos = dict()
+                for j in items:
+                    item = (DFANode.productionIDXList[j], DFANode.dotPosList[j] + 1)
+                    if item in itemPos:
+                        symbols = newDFANode.symbolsList[itemPos[item]]
+                        symbols.extend([i for i in DFANode.symbolsList[j] if i not in symbols])
+                    else:
+                        itemPos[item] = len(newDFANode.productionIDXList)
+                        newDFANode.productionIDXList.append(item[0])
+                        newDFANode.dotPosList.append(item[1])
+                        newDFANode.symbolsList.append(DFANode.symbolsList[j][:])
+                newDFANode.kernelSize = len(newDFANode.productionIDXList)
+                # 看该新节点是否已存在，不存在时才需要做闭包运算
+                key = self.__kernelKey(newDFANode)
+                findNodeIdx = self.__kernelIndex.get(key)
+                if self.stats is not None:
+                    self.stats.count("syntax.kernelLookups")
+                if findNodeIdx is None:
+                    findNodeIdx = newDFANode.index
+                    self.__kernelIndex[key] = findNodeIdx
+                    self.DFA.append(self.__closure(newDFANode))
+                self.DFA[DFANodeIdx].nextStatesList.append({
+                    "character": moveInToken,
+                    "index": findNodeIdx
+                })
             self.moveNodeCnt += 1
-            # logger.info("%d %d" % (self.moveNodeCnt, len(self.DFA)))
 
     def __getDFA(self):
         """
@@ -315,13 +348,235 @@ class SyntaxAnalyzer:
         node.productionIDXList.append(0)
         node.dotPosList.append(0)
         node.symbolsList.append(['<#>'])  # LR1状态集初始化节点
+        node.kernelSize = 1
+        self.__kernelIndex = {self.__kernelKey(node): 0}
         node = self.__closure(node)
         self.DFA = [node]
         self.__go()
-        # self.showDFA()
-        # print(node)
+
+    def __getLR0DFA(self):
+        """
+        创建LR(0)项目集DFA，项目为 (产生式编号, 点的位置)
+
+        Returns:
+            (kernels, transitions)，kernels[i]为状态i的核心项目列表，
+            transitions[i]为状态i的 {移进符号: 次态编号}，按符号第一次出现的顺序排列
+        """
+        leftProductions = self.leftProductions
+        kernels = [[(0, 0)]]
+        kernelIndex = {frozenset(kernels[0]): 0}
+        transitions = list()
+        stateIdx = 0
+        while stateIdx < len(kernels):
+            # LR(0)闭包
+            items = kernels[stateIdx][:]
+            added = set(items)
+            itemCnt = 0
+            while itemCnt < len(items):
+                productionIdx, dotPos = items[itemCnt]
+                right = self.productions[productionIdx]['right']
+                if dotPos < len(right) and right[dotPos] in leftProductions:
+                    for eachProductionIdx in leftProductions[right[dotPos]]:
+                        if (eachProductionIdx, 0) not in added:
+                            added.add((eachProductionIdx, 0))
+                            items.append((eachProductionIdx, 0))
+                itemCnt += 1
+            # 按移进符号分组得到次态核心
+            nextKernels = dict()
+            for productionIdx, dotPos in items:
+                right = self.productions[productionIdx]['right']
+                if dotPos < len(right):
+                    nextKernels.setdefault(right[dotPos], []).append((productionIdx, dotPos + 1))
+            nextStates = dict()
+            for moveInToken, kernel in nextKernels.items():
+                key = frozenset(kernel)
+                if key not in kernelIndex:
+                    kernelIndex[key] = len(kernels)
+                    kernels.append(kernel)
+                nextStates[moveInToken] = kernelIndex[key]
+            transitions.append(nextStates)
+            stateIdx += 1
+        return kernels, transitions
+
+    def __getLALRDFA(self):
+        """
+        创建LALR(1)状态集DFA
+
+        先构建LR(0)项目集DFA，再用传播算法计算核心项目的向前搜索符：
+        对每个核心项目K求 [K, LALR_DUMMY] 的LR(1)闭包，闭包中的项目移进后，
+        非哑符号是自生的向前搜索符，哑符号说明K的向前搜索符会传播到移进后的核心项目。
+        最后沿传播关系迭代至不动点，不需要先构建规范LR(1)再合并同心状态。
+        """
+        kernels, transitions = self.__getLR0DFA()
+        lookaheads = [[set() for i in kernel] for kernel in kernels]
+        kernelPos = [{kernel[i]: i for i in range(len(kernel))} for kernel in kernels]
+        propagation = dict()
+        lookaheads[0][0].add("<#>")
+        # 判断归约-归约冲突是否由合并引入时使用：每条转移 (前驱, 次态, 次态核心项目) 和每个规约项目 (状态, 产生式)
+        # 上自生的向前搜索符，以及向前搜索符从哪些核心项目传播而来
+        spontaneous = dict()
+        sources = dict()
+        for stateIdx in range(len(kernels)):
+            for itemIdx in range(len(kernels[stateIdx])):
+                node = LRDFANode(0)
+                node.productionIDXList.append(kernels[stateIdx][itemIdx][0])
+                node.dotPosList.append(kernels[stateIdx][itemIdx][1])
+                node.symbolsList.append([LALR_DUMMY])
+                node.kernelSize = 1
+                node = self.__closure(node)
+                targets = list()
+                for i in range(len(node.productionIDXList)):
+                    right = self.productions[node.productionIDXList[i]]['right']
+                    dotPos = node.dotPosList[i]
+                    if dotPos == len(right):
+                        key = (stateIdx, node.productionIDXList[i])
+                        for eachSymbol in node.symbolsList[i]:
+                            if eachSymbol == LALR_DUMMY:
+                                sources.setdefault(key, set()).add(itemIdx)
+                            else:
+                                spontaneous.setdefault(key, set()).add(eachSymbol)
+                        continue
+                    nextStateIdx = transitions[stateIdx][right[dotPos]]
+                    nextItemIdx = kernelPos[nextStateIdx][(node.productionIDXList[i], dotPos + 1)]
+                    key = (stateIdx, nextStateIdx, nextItemIdx)
+                    for eachSymbol in node.symbolsList[i]:
+                        if eachSymbol == LALR_DUMMY:
+                            targets.append((nextStateIdx, nextItemIdx))
+                            sources.setdefault(key, set()).add(itemIdx)
+                        else:
+                            lookaheads[nextStateIdx][nextItemIdx].add(eachSymbol)
+                            spontaneous.setdefault(key, set()).add(eachSymbol)
+                propagation[(stateIdx, itemIdx)] = targets
+        # 沿传播关系扩散向前搜索符，只有向前搜索符变多的项目才需要重新传播
+        workList = [(stateIdx, itemIdx) for stateIdx in range(len(kernels))
+                    for itemIdx in range(len(kernels[stateIdx])) if lookaheads[stateIdx][itemIdx]]
+        propagations = 0
+        while workList:
+            stateIdx, itemIdx = workList.pop()
+            propagations += 1
+            symbols = lookaheads[stateIdx][itemIdx]
+            for nextStateIdx, nextItemIdx in propagation[(stateIdx, itemIdx)]:
+                target = lookaheads[nextStateIdx][nextItemIdx]
+                if not symbols <= target:
+                    target |= symbols
+                    workList.append((nextStateIdx, nextItemIdx))
+        if self.stats is not None:
+            self.stats.count("syntax.lr0States", len(kernels))
+            self.stats.count("syntax.lalrPropagations", propagations)
+        predecessors = [list() for kernel in kernels]
+        for stateIdx in range(len(kernels)):
+            for nextStateIdx in transitions[stateIdx].values():
+                predecessors[nextStateIdx].append(stateIdx)
+        self.__lookaheadOrigins = (lookaheads, spontaneous, sources, predecessors)
+        # 由带向前搜索符的核心项目求闭包，得到与LR(1)相同形式的DFA节点
+        self.DFA = list()
+        for stateIdx in range(len(kernels)):
+            node = LRDFANode(stateIdx)
+            for itemIdx in range(len(kernels[stateIdx])):
+                node.productionIDXList.append(kernels[stateIdx][itemIdx][0])
+                node.dotPosList.append(kernels[stateIdx][itemIdx][1])
+                node.symbolsList.append(sorted(lookaheads[stateIdx][itemIdx]))
+            node.kernelSize = len(node.productionIDXList)
+            node = self.__closure(node)
+            for moveInToken, nextStateIdx in transitions[stateIdx].items():
+                node.nextStatesList.append({
+                    "character": moveInToken,
+                    "index": nextStateIdx
+                })
+            self.DFA.append(node)
+
+    def __getMergeConflicts(self):
+        """
+        找出LALR(1)分析表中由合并同心状态引入的归约-归约冲突，只使用传播算法记录的向前搜索符来源，不构建规范LR(1)
+
+        Returns:
+            conflicts中由合并引入的归约-归约冲突
+        """
+        mergeConflicts = [eachConflict for eachConflict in self.conflicts
+                          if eachConflict["kept"] < 0 and eachConflict["dropped"] < 0 and
+                          not self.__sharedLookahead(eachConflict["index"], -eachConflict["kept"] - 1,
+                                                     -eachConflict["dropped"] - 1, eachConflict["character"])]
+        self.__lookaheadOrigins = None
+        return mergeConflicts
+
+    def __sharedLookahead(self, stateIdx, kept, dropped, symbol):
+        """
+        判断是否存在一个与stateIdx同心的LR(1)状态，其中产生式kept和dropped的规约项目都以symbol为向前搜索符，
+        即冲突在规范LR(1)中已经存在
+
+        LR(1)状态中项目的向前搜索符由自生的部分和从本状态核心项目传播来的部分组成，自生的部分与是哪个同心状态无关；
+        LALR(1)中核心项目的向前搜索符是所有同心状态的并集。两个项目的symbol都是自生的、一个自生另一个可传播到、
+        或者来自同一个核心项目时，冲突必然已经存在；来自两个不同的核心项目时，核心项目的向前搜索符又由前驱状态
+        中移进前的项目决定，沿前驱状态向上查找两者同时有symbol的状态
+
+        Returns:
+            冲突在规范LR(1)中已经存在时为True
+        """
+        lookaheads, spontaneous, sources, predecessors = self.__lookaheadOrigins
+        empty = set()
+        pairs = list()  # 待查找的 (状态, 核心项目, 核心项目)
+        visited = set()
+
+        def shared(stateIdx, first, second):
+            """
+            first, second: 两个项目向前搜索符来源的键
+
+            Returns:
+                必然存在两个项目同时有symbol的LR(1)状态时为True，需要向上查找的核心项目对加入pairs
+            """
+            firstKernels = [i for i in sources.get(first, empty) if symbol in lookaheads[stateIdx][i]]
+            secondKernels = [i for i in sources.get(second, empty) if symbol in lookaheads[stateIdx][i]]
+            firstSpontaneous = symbol in spontaneous.get(first, empty)
+            secondSpontaneous = symbol in spontaneous.get(second, empty)
+            if not (firstSpontaneous or firstKernels) or not (secondSpontaneous or secondKernels):
+                return False
+            if firstSpontaneous or secondSpontaneous or set(firstKernels) & set(secondKernels):
+                return True
+            for i in firstKernels:
+                for j in secondKernels:
+                    pair = (stateIdx, min(i, j), max(i, j))
+                    if pair not in visited:
+                        visited.add(pair)
+                        pairs.append(pair)
+            return False
+
+        if shared(stateIdx, (stateIdx, kept), (stateIdx, dropped)):
+            return True
+        while pairs:
+            stateIdx, i, j = pairs.pop()
+            for previous in predecessors[stateIdx]:
+                if shared(previous, (previous, stateIdx, i), (previous, stateIdx, j)):
+                    return True
+        return False
+
+    def __reportReduceConflicts(self):
+        """
+        打印LALR(1)分析表中合并同心状态引入的归约-归约冲突，从文法缓存读入分析表时同样打印
+        """
+        for eachConflict in self.mergeConflicts:
+            print("LALR(1)合并同心状态引入的归约-归约冲突(状态 %d, 符号 %s): 产生式 %d 与 %d，保留产生式 %d" % (
+                eachConflict["index"], eachConflict["character"],
+                -eachConflict["kept"] - 1, -eachConflict["dropped"] - 1, -eachConflict["kept"] - 1))
+
+    def __rebuildDFA(self):
+        """
+        从缓存加载时只有压缩表，打印DFA或ACTION/GOTO表之前由文法文件重新构建
+        """
+        if self.DFA is not None:
+            return
+        self.productions = list()
+        self.__EXTProductions(self.productionFile)
+        self.grammar = GrammarAnalysis(self.productions)
+        self.__indexProductions()
+        if self.algorithm == "lalr":
+            self.__getLALRDFA()
+            self.__lookaheadOrigins = None
+        else:
+            self.__getDFA()
+        self.__getTable()
 
     def showDFA(self):
+        self.__rebuildDFA()
         f = Digraph("LR1DFA", format="png")
         f.attr('node', shape='box')
         f.attr(rankdir='LR')
@@ -361,7 +616,7 @@ class SyntaxAnalyzer:
             # 看每个节点的边
             for nextState in self.DFA[i].nextStatesList:
                 # 状态转移符号是非终结符，放在GOTO表
-                if self.__getTokenType(nextState['character']) == 'state':
+                if self.grammar.isNonterminal(nextState['character']):
                     self.GOTO.append({
                         "index": i,
                         "state": nextState["character"],
@@ -409,131 +664,872 @@ class SyntaxAnalyzer:
                                 "content": productionIDX
                             })
 
-    def __queryACTION(self, state, token):
+    def __getDenseTable(self):
+        """
+        将ACTION和GOTO表转换为以符号编号为下标的稠密数组，查表为O(1)
+        同一格子有多个动作时保留先出现的动作（移进先于规约），冲突记录在conflicts中
+        """
+        self.terminals = self.grammar.terminals
+        self.nonterminals = self.grammar.nonterminals
+        self.terminalIDs = self.grammar.terminalIDs
+        self.nonterminalIDs = self.grammar.nonterminalIDs
+        stateCnt = len(self.DFA)
+        terminalCnt = len(self.terminals)
+        nonterminalCnt = len(self.nonterminals)
+        self.ACTIONTable = array('i', [ACTION_ERROR]) * (stateCnt * terminalCnt)
+        self.GOTOTable = array('i', [GOTO_ERROR]) * (stateCnt * nonterminalCnt)
+        self.conflicts = list()
         for eachAction in self.ACTION:
-            if eachAction["index"] == state:
-                if (token["type"] == "identifier" or token["type"] == "constant") and \
-                        "<" + token["type"] + ">" == eachAction["character"]:
-                    return eachAction  # identifier or constant
-                elif token["token"] == eachAction["character"]:
-                    return eachAction
-                elif eachAction["character"] == "<#>":
-                    return eachAction
+            if eachAction["type"] == "S":
+                code = eachAction["content"] + 1
+            elif eachAction["type"] == "r":
+                code = -eachAction["content"] - 1
+            else:
+                code = ACTION_ACCEPT
+            pos = eachAction["index"] * terminalCnt + self.terminalIDs[eachAction["character"]]
+            if self.ACTIONTable[pos] == ACTION_ERROR:
+                self.ACTIONTable[pos] = code
+            elif self.ACTIONTable[pos] != code:
+                self.conflicts.append({
+                    "index": eachAction["index"],
+                    "character": eachAction["character"],
+                    "kept": self.ACTIONTable[pos],
+                    "dropped": code
+                })
+        for eachGoto in self.GOTO:
+            pos = eachGoto["index"] * nonterminalCnt + self.nonterminalIDs[eachGoto["state"]]
+            self.GOTOTable[pos] = eachGoto["content"]
+
+    def __getSymbolIDs(self):
+        """
+        由按编号排列的终结符和非终结符得到符号到编号的映射
+        """
+        self.terminalIDs = {symbol: i for i, symbol in enumerate(self.terminals)}
+        self.nonterminalIDs = {symbol: i for i, symbol in enumerate(self.nonterminals)}
+
+    def __getRecoveryTable(self):
+        """
+        由压缩后的ACTION和GOTO表预先计算出错时需要的信息：每个状态期望的终结符和可用于恢复的GOTO转移。
+        check数组中同一状态的位置按列递增，与逐列查稠密表得到的顺序相同
+        """
+        stateCnt = len(self.defaultReductions)
+        expected = [[] for i in range(stateCnt)]
+        recoveryGotos = [[] for i in range(stateCnt)]
+        for i, state in enumerate(self.ACTIONCheck):
+            if state != CHECK_EMPTY:
+                expected[state].append(self.terminals[i - self.ACTIONBase[state]])
+        for i, state in enumerate(self.GOTOCheck):
+            if state != CHECK_EMPTY:
+                recoveryGotos[state].append((i - self.GOTOBase[state], self.GOTOValue[i]))
+        self.expected = [tuple(symbols) for symbols in expected]
+        self.recoveryGotos = [tuple(gotos) for gotos in recoveryGotos]
+
+    def __getErrorItems(self):
+        """
+        记录每个状态中去重后的项目，用于报告可能出错的产生式
+        """
+        self.errorItems = list()
+        for node in self.DFA:
+            items = list()
+            for idx, pos in zip(node.productionIDXList, node.dotPosList):
+                if (idx, pos) not in items:
+                    items.append((idx, pos))
+            self.errorItems.append(tuple(items))
+
+    def __packErrorItems(self):
+        """
+        把errorItems展开为三个一维数组写入缓存，第s个状态的项目在 errorItemStarts[s] 到 errorItemStarts[s + 1] 之间
+        """
+        starts = array('i', [0])
+        productions = array('i')
+        dots = array('i')
+        for items in self.errorItems:
+            for idx, pos in items:
+                productions.append(idx)
+                dots.append(pos)
+            starts.append(len(productions))
+        return {"errorItemStarts": self.__shrink(starts), "errorItemProductions": self.__shrink(productions),
+                "errorItemDots": self.__shrink(dots)}
+
+    def __unpackErrorItems(self, compiled):
+        """
+        由缓存中的一维数组还原errorItems，见__packErrorItems
+        """
+        starts = compiled["errorItemStarts"]
+        items = list(zip(compiled["errorItemProductions"], compiled["errorItemDots"]))
+        self.errorItems = [tuple(items[starts[state]:starts[state + 1]]) for state in range(len(starts) - 1)]
+
+    def __getCompressedTable(self):
+        """
+        找出可以默认规约的状态，再用行位移法把稠密的ACTION和GOTO表压缩为一维数组，压缩后丢弃稠密表
+        """
+        terminalCnt = len(self.terminals)
+        self.defaultReductions = array('i', [ACTION_ERROR]) * len(self.DFA)
+        for state in range(len(self.DFA)):
+            actions = set(self.ACTIONTable[state * terminalCnt:(state + 1) * terminalCnt])
+            actions.discard(ACTION_ERROR)
+            # 接受动作也编码为负数，不能作为默认规约，否则<#>之后的多余输入也会被接受
+            if len(actions) == 1 and next(iter(actions)) < ACTION_ACCEPT:
+                self.defaultReductions[state] = actions.pop()
+        self.defaultReductions = self.__shrink(self.defaultReductions)
+        self.ACTIONBase, self.ACTIONCheck, self.ACTIONValue = self.__packRows(self.ACTIONTable, terminalCnt,
+                                                                              ACTION_ERROR)
+        self.GOTOBase, self.GOTOCheck, self.GOTOValue = self.__packRows(self.GOTOTable, len(self.nonterminals),
+                                                                        GOTO_ERROR)
+        self.ACTIONTable = None
+        self.GOTOTable = None
+
+    def __packRows(self, table, width, empty):
+        """
+        行位移压缩 (comb vector)：各行的非空格子错开位置后叠放在同一个一维数组中，
+        check数组记录每个位置属于哪一行，查表仍为O(1)。从非空格子最多的行开始，每行放在第一个不冲突的位置
+
+        Args:
+            table: 稠密表，每行width个格子
+            empty: 表示空格子的值
+
+        Returns:
+            (base, check, value)，状态s第c列的格子在 i = base[s] + c 处，check[i] != s 时为空格子
+        """
+        stateCnt = len(table) // width
+        rows = [[(column, table[state * width + column]) for column in range(width)
+                 if table[state * width + column] != empty] for state in range(stateCnt)]
+        base = array('i', [0]) * stateCnt
+        occupied = 0  # 已占用位置的位图
+        for state in sorted(range(stateCnt), key=lambda i: -len(rows[i])):
+            if not rows[state]:
+                break
+            # 第i位为1表示位置i空闲，只看到占用部分之后一行的宽度，再往后的偏移总能放下
+            length = occupied.bit_length() + width
+            free = ((1 << length) - 1) & ~occupied
+            fits = (1 << length) - 1
+            # 按每个非空格子的列把空闲位图右移后求交，剩下的第i位为1表示偏移i放得下整行
+            for column, action in rows[state]:
+                fits &= free >> column
+            offset = (fits & -fits).bit_length() - 1
+            for column, action in rows[state]:
+                occupied |= 1 << (offset + column)
+            base[state] = offset
+        # 末尾留出一行的宽度，任意状态按任意列查表都不越界
+        size = max(occupied.bit_length(), max(base, default=0) + width)
+        check = array('i', [CHECK_EMPTY]) * size
+        value = array('i', [empty]) * size
+        for state in range(stateCnt):
+            for column, action in rows[state]:
+                check[base[state] + column] = state
+                value[base[state] + column] = action
+        return self.__shrink(base), self.__shrink(check), self.__shrink(value)
+
+    def __shrink(self, table):
+        """
+        数值都在16位有符号整数范围内时换用2字节的数组，压缩表的内存和缓存大小再减半
+        """
+        if -(1 << 15) <= min(table, default=0) and max(table, default=0) < 1 << 15:
+            return array('h', table)
+        return table
+
+    def __recoveryPoint(self, states, kind):
+        """
+        恐慌模式错误恢复：从栈顶向下找到第一个状态s，s经某个非终结符A转移后的状态能接受当前token，
+        即把出错位置之前的一段输入当作已经归约出的A，从当前token继续分析
+
+        Args:
+            states: 从栈顶到栈底的状态
+            kind: 当前token的终结符编号，见__tokenKind
+
+        Returns:
+            (弹出的状态数, A的转移的次态)，找不到时返回None
+        """
+        depth = 0
+        for state in states:
+            for nonterminalID, target in self.recoveryGotos[state]:
+                if self.__queryKind(target, kind) != ACTION_ERROR:
+                    return depth, target
+            depth += 1
         return None
 
+    def __reportError(self, state, line, text, lastText):
+        """
+        打印语法错误，包括期望的单词和可能出错的产生式
+
+        Args:
+            line, text: 出错的token的行号和单词
+            lastText: 上一个移进的单词
+        """
+        print("ACTION表查询错误(第 %d 行): %s" % (line, text))
+        errorProduction = "可能出错的产生式:\n"
+        for idx, pos in self.errorItems[state]:
+            left = self.productions[idx]['left']
+            rightL = self.productions[idx]['right'][:]
+            if pos != len(rightL) and rightL[pos - 1] != lastText:
+                continue
+            rightL.insert(pos, ' · ')
+            right = ' '.join(rightL)
+            errorProduction += '\t' + left + " -> " + right + "\n"
+        print("期望的单词: " + ' '.join(self.expected[state]))
+        print(errorProduction)
+
+    def __tokenKind(self, text, typeName):
+        """
+        Returns:
+            (按单词本身查到的终结符编号, 按类别查到的终结符编号)，只有标识符和常量才按类别查找，查不到时为-1
+        """
+        classID = -1
+        if typeName == "identifier" or typeName == "constant":
+            classID = self.terminalIDs.get("<" + typeName + ">", -1)
+        return self.terminalIDs.get(text, -1), classID
+
+    def __lookupAction(self, state, terminalID):
+        """
+        查压缩后的ACTION表，不使用默认规约
+        """
+        i = self.ACTIONBase[state] + terminalID
+        return self.ACTIONValue[i] if self.ACTIONCheck[i] == state else ACTION_ERROR
+
+    def __queryKind(self, state, kind):
+        """
+        查ACTION表，先按单词本身查找，查不到时再按类别查找；不使用默认规约，错误恢复时用来判断状态能否接受token
+
+        Args:
+            kind: __tokenKind的返回值
+
+        Returns:
+            编码后的动作，见ACTION_ERROR
+        """
+        action = ACTION_ERROR if kind[0] < 0 else self.__lookupAction(state, kind[0])
+        if action == ACTION_ERROR and kind[1] >= 0:
+            action = self.__lookupAction(state, kind[1])
+        return action
+
     def __queryGOTO(self, state, production):
-        for eachGoto in self.GOTO:
-            if eachGoto["index"] == state and eachGoto["state"] == production:
-                return eachGoto
-        return None
+        i = self.GOTOBase[state] + self.nonterminalIDs[production]
+        return self.GOTOValue[i] if self.GOTOCheck[i] == state else GOTO_ERROR
 
-    def analyze(self, tokenStream):
+    def analyze(self, tokenStream, sink=None, buildTree=False, shape=None):
         """
         语法分析函数
 
         Args:
-            tokenStream: 进行词法分析的token序列，由词法分析器生成
-
-        """
-        tokenStream.append({
-            "line": -1,
-            "type": "HASH",
-            "token": "<#>"
-        })  # 终止状态
-        # symbolStack = [{
-        #     "line": -1,
-        #     "type": "HASH",
-        #     "token": "<#>"
-        # }]
-        stateStack = [0]
-        analyzedTokenCnt = 0
-        tb = pt.PrettyTable()
-        tb.field_names = ["分析动作", "单词", "产生式"]
-        moveInToken = ""
-        while len(stateStack) > 0:
-            # stateOut = ''.join([str(i) for i in stateStack])
-            # symbolOut = ''.join([i['token'] for i in symbolStack])
-            token = tokenStream[analyzedTokenCnt]
-            # remainOut = tokenStream[analyzedTokenCnt]['token']
-            # print("正在识别：" + token['token'])
-            queryACTIONResult = self.__queryACTION(stateStack[-1], token)  # 先查ACTION表
-            if queryACTIONResult is None:
-                # 匹配出错
-                # print(tb)
-                print("ACTION表查询错误(第 %d 行): %s" % (token['line'], token['token']))
-                # @TODO 出错处理
-                errorProductionList = list()
-                for i in range(len(self.DFA[stateStack[-1]].productionIDXList)):
-                    idx = self.DFA[stateStack[-1]].productionIDXList[i]
-                    pos = self.DFA[stateStack[-1]].dotPosList[i]
-                    if (idx, pos) not in errorProductionList:
-                        errorProductionList.append((idx, pos))
-                errorProduction = "可能出错的产生式:\n"
-                for each in errorProductionList:
-                    left = self.productions[each[0]]['left']
-                    rightL = self.productions[each[0]]['right']
-                    # print(rightL[each[1]-1])
-                    if rightL[each[1] - 1] != tokenStream[analyzedTokenCnt - 1]["token"] and each[1] != len(rightL):
-                        continue
-                    rightL.insert(each[1], ' · ')
-                    right = ' '.join(rightL)
-                    errorProduction += '\t' + left + " -> " + right + "\n"
-                print(errorProduction)
+            tokenStream: 进行词法分析的token序列，由词法分析器生成，可以是TokenStore，
+                也可以是token字典的列表或LexicalAnalyze.tokens这样的生成器，经TokenReader按需逐个取出token；
+                两种输入都与parse一样按单词编号查表
+            sink: 记录分析过程的对象，见TraceSink，每次移进和规约记录一行 [分析动作, 单词, 产生式]，
+                分析结束时调用其close；为None时不记录
+            buildTree: 是否在同一遍分析中构建语法树，存放在tree中，只对TokenStore有效
+            shape: 构建抽象语法树的规则，格式见parse
+
+        """
+        self.tree = None
+        self.errors = list()
+        tokens = tokenStream if isinstance(tokenStream, TokenStore) else TokenReader(tokenStream)
+        tree = ParseTree(self.terminals + self.nonterminals) if buildTree and tokens is tokenStream else None
+        with measure(self.stats, "syntax.analyze"):
+            result = self.__parseFrom(tokens, 0, None, [], tree=tree,
+                                      shape=self.__compileShape(shape) if tree is not None else None,
+                                      sink=sink, report=True)
+        if result["accepted"]:
+            self.tree = tree
+        return self.__analyzeResult(tokenStream, result["finished"], result["analyzed"], sink)
+
+    def __analyzeResult(self, tokenStream, accepted, analyzedTokenCnt, sink):
+        """
+        analyze结束时关闭sink并打印结果
+
+        Returns:
+            是否分析成功
+        """
+        if sink is not None:
+            sink.close()
+        self.error = self.errors[0] if self.errors else None
+        if accepted and not self.errors:
+            print("词法分析成功")
+            return True
+        elif self.errors:
+            print("词法分析失败，共", len(self.errors), "处错误")
+            return False
+        elif hasattr(tokenStream, "__len__"):
+            print("词法分析失败，剩余", len(tokenStream) + 1 - analyzedTokenCnt, "个Token")
+            return False
+        else:
+            print("词法分析失败，已分析", analyzedTokenCnt, "个Token")
+            return False
+
+    def __sameStack(self, stack, other):
+        """
+        比较两个持久化状态栈，深度不同的栈直接判定为不同，栈共享的部分直接按对象判断，
+        错误恢复中丢弃的token处没有检查点，只与同样没有检查点的位置相同
+        """
+        if stack is None or other is None:
+            return stack is other
+        if stack[2] != other[2]:
+            return False
+        while stack is not other:
+            if stack is None or other is None or stack[0] != other[0]:
+                return False
+            stack, other = stack[1], other[1]
+        return True
+
+    def __parseFrom(self, tokens, index, checkpoints, errors, previous=None, delta=0, resyncFrom=0, tree=None,
+                    shape=None, sink=None, report=False):
+        """
+        从tokens[index]开始，在checkpoints[-1]这个状态栈上继续分析，出错时做恐慌模式恢复
+
+        状态栈是 (状态, 下一层, 深度) 的持久化链表，移进token时只新建一个栈顶，
+        每移进一个token就把当前的栈记录到checkpoints中，相邻的检查点共享栈的大部分。
+        token按单词编号换算为终结符编号后查压缩的ACTION表，默认规约的状态不查向前看符号
+
+        Args:
+            tokens: TokenStore或TokenReader对象
+            index: 开始分析的token下标
+            checkpoints: 已有的检查点，checkpoints[i] 为移进tokens[i]之前、用它做向前看符号之前的状态栈，
+                tokens[i]在错误恢复中被丢弃时为None；为None时从头分析，不记录检查点；
+                增量分析时只含从index开始的检查点，即checkpoints[0]为tokens[index]处的检查点
+            errors: index之前已发现的错误的token下标
+            previous: 编辑前的分析结果，增量分析时使用
+            delta: 编辑后token下标与编辑前token下标的差
+            resyncFrom: 从这个下标起，状态栈与编辑前相同时直接复用编辑前的结果
+            tree: 不为None时在这个ParseTree中构建语法树
+            shape: (drop, flatten)，见parse
+            sink: 记录分析过程的对象，格式同analyze，为None时不记录
+            report: 是否像analyze一样打印语法错误，并把错误记录到self.errors
+
+        Returns:
+            分析结果 {"accepted": 是否无错误地接受, "finished": 是否到达接受状态, "errorIndex": 第一个错误的token下标,
+            "errors": 所有错误的token下标, "checkpoints": 检查点列表, "analyzed": 已移进或丢弃的token数}
+        """
+        # 构建语法树时与状态栈并列的值栈，每项为一串兄弟节点 (第一个节点, 最后一个节点, 起始token下标)，没有节点时节点为NO_NODE
+        values = list()
+        drop, flatten = shape if shape is not None else ((), ())
+        startSymbol = len(self.terminals) + self.nonterminalIDs[self.productions[0]['right'][0]]
+        endKind = (self.terminalIDs["<#>"], -1)
+        kinds = dict()  # 单词编号到终结符编号的缓存
+        lexemes = tokens.lexemes
+        # TokenReader只保留最近的token，每前进一个token取出下一个
+        reader = tokens if isinstance(tokens, TokenReader) else None
+        tokenCount = len(tokens) if reader is None else reader.advance(index)
+        defaultReductions = self.defaultReductions
+        stack = checkpoints[-1] if checkpoints is not None else (0, None, 1)
+        lastError = -1  # 上一个错误的token下标
+        startIndex, startErrors = index, len(errors)
+        lastShift = -1  # 上一个移进的token下标
+        lastShiftText = "<#>"  # 上一个移进的单词，报告错误时使用
+        actionLookups = gotoLookups = 0
+        try:
+            while True:
+                actionLookups += 1
+                action = defaultReductions[stack[0]]
+                if action == ACTION_ERROR:
+                    if index < tokenCount:
+                        kind = kinds.get(lexemes[index])
+                        if kind is None:
+                            kind = kinds[lexemes[index]] = self.__tokenKind(tokens.text(index),
+                                                                            tokens.typeNames[tokens.types[index]])
+                    else:
+                        kind = endKind
+                    action = self.__queryKind(stack[0], kind)
+                if action == ACTION_ERROR:
+                    # 同一位置再次出错说明恢复后无法前进，先丢弃当前token。恢复点在当前token上可能只是规约，
+                    # LALR(1)合并后的向前搜索符会让规约后再次出错，这个token已经记录过，不再重复报告
+                    skip = index == lastError
+                    lastError = index
+                    if not skip:
+                        errors.append(index)
+                    if report and not skip:
+                        # 移进之后第一次出错总在下一个token上，之后再出错时上一个移进的token可能已不在TokenReader中
+                        if lastShift == index - 1:
+                            lastShiftText = self.__tokenText(tokens, lastShift)
+                        self.__reportError(stack[0], self.__tokenLine(tokens, index), self.__tokenText(tokens, index),
+                                           lastShiftText)
+                        self.errors.append({"line": self.__tokenLine(tokens, index),
+                                            "token": self.__tokenText(tokens, index)})
+                    if sink is not None:
+                        sink.record(["出错", self.__tokenText(tokens, index), ""])
+                    while True:
+                        if skip:
+                            if index >= tokenCount:
+                                return self.__parseResult(tokens, False, errors, checkpoints, index, report)
+                            if sink is not None:
+                                sink.record(["丢弃", tokens.text(index), ""])
+                            index += 1
+                            if reader is not None:
+                                tokenCount = reader.advance(index)
+                            if checkpoints is not None:
+                                checkpoints.append(None)
+                            if index < tokenCount:
+                                kind = kinds.get(lexemes[index])
+                                if kind is None:
+                                    kind = kinds[lexemes[index]] = self.__tokenKind(
+                                        tokens.text(index), tokens.typeNames[tokens.types[index]])
+                            else:
+                                kind = endKind
+                        point = self.__recoveryPoint(self.__stackStates(stack), kind)
+                        if point is not None:
+                            break
+                        skip = True
+                    for i in range(point[0]):
+                        stack = stack[1]
+                    if tree is not None:
+                        del values[len(values) - point[0]:]
+                        values.append((NO_NODE, NO_NODE, index))
+                    stack = (point[1], stack, stack[2] + 1)
+                elif action > 0:
+                    # 移进
+                    if sink is not None:
+                        sink.record(["移进", self.__tokenText(tokens, index), ""])
+                    lastShift = index
+                    if tree is not None:
+                        symbol = kind[0] if kind[0] >= 0 and self.__lookupAction(stack[0], kind[0]) != ACTION_ERROR \
+                            else kind[1]
+                        if symbol in drop:
+                            values.append((NO_NODE, NO_NODE, index))
+                        else:
+                            node = tree.addNode(symbol, NO_NODE, NO_NODE, index, 1, stack[0])
+                            values.append((node, node, index))
+                    stack = (action - 1, stack, stack[2] + 1)
+                    index += 1
+                    if reader is not None:
+                        tokenCount = reader.advance(index)
+                    if checkpoints is not None:
+                        checkpoints.append(stack)
+                    oldIndex = index - delta
+                    if previous is not None and index >= resyncFrom and oldIndex < len(previous["checkpoints"]) and \
+                            self.__sameStack(stack, previous["checkpoints"][oldIndex]):
+                        # 状态栈与编辑前相同，其后的分析过程也相同，新的检查点原地替换编辑前这一段的检查点
+                        previous["checkpoints"][startIndex:oldIndex + 1] = checkpoints
+                        checkpoints = previous["checkpoints"]
+                        errors.extend(error + delta for error in previous["errors"] if error >= oldIndex)
+                        return self.__parseResult(tokens, previous["finished"], errors, checkpoints,
+                                                  previous["analyzed"] + delta)
+                elif action != ACTION_ACCEPT:
+                    # 规约
+                    production = self.productions[-action - 1]
+                    if sink is not None:
+                        sink.record(["规约", "", production['left'] + ' -> ' + ' '.join(production['right'])])
+                    for i in production['right']:
+                        stack = stack[1]
+                    if tree is not None:
+                        self.__reduceTree(tree, values, -action - 1, drop, flatten, startSymbol, stack[0], index)
+                    gotoLookups += 1
+                    state = self.__queryGOTO(stack[0], production['left'])
+                    if state == GOTO_ERROR:
+                        if report:
+                            print("GOTO表查询错误(第 %d 行): %s" % (self.__tokenLine(tokens, index),
+                                                               self.__tokenText(tokens, index)))
+                            self.errors.append({"line": self.__tokenLine(tokens, index),
+                                                "token": self.__tokenText(tokens, index)})
+                        errors.append(index)
+                        return self.__parseResult(tokens, False, errors, checkpoints, index, report)
+                    stack = (state, stack, stack[2] + 1)
+                else:
+                    if tree is not None and values and values[-1][0] != NO_NODE:
+                        tree.root = values[-1][0]
+                    return self.__parseResult(tokens, True, errors, checkpoints, index, report)
+        finally:
+            if self.stats is not None:
+                self.stats.count("syntax.tokens", index - startIndex)
+                self.stats.count("syntax.actionLookups", actionLookups)
+                self.stats.count("syntax.gotoLookups", gotoLookups)
+                self.stats.count("syntax.errors", len(errors) - startErrors)
+
+    def __stackStates(self, stack):
+        """
+        从栈顶到栈底遍历持久化状态栈中的状态
+        """
+        while stack is not None:
+            yield stack[0]
+            stack = stack[1]
+
+    def __parseResult(self, tokens, finished, errors, checkpoints, analyzed, report=False):
+        """
+        Args:
+            finished: 是否到达接受状态
+            analyzed: 已移进或丢弃的token数
+            report: 为True时错误已记录在self.errors中，TokenReader中也可能已没有出错的token，不设置self.error
+
+        Returns:
+            分析结果，格式见__parseFrom
+        """
+        errorIndex = errors[0] if errors else None
+        if errorIndex is not None and not report:
+            self.__setError(tokens, errorIndex)
+        return {"accepted": finished and not errors, "finished": finished, "errorIndex": errorIndex,
+                "errors": errors, "checkpoints": checkpoints, "analyzed": analyzed}
+
+    def __reduceTree(self, tree, values, productionIdx, drop, flatten, startSymbol, state, index):
+        """
+        规约时构建语法树节点，把值栈顶部对应产生式右部的兄弟节点串连接为新节点的子节点，
+        子节点的起始token下标换算为相对新节点的下标
+
+        Args:
+            tree: ParseTree对象
+            values: 值栈
+            productionIdx: 规约使用的产生式
+            drop: 不加入语法树的符号编号集合
+            flatten: 不单独建立节点、子节点直接并入父节点的非终结符编号集合
+            startSymbol: 开始符号的编号，开始符号总是建立节点
+            state: 弹出产生式右部后的栈顶状态
+            index: 向前看token的下标，即规约出的符号之后的第一个token
+        """
+        production = self.productions[productionIdx]
+        count = len(production['right'])
+        start = values[len(values) - count][2] if count else index
+        first = last = NO_NODE
+        for value in values[len(values) - count:]:
+            if value[0] == NO_NODE:
+                continue
+            if first == NO_NODE:
+                first = value[0]
+            else:
+                tree.nextSibling[last] = value[0]
+            last = value[1]
+        del values[len(values) - count:]
+        if first != NO_NODE:
+            # 复用的子树可能还连着编辑前的兄弟节点
+            tree.nextSibling[last] = NO_NODE
+        symbol = len(self.terminals) + self.nonterminalIDs[production['left']]
+        if symbol != startSymbol and symbol in drop:
+            values.append((NO_NODE, NO_NODE, start))
+        elif symbol != startSymbol and symbol in flatten:
+            values.append((first, last, start))
+        else:
+            node = tree.addNode(symbol, productionIdx, first, start, index - start, state)
+            child = first
+            while child != NO_NODE:
+                tree.offsets[child] -= start
+                child = tree.nextSibling[child]
+            values.append((node, node, start))
+
+    def __tokenText(self, tokens, index):
+        """
+        Returns:
+            tokens[index]的单词，越过末尾或为-1时为 <#>
+        """
+        return tokens.text(index) if 0 <= index < len(tokens) else "<#>"
+
+    def __tokenLine(self, tokens, index):
+        return tokens.line(index) if index < len(tokens) else -1
+
+    def __setError(self, tokens, index):
+        if index < len(tokens):
+            self.error = {"line": tokens.line(index), "token": tokens.text(index)}
+        else:
+            self.error = {"line": -1, "token": "<#>"}
+
+    def parse(self, tokens, buildTree=False, shape=None):
+        """
+        不输出分析过程的语法分析，出错时恢复并继续分析，保留每个token处的状态栈检查点，供reparse增量分析使用
+
+        Args:
+            tokens: TokenStore对象，如LexicalAnalyze.TokenStream
+            buildTree: 是否构建语法树
+            shape: 构建抽象语法树的规则 {"drop": [不加入语法树的符号], "flatten": [子节点直接并入父节点的非终结符]}，
+                为None时构建完整的语法树
+
+        Returns:
+            分析结果，格式见__parseFrom，构建语法树时另有 "tree": ParseTree对象，分析出错时为None；"shape": 参数shape
+        """
+        self.error = None
+        if not buildTree:
+            with measure(self.stats, "syntax.parse"):
+                return self.__parseFrom(tokens, 0, [(0, None, 1)], [])
+        tree = ParseTree(self.terminals + self.nonterminals)
+        with measure(self.stats, "syntax.parse"):
+            result = self.__parseFrom(tokens, 0, [(0, None, 1)], [], tree=tree, shape=self.__compileShape(shape))
+        result["tree"] = tree if result["accepted"] else None
+        result["shape"] = shape
+        return result
+
+    def __compileShape(self, shape):
+        """
+        Args:
+            shape: 构建抽象语法树的规则，格式见parse，为None时构建完整的语法树
+
+        Returns:
+            (drop, flatten)，规则中的符号换算为编号的集合
+        """
+        symbolIDs = dict(self.terminalIDs)
+        symbolIDs.update({name: len(self.terminals) + i for name, i in self.nonterminalIDs.items()})
+        if shape is None:
+            shape = dict()
+        drop = set(symbolIDs[name] for name in shape.get("drop", []) if name in symbolIDs)
+        flatten = set(symbolIDs[name] for name in shape.get("flatten", []) if name in self.nonterminalIDs)
+        return drop, flatten
+
+    def reparse(self, previous, tokens, changed):
+        """
+        增量语法分析
+
+        不构建语法树时，编辑位置之前的token不变，从编辑前的检查点恢复状态栈继续分析；越过编辑位置后，
+        一旦某个token处的状态栈与编辑前对应位置的相同，剩下的分析过程必然相同，直接复用编辑前的结果。
+        检查点只记录状态栈，增删语句会改变之后所有检查点处的栈深度（如右递归的语句列表），
+        这时状态栈再也不会与编辑前的相同，编辑位置之后的部分全部重新分析。
+        新的检查点原地替换previous中对应的部分，返回后previous中的检查点不再可用。
+
+        编辑前的结果带有语法树时，只重新分析包含编辑区间的最小节点，失败时依次换成更外层的节点，见__reparseTree；
+        编辑后出现语法错误时退回到完整的parse。这种方式在编辑前的语法树上原地修改，返回后previous中的语法树不再可用，
+        替换下来的旧节点超过一半时压缩ParseTree，见ParseTree.compact。
+        祖先节点的跨度和后续兄弟的偏移仍要逐个调整，耗时与编辑位置的深度（右递归的列表）和兄弟数（展平的列表）成正比，
+        退回到根节点时整条右递归的链都要重新分析，所以耗时并不与文件大小无关
+
+        Args:
+            previous: 编辑前parse或reparse的结果
+            tokens: 编辑后的TokenStore
+            changed: (first, oldStop, newStop)，编辑前的 tokens[first:oldStop] 被替换为 tokens[first:newStop]，
+                即LexicalAnalyze.relex的返回值
+
+        Returns:
+            分析结果，格式见__parseFrom；编辑前的结果构建了语法树时格式同 parse(tokens, True, shape)，
+            复用语法树得到的结果中 "checkpoints" 为None
+        """
+        first, oldStop, newStop = changed
+        self.error = None
+        if previous.get("tree") is not None:
+            with measure(self.stats, "syntax.reparse"):
+                result = self.__reparseTree(previous, tokens, changed)
+            if result is not None:
+                return result
+        if "shape" in previous:
+            return self.parse(tokens, True, previous["shape"])
+        if first >= len(previous["checkpoints"]):
+            # 编辑前在编辑位置之前就已无法恢复，结果不变
+            self.__setError(tokens, previous["errorIndex"])
+            return previous
+        checkpoints = previous["checkpoints"]
+        while checkpoints[first] is None:
+            # 编辑位置在错误恢复丢弃的token中，从这次恢复开始前重新分析
+            first -= 1
+        errors = [error for error in previous["errors"] if error < first]
+        with measure(self.stats, "syntax.reparse"):
+            result = self.__parseFrom(tokens, first, checkpoints[first:first + 1], errors, previous,
+                                      newStop - oldStop, newStop)
+        if result["checkpoints"] is not checkpoints:
+            # 没有与编辑前的分析过程同步，编辑位置之后的检查点全部重新生成
+            checkpoints[first:] = result["checkpoints"]
+            result["checkpoints"] = checkpoints
+        return result
+
+    def __reparseTree(self, previous, tokens, changed):
+        """
+        以编辑前的语法树为输入的增量分析
+
+        先沿语法树找出包含编辑区间的节点链，从最深的节点开始向上逐个尝试只重新分析该节点覆盖的token，见__reparseNode。
+        节点的第一个token在编辑位置之前、节点之后的向前看token也没有变化时，分析到节点开始处的状态栈和
+        节点之后的分析过程都与编辑前相同，只要节点覆盖的token重新分析后恰好规约出同一个符号，就用新节点替换旧节点。
+        在右递归的语句列表中修改、插入或删除语句时，包含编辑位置的最小的语句或列表节点就能完成规约，
+        编辑位置之前的列表不再拆开重新规约。
+
+        替换节点后要沿节点链更新祖先的跨度和其后兄弟节点的相对下标，这一步仍与节点链长度和兄弟节点数成正比：
+        右递归列表的节点链长度与编辑位置之前的元素数成正比，展平 (flatten) 的列表的兄弟节点数与列表长度成正比，
+        只是整数加法，不再分析其中的token。各层节点都无法单独重新分析（如编辑改变了节点之外的结构）、
+        或者逐层尝试的分析步数超过REPARSE_NODE_BUDGET时，从根节点重新分析，这时编辑位置之前的右递归列表仍要逐层拆开
+
+        Returns:
+            分析结果，编辑后有语法错误时为None
+        """
+        first, oldStop, newStop = changed
+        tree = previous["tree"]
+        drop, flatten = self.__compileShape(previous["shape"])
+        context = {"changed": changed, "drop": drop, "flatten": flatten, "kinds": dict(),
+                   "startSymbol": len(self.terminals) + self.nonterminalIDs[self.productions[0]['right'][0]],
+                   "budget": REPARSE_NODE_BUDGET}
+        offsets, spans, nextSibling = tree.offsets, tree.spans, tree.nextSibling
+        # 包含编辑区间、第一个token在编辑位置之前的节点链 (节点, 编辑前的起始token下标, 前一个兄弟节点)，从根节点开始
+        path = [(tree.root, offsets[tree.root], NO_NODE)]
+        parentStart = offsets[tree.root]
+        child = tree.firstChild[tree.root]
+        prev = NO_NODE
+        while child != NO_NODE:
+            start = parentStart + offsets[child]
+            if start >= first:
                 break
-            elif queryACTIONResult['type'] == "S":
-                # 移进
-                # print("移进: " + token['token'])
-                tb.add_row(["移进", token['token'], ""])
-
-                stateStack.append(queryACTIONResult['content'])
-                # symbolStack.append(token)
-                analyzedTokenCnt += 1
-                # operateOut = "S" + str(queryACTIONResult['content'])
-            elif queryACTIONResult['type'] == "r":
-                # 规约，将对应的产生式右部弹出符号栈
-                # operateOut = "r" + str(queryACTIONResult['content'])
-                production = self.productions[queryACTIONResult['content']]
-                tb.add_row(["规约", "", production['left'] + ' -> ' + ' '.join(production['right'])])
-                for i in production['right']:
-                    stateStack.pop()
-                queryGOTOResult = self.__queryGOTO(stateStack[-1], production['left'])
-                if queryGOTOResult is None:
-                    # print(tb)
-                    print("GOTO表查询错误(第 %d 行): %s" % (token['line'], token['token']))
+            if start + spans[child] >= oldStop:
+                path.append((child, start, prev))
+                parentStart = start
+                child = tree.firstChild[child]
+                prev = NO_NODE
+            else:
+                prev, child = child, nextSibling[child]
+        for depth in range(len(path) - 1, -1, -1):
+            node, start, prev = path[depth]
+            if depth > 0 and context["budget"] <= 0:
+                continue
+            result = self.__reparseNode(tree, tokens, node, start, depth == 0, context)
+            if result is not None:
+                break
+        else:
+            return None
+        newNode, shiftedTokens = result
+        delta = newStop - oldStop
+        if depth == 0:
+            tree.root = newNode
+        else:
+            # 新节点接入旧节点的位置，再更新祖先的跨度和之后的兄弟节点的相对下标
+            parent = path[depth - 1][0]
+            offsets[newNode] = offsets[node]
+            nextSibling[newNode] = nextSibling[node]
+            if prev == NO_NODE:
+                tree.firstChild[parent] = newNode
+            else:
+                nextSibling[prev] = newNode
+            if delta != 0:
+                child = newNode
+                for depth in range(depth - 1, -1, -1):
+                    ancestor = path[depth][0]
+                    spans[ancestor] += delta
+                    sibling = nextSibling[child]
+                    while sibling != NO_NODE:
+                        offsets[sibling] += delta
+                        sibling = nextSibling[sibling]
+                    child = ancestor
+        if tree.garbage * 2 > len(tree):
+            tree.compact()
+        if self.stats is not None:
+            self.stats.count("syntax.reusedTokens", len(tokens) - shiftedTokens)
+        return {"accepted": True, "finished": True, "errorIndex": None, "errors": [], "checkpoints": None,
+                "tree": tree, "shape": previous["shape"]}
+
+    def __reparseNode(self, tree, tokens, node, start, isRoot, context):
+        """
+        重新分析编辑前的节点node覆盖的token，从编辑前移进node第一个token时的栈顶状态开始，只用到栈顶之上的部分
+
+        待分析的输入是node的子树，按编辑前的起始token下标排列。与编辑区间相交的子树拆成子节点，
+        被删除的叶子直接丢弃，子树之间的空隙（编辑后新增的token和不加入语法树的token）逐个按token移进。
+        编辑前后子树中的token及其后的向前看token都相同时，只要用子树的第一个token做完规约后栈顶状态与
+        编辑前移进这个token时的状态相同，分析过程必然相同，直接把子树作为一个非终结符移进；否则把子树拆开。
+        分析完node覆盖的token时，栈顶之上恰好是一个与node符号相同的节点即为成功；
+        需要弹出开始时的栈顶、移进node之后的token或出错时失败，撤销对编辑前节点的修改
+
+        Args:
+            node, start: 编辑前的节点及其起始token下标
+            isRoot: node是否为根节点，根节点不限制处理的输入数，在接受时成功
+            context: __reparseTree中各次尝试共用的信息，"budget" 为非根节点剩余的分析步数
+
+        Returns:
+            (新节点, 逐个移进的token数)，失败时为None
+        """
+        first, oldStop, newStop = context["changed"]
+        delta = newStop - oldStop
+        drop, flatten, kinds = context["drop"], context["flatten"], context["kinds"]
+        startSymbol = context["startSymbol"]
+        endKind = (self.terminalIDs["<#>"], -1)
+        lexemes = tokens.lexemes
+        tokenCount = len(tokens)
+        defaultReductions = self.defaultReductions
+        spans, states = tree.spans, tree.states
+        symbol = tree.symbols[node]
+        stop = start + spans[node] + delta  # 编辑后node之后的第一个token
+        stack = (states[node], None, 1)
+        values = list()
+        pending = [(node, start)]  # 待分析的子树 (节点, 编辑前的起始token下标)，栈顶为下一个
+        reused = list()  # 整棵移进的子树 (节点, 原来的相对下标, 原来的下一个兄弟节点)，失败时恢复
+        discarded = 0  # 拆开或丢弃的编辑前节点数
+        treeSize = len(tree)
+        index = start
+        shiftedTokens = 0
+        result = None
+        while True:
+            if not isRoot:
+                if context["budget"] <= 0:
                     break
-                else:
-                    stateStack.append(queryGOTOResult['content'])
-                # 符号栈处理
-                # for i in production['right']:
-                #     symbolStack.pop()
-                # symbolStack.append({
-                #     "line": token['line'],
-                #     "type": token['line'],
-                #     "token": production["left"]
-                # })
-            elif queryACTIONResult['type'] == "acc":
-                analyzedTokenCnt += 1
+                context["budget"] -= 1
+            # 取下一个输入：起始位置正好是index的子树，或者tokens[index]
+            current = NO_NODE
+            while pending:
+                current, oldStart = pending[-1]
+                span = spans[current]
+                newStart = oldStart + delta if oldStart >= oldStop else oldStart
+                if span == 0 or (oldStart < oldStop and oldStart + span > first):
+                    pending.pop()
+                    discarded += 1
+                    pending.extend((child, oldStart + tree.offsets[child])
+                                   for child in reversed(list(tree.children(current))))
+                    current = NO_NODE
+                    continue
+                if newStart > index:
+                    current = NO_NODE
                 break
+            if index == stop and stack[2] == 2 and values[0][0] == values[0][1] != NO_NODE and \
+                    tree.symbols[values[0][0]] == symbol:
+                result = (values[0][0], shiftedTokens)
+                break
+            if index < tokenCount:
+                kind = kinds.get(lexemes[index])
+                if kind is None:
+                    kind = kinds[lexemes[index]] = self.__tokenKind(tokens.text(index),
+                                                                    tokens.typeNames[tokens.types[index]])
             else:
-                # @TODO
-                print("类型错误")
-        print(tb)
-        if analyzedTokenCnt == len(tokenStream):
-            print("词法分析成功")
-            return True
+                kind = endKind
+            action = defaultReductions[stack[0]]
+            if action == ACTION_ERROR:
+                action = self.__queryKind(stack[0], kind)
+            if action == ACTION_ERROR:
+                break
+            if action > 0:
+                if index >= stop:
+                    break
+                if current != NO_NODE and not tree.isLeaf(current):
+                    pending.pop()
+                    if stack[0] == states[current] and (oldStart >= oldStop or oldStart + span < first):
+                        # 整棵移进子树
+                        state = self.GOTOValue[self.GOTOBase[stack[0]] + tree.symbols[current] - len(self.terminals)]
+                        reused.append((current, tree.offsets[current], tree.nextSibling[current]))
+                        tree.offsets[current] = index
+                        values.append((current, current, index))
+                        stack = (state, stack, stack[2] + 1)
+                        index += span
+                    else:
+                        discarded += 1
+                        pending.extend((child, oldStart + tree.offsets[child])
+                                       for child in reversed(list(tree.children(current))))
+                    continue
+                if current != NO_NODE:
+                    pending.pop()
+                    discarded += 1
+                shifted = kind[0] if kind[0] >= 0 and self.__lookupAction(stack[0], kind[0]) != ACTION_ERROR \
+                    else kind[1]
+                if shifted in drop:
+                    values.append((NO_NODE, NO_NODE, index))
+                else:
+                    leaf = tree.addNode(shifted, NO_NODE, NO_NODE, index, 1, stack[0])
+                    values.append((leaf, leaf, index))
+                stack = (action - 1, stack, stack[2] + 1)
+                index += 1
+                shiftedTokens += 1
+            elif action != ACTION_ACCEPT:
+                production = self.productions[-action - 1]
+                if len(production['right']) >= stack[2]:
+                    break
+                for i in production['right']:
+                    stack = stack[1]
+                self.__reduceTree(tree, values, -action - 1, drop, flatten, startSymbol, stack[0], index)
+                state = self.__queryGOTO(stack[0], production['left'])
+                if state == GOTO_ERROR:
+                    break
+                stack = (state, stack, stack[2] + 1)
+            else:
+                result = (values[-1][0], shiftedTokens)
+                break
+        if result is None:
+            for current, offset, sibling in reused:
+                tree.offsets[current] = offset
+                tree.nextSibling[current] = sibling
+            tree.garbage += len(tree) - treeSize
         else:
-            print("词法分析失败，剩余", len(tokenStream) - analyzedTokenCnt, "个Token")
-            return False
+            tree.garbage += discarded
+        return result
 
     def printACTION(self):
+        self.__rebuildDFA()
         for i in self.ACTION:
             print(i)
 
     def printGOTO(self):
+        self.__rebuildDFA()
         for i in self.GOTO:
             print(i)
 
     def printTable(self):
+        self.__rebuildDFA()
         tb = pt.PrettyTable()
         ACTIONCharSet = [""]
         GOTOCharSet = []
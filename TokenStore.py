@@ -0,0 +1,252 @@
+from array import array
+
+
+class TokenStore:
+    """
+    列式存储的token序列
+
+    每个token只占几个并列数组中的一格，单词本身存放在驻留的单词表中，相同的单词只存一份。
+    按下标取出的仍是 {"line", "type", "token", "offset", "lookahead"} 字典，与原来的token列表兼容，
+    语法分析可以直接使用整数形式的类型和单词编号。
+
+    增量词法分析平移编辑位置之后的token时不逐个修改，而是记下一段未应用的平移量：
+    下标不小于pendingStart的token，实际的位置和行号还要加上这个平移量。下一次平移时
+    只需把两次平移位置之间的token改写，编辑集中在一处时耗时与token总数无关。
+
+    Attributes:
+        typeNames: 类型编号到token类型名的映射
+        typeIDs: token类型名到类型编号的映射
+        types: 每个token的类型编号
+        lexemes: 每个token的单词在lexemeTable中的编号
+        offsets: 每个token在源文件中的位置，未加上平移量，用offset读取
+        lines: 每个token所在的行号，未加上平移量，用line读取
+        lookaheads: 每个token匹配时越过末尾多检查的字符数
+        lexemeTable: 单词表
+        lexemeIDs: 单词到编号的映射
+        truncated: 词法分析是否出错，出错时只有出错处之前的token
+    """
+    typeNames = None
+    typeIDs = None
+    types = None
+    lexemes = None
+    offsets = None
+    lines = None
+    lookaheads = None
+    lexemeTable = None
+    lexemeIDs = None
+    truncated = False
+
+    def __init__(self, typeNames):
+        """
+        Args:
+            typeNames: 按编号排列的token类型名
+        """
+        self.typeNames = list(typeNames)
+        self.typeIDs = {name: i for i, name in enumerate(self.typeNames)}
+        self.types = array("b")
+        self.lexemes = array("l")
+        self.offsets = array("q")
+        self.lines = array("l")
+        self.lookaheads = array("l")
+        self.lexemeTable = list()
+        self.lexemeIDs = dict()
+        self.truncated = False
+        # 下标不小于pendingStart的token还需加上的位置和行号的平移量
+        self.__pendingStart = 0
+        self.__pendingOffset = 0
+        self.__pendingLine = 0
+
+    def intern(self, text):
+        """
+        Returns:
+            单词的编号，单词表中没有时加入
+        """
+        lexemeID = self.lexemeIDs.get(text)
+        if lexemeID is None:
+            lexemeID = self.lexemeIDs[text] = len(self.lexemeTable)
+            self.lexemeTable.append(text)
+        return lexemeID
+
+    def append(self, typeName, text, offset, line, lookahead):
+        self.types.append(self.typeIDs[typeName])
+        self.lexemes.append(self.intern(text))
+        self.offsets.append(offset - self.__pendingOffset)
+        self.lines.append(line - self.__pendingLine)
+        self.lookaheads.append(lookahead)
+
+    def text(self, index):
+        return self.lexemeTable[self.lexemes[index]]
+
+    def offset(self, index):
+        """
+        Returns:
+            token在源文件中的位置
+        """
+        if index >= self.__pendingStart:
+            return self.offsets[index] + self.__pendingOffset
+        return self.offsets[index]
+
+    def line(self, index):
+        """
+        Returns:
+            token所在的行号
+        """
+        if index >= self.__pendingStart:
+            return self.lines[index] + self.__pendingLine
+        return self.lines[index]
+
+    def end(self, index):
+        """
+        Returns:
+            token的结束位置
+        """
+        return self.offset(index) + len(self.lexemeTable[self.lexemes[index]])
+
+    def splice(self, start, stop, tokens):
+        """
+        把 [start, stop) 内的token替换为tokens
+
+        Args:
+            tokens: (类型名, 单词, 位置, 行号, lookahead) 元组列表，位置和行号为实际值
+        """
+        offsetDelta = lineDelta = 0
+        if self.__pendingStart <= start:
+            # 新token也在平移范围内，存放时减去平移量
+            offsetDelta, lineDelta = self.__pendingOffset, self.__pendingLine
+        else:
+            self.__pendingStart = max(self.__pendingStart, stop) + len(tokens) - (stop - start)
+        self.types[start:stop] = array("b", [self.typeIDs[token[0]] for token in tokens])
+        self.lexemes[start:stop] = array("l", [self.intern(token[1]) for token in tokens])
+        self.offsets[start:stop] = array("q", [token[2] - offsetDelta for token in tokens])
+        self.lines[start:stop] = array("l", [token[3] - lineDelta for token in tokens])
+        self.lookaheads[start:stop] = array("l", [token[4] for token in tokens])
+
+    def shift(self, start, offsetDelta, lineDelta):
+        """
+        平移start及其后所有token的位置和行号，只改写start与上一次平移位置之间的token
+        """
+        self.__movePending(start)
+        self.__pendingOffset += offsetDelta
+        self.__pendingLine += lineDelta
+
+    def __movePending(self, index):
+        """
+        把未应用的平移量的开始下标移到index，位于两者之间的token改写为对应的存放值
+        """
+        start = self.__pendingStart
+        offsetDelta, lineDelta = self.__pendingOffset, self.__pendingLine
+        self.__pendingStart = index
+        if offsetDelta == 0 and lineDelta == 0:
+            return
+        if index < start:
+            start, index = index, start
+            offsetDelta, lineDelta = -offsetDelta, -lineDelta
+        offsets = self.offsets
+        lines = self.lines
+        for i in range(start, index):
+            offsets[i] += offsetDelta
+            lines[i] += lineDelta
+
+    def truncate(self, length):
+        """
+        只保留前length个token
+        """
+        self.splice(length, len(self.types), [])
+
+    def __len__(self):
+        return len(self.types)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.types)
+        return {"line": self.line(index), "type": self.typeNames[self.types[index]],
+                "token": self.lexemeTable[self.lexemes[index]], "offset": self.offset(index),
+                "lookahead": self.lookaheads[index]}
+
+    def __iter__(self):
+        for i in range(len(self.types)):
+            yield self[i]
+
+
+class TokenReader:
+    """
+    按需从token字典序列中逐个取出token，提供与TokenStore相同的按下标读取接口，供语法分析按单词编号查表
+
+    不保存完整的token序列，只保留最近取出的两个token，适用于LexicalAnalyze.tokens这样的生成器；
+    单词同样驻留在单词表中，相同的单词编号相同。
+
+    Attributes:
+        typeNames: 类型编号到token类型名的映射，遇到新的类型时加入
+        typeIDs: token类型名到类型编号的映射
+        types, lexemes, lines: 保留的token的类型编号、单词编号和行号，以token下标为键
+        lexemeTable: 单词表
+        lexemeIDs: 单词到编号的映射
+    """
+    typeNames = None
+    typeIDs = None
+    types = None
+    lexemes = None
+    lines = None
+    lexemeTable = None
+    lexemeIDs = None
+
+    def __init__(self, tokens):
+        """
+        Args:
+            tokens: {"line", "type", "token"} 字典的列表或生成器
+        """
+        self.typeNames = list()
+        self.typeIDs = dict()
+        self.types = dict()
+        self.lexemes = dict()
+        self.lines = dict()
+        self.lexemeTable = list()
+        self.lexemeIDs = dict()
+        self.__tokens = iter(tokens)
+        self.__count = 0  # 已取出的token数
+        self.__exhausted = False
+
+    def intern(self, text):
+        """
+        Returns:
+            单词的编号，单词表中没有时加入
+        """
+        lexemeID = self.lexemeIDs.get(text)
+        if lexemeID is None:
+            lexemeID = self.lexemeIDs[text] = len(self.lexemeTable)
+            self.lexemeTable.append(text)
+        return lexemeID
+
+    def advance(self, index):
+        """
+        取出tokens[index]，丢弃它前一个token之前的token
+
+        Returns:
+            已取出的token数，序列还没有结束时为 index + 1
+        """
+        while self.__count <= index and not self.__exhausted:
+            token = next(self.__tokens, None)
+            if token is None:
+                self.__exhausted = True
+                break
+            i = self.__count
+            typeID = self.typeIDs.get(token["type"])
+            if typeID is None:
+                typeID = self.typeIDs[token["type"]] = len(self.typeNames)
+                self.typeNames.append(token["type"])
+            self.types[i] = typeID
+            self.lexemes[i] = self.intern(token["token"])
+            self.lines[i] = token["line"]
+            self.__count += 1
+            for column in (self.types, self.lexemes, self.lines):
+                column.pop(i - 2, None)
+        return self.__count
+
+    def text(self, index):
+        return self.lexemeTable[self.lexemes[index]]
+
+    def line(self, index):
+        return self.lines[index]
+
+    def __len__(self):
+        return self.__count
@@ -0,0 +1,88 @@
+from collections import deque
+import prettytable as pt
+
+# 命令行可选的分析过程记录方式
+TRACE_KINDS = ["none", "table", "ring", "file"]
+
+
+class TableSink:
+    """
+    把分析过程记录到PrettyTable中，结束时打印整张表
+    """
+    table = None
+
+    def __init__(self, fieldNames):
+        self.table = pt.PrettyTable()
+        self.table.field_names = fieldNames
+
+    def record(self, row):
+        self.table.add_row(row)
+
+    def close(self):
+        print(self.table)
+
+
+class RingSink:
+    """
+    只保留最近size条记录，结束时打印，用于出错后查看出错前的分析过程
+    """
+    fieldNames = None
+    rows = None
+
+    def __init__(self, fieldNames, size=100):
+        self.fieldNames = fieldNames
+        self.rows = deque(maxlen=size)
+
+    def record(self, row):
+        self.rows.append(row)
+
+    def close(self):
+        tb = pt.PrettyTable()
+        tb.field_names = self.fieldNames
+        for row in self.rows:
+            tb.add_row(row)
+        print(tb)
+
+
+class FileSink:
+    """
+    逐行写入文件，字段之间以制表符分隔，不在内存中保留记录
+    """
+    stream = None
+
+    def __init__(self, fieldNames, stream):
+        """
+        Args:
+            fieldNames: 表头
+            stream: 已打开的文件，由调用者关闭，词法分析和语法分析可以写入同一个文件
+        """
+        self.stream = stream
+        self.stream.write("\t".join(fieldNames) + "\n")
+
+    def record(self, row):
+        self.stream.write("\t".join(str(value) for value in row) + "\n")
+
+    def close(self):
+        self.stream.flush()
+
+
+def makeSink(kind, fieldNames, stream=None, size=100):
+    """
+    按命令行参数创建记录分析过程的对象
+
+    Args:
+        kind: TRACE_KINDS之一
+        fieldNames: 表头
+        stream: kind为file时写入的文件
+        size: kind为ring时保留的记录数
+
+    Returns:
+        记录分析过程的对象，kind为none时返回None
+    """
+    if kind == "table":
+        return TableSink(fieldNames)
+    if kind == "ring":
+        return RingSink(fieldNames, size)
+    if kind == "file":
+        return FileSink(fieldNames, stream)
+    return None
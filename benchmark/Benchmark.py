@@ -0,0 +1,245 @@
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from optparse import OptionParser
+
+import prettytable as pt
+
+from LexicalAnalyze import LAZY_CACHE_SIZE, LexicalAnalyze
+from SyntaxAnalyzer import SyntaxAnalyzer
+from benchmark.SentenceGenerator import SentenceGenerator
+from benchmark.SyntheticGrammar import writeGrammars
+
+EXAMPLE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "example", "synthesis_test")
+# 指标名到 是否越大越好 的映射，与基线比较时决定变化的方向
+METRICS = {
+    "lexicalBuildSeconds": False,
+    "lazyBuildSeconds": False,
+    "syntaxBuildSeconds": False,
+    "lexMBps": True,
+    "lazyLexMBps": True,
+    "parseTokensPerSecond": True,
+    "lexPeakBytes": False,
+    "parsePeakBytes": False,
+}
+
+
+class Benchmark:
+    """
+    词法分析和语法分析的性能测试
+
+    每个负载由一对文法和按二型文法生成的源程序组成，分别测量词法DFA构建时间、LR(1)分析表构建时间、
+    词法分析速度 (MB/s)、语法分析速度 (token/s) 和词法分析、语法分析的内存峰值；
+    词法DFA的构建时间和词法分析速度另外用惰性DFA测量一次。
+    计时取repeat次中最快的一次，内存峰值用tracemalloc单独测量，不影响计时。
+
+    Attributes:
+        tokenCount: 生成的源程序的token数
+        repeat: 每项计时的重复次数
+        seed: 生成源程序的随机数种子
+        workDir: 存放合成文法和生成的源程序的临时目录
+    """
+    tokenCount = 100000
+    repeat = 3
+    seed = 0
+    workDir = None
+
+    def __init__(self, tokenCount=100000, repeat=3, seed=0):
+        self.tokenCount = tokenCount
+        self.repeat = repeat
+        self.seed = seed
+
+    def workloads(self, scales):
+        """
+        Returns:
+            [(负载名, 三型文法文件, 二型文法文件)]，t2为example/synthesis_test中的文法，
+            syntheticN为规模为N的合成文法
+        """
+        result = [("t2", os.path.join(EXAMPLE_DIR, "t3.json"), os.path.join(EXAMPLE_DIR, "t2.json"))]
+        for scale in scales:
+            lexicalFile, syntaxFile = writeGrammars(scale, self.workDir)
+            result.append(("synthetic%d" % scale, lexicalFile, syntaxFile))
+        return result
+
+    def __best(self, function):
+        """
+        Returns:
+            (repeat次中最短的用时, 最后一次的返回值)
+        """
+        best = None
+        for i in range(self.repeat):
+            start = time.perf_counter()
+            value = function()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, value
+
+    def __lexableTerminals(self, LA, SA):
+        """
+        二型文法中的终结符不一定都在三型文法中有定义，逐个做词法分析，
+        找出能被识别为单个token的终结符，标识符和常量由SentenceGenerator生成合法的单词
+
+        Returns:
+            可以用于生成源程序的终结符集合
+        """
+        terminals = {"<identifier>", "<constant>"}
+        wordFile = os.path.join(self.workDir, "word.txt")
+        for terminal in SA.terminals:
+            if terminal in terminals or terminal == "<#>":
+                continue
+            with open(wordFile, "w") as f:
+                f.write(terminal)
+            with contextlib.redirect_stdout(io.StringIO()):
+                LA.analyze(wordFile)
+            if LA.error is None and len(LA.TokenStream) == 1 and LA.TokenStream.text(0) == terminal:
+                terminals.add(terminal)
+        return terminals
+
+    def measure(self, lexicalFile, syntaxFile):
+        """
+        测量一个负载，分析过程中的输出全部丢弃
+
+        Returns:
+            {指标名: 值}，指标见METRICS，另有文法和源程序的规模
+        """
+        with contextlib.redirect_stdout(io.StringIO()):
+            lexicalBuild, LA = self.__best(lambda: LexicalAnalyze(lexicalFile, None, True))
+            syntaxBuild, SA = self.__best(lambda: SyntaxAnalyzer(syntaxFile, None, "lr1"))
+            lazyBuild, lazyLA = self.__best(lambda: LexicalAnalyze(lexicalFile, None, True, None, False,
+                                                                   LAZY_CACHE_SIZE))
+        codeFile = os.path.join(self.workDir, "code.txt")
+        with open(codeFile, "w") as f:
+            generator = SentenceGenerator(syntaxFile, terminals=self.__lexableTerminals(LA, SA))
+            f.write(generator.source(self.tokenCount, self.seed))
+        sourceBytes = os.path.getsize(codeFile)
+        with contextlib.redirect_stdout(io.StringIO()):
+            lexSeconds, _ = self.__best(lambda: LA.analyze(codeFile))
+            lazyLexSeconds, _ = self.__best(lambda: lazyLA.analyze(codeFile))
+        tokens = LA.TokenStream
+        if LA.error is not None:
+            print("生成的源程序词法分析失败: %s" % syntaxFile, file=sys.stderr)
+        parseSeconds, result = self.__best(lambda: SA.parse(tokens))
+        if not result["accepted"]:
+            print("生成的源程序语法分析失败: %s" % syntaxFile, file=sys.stderr)
+        # 内存峰值单独测量，tracemalloc会拖慢分析过程
+        tracemalloc.start()
+        with contextlib.redirect_stdout(io.StringIO()):
+            LA.analyze(codeFile)
+        lexPeak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        SA.parse(LA.TokenStream)
+        parsePeak = tracemalloc.get_traced_memory()[1] - base
+        tracemalloc.stop()
+        return {
+            "lexicalStates": len(LA.DFA),
+            "syntaxStates": len(SA.DFA),
+            "productions": len(SA.productions),
+            "sourceBytes": sourceBytes,
+            "tokens": len(tokens),
+            "lexicalBuildSeconds": lexicalBuild,
+            "syntaxBuildSeconds": syntaxBuild,
+            "lexMBps": sourceBytes / lexSeconds / 1e6,
+            "lazyBuildSeconds": lazyBuild,
+            "lazyLexMBps": sourceBytes / lazyLexSeconds / 1e6,
+            "lazyStates": len(lazyLA.DFA),
+            "parseTokensPerSecond": len(tokens) / parseSeconds,
+            "lexPeakBytes": lexPeak,
+            "parsePeakBytes": parsePeak,
+        }
+
+    def run(self, scales):
+        """
+        Returns:
+            测试结果 {"meta": 运行环境和参数, "workloads": {负载名: measure的结果}}
+        """
+        results = dict()
+        with tempfile.TemporaryDirectory() as self.workDir:
+            for name, lexicalFile, syntaxFile in self.workloads(scales):
+                print("测试负载: " + name, file=sys.stderr)
+                results[name] = self.measure(lexicalFile, syntaxFile)
+        self.workDir = None
+        return {
+            "meta": {"python": platform.python_version(), "platform": platform.platform(),
+                     "tokens": self.tokenCount, "repeat": self.repeat, "seed": self.seed},
+            "workloads": results,
+        }
+
+    def compare(self, current, baseline, threshold):
+        """
+        与基线比较，打印每项指标的变化
+
+        Args:
+            threshold: 变差超过这个比例即视为退化
+
+        Returns:
+            是否有指标退化
+        """
+        for key in ("tokens", "seed"):
+            if baseline.get("meta", {}).get(key) != current["meta"][key]:
+                print("基线的 %s 与本次不同，比较结果仅供参考" % key, file=sys.stderr)
+        tb = pt.PrettyTable()
+        tb.field_names = ["负载", "指标", "基线", "本次", "变化"]
+        regressed = False
+        for name, metrics in current["workloads"].items():
+            if name not in baseline.get("workloads", {}):
+                continue
+            for metric, higherIsBetter in METRICS.items():
+                old = baseline["workloads"][name].get(metric)
+                new = metrics.get(metric)
+                if not old or new is None:
+                    continue
+                change = new / old - 1
+                worse = -change if higherIsBetter else change
+                mark = ""
+                if worse > threshold:
+                    mark = " 退化"
+                    regressed = True
+                tb.add_row([name, metric, "%.4g" % old, "%.4g" % new, "%+.1f%%%s" % (change * 100, mark)])
+        print(tb)
+        return regressed
+
+
+def main():
+    argsParser = OptionParser(usage="python -m benchmark [options]")
+    argsParser.add_option("--tokens", dest="tokens", type="int", default=100000,
+                          help="生成的源程序的token数，默认100000", metavar="N")
+    argsParser.add_option("--scales", dest="scales", default="1,4,16",
+                          help="合成文法的规模，以逗号分隔，默认1,4,16", metavar="list")
+    argsParser.add_option("--repeat", dest="repeat", type="int", default=3,
+                          help="每项计时的重复次数，取最快的一次，默认3", metavar="N")
+    argsParser.add_option("--seed", dest="seed", type="int", default=0, help="生成源程序的随机数种子，默认0",
+                          metavar="N")
+    argsParser.add_option("--output", dest="output", help="测试结果写入的json文件，不指定时打印到标准输出",
+                          metavar="filename")
+    argsParser.add_option("--baseline", dest="baseline", help="与之比较的基线json文件", metavar="filename")
+    argsParser.add_option("--threshold", dest="threshold", type="float", default=0.2,
+                          help="与基线比较时视为退化的比例，默认0.2", metavar="ratio")
+    (options, args) = argsParser.parse_args()
+    scales = [int(scale) for scale in options.scales.split(",") if scale.strip()]
+    benchmark = Benchmark(options.tokens, options.repeat, options.seed)
+    current = benchmark.run(scales)
+    if options.output is not None:
+        with open(options.output, "w", encoding="utf-8") as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(current, ensure_ascii=False, indent=2))
+    if options.baseline is not None:
+        try:
+            baseline = json.load(open(options.baseline, "r", encoding="utf-8"))
+        except Exception as e:
+            print("基线文件打开失败")
+            return 2
+        if benchmark.compare(current, baseline, options.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+import json
+import random
+
+# 生成的源代码中每行的token数
+TOKENS_PER_LINE = 12
+
+
+class SentenceGenerator:
+    """
+    按二型文法随机生成句子，用作词法分析和语法分析的测试负载
+
+    从开始符号做最左推导，用显式栈展开，不受递归深度限制。推导中遇到的第一个
+    "自嵌套的列表" (形如 A -> x A 且x能推导出含A的串，如语句串) 作为主干，一直展开到token数达到预算；
+    其余列表按概率展开，非列表的嵌套超过maxDepth层后只选最短的产生式。
+    token数达到预算后所有非终结符都只选最短的产生式，句子很快收尾。
+
+    Attributes:
+        productions: {非终结符: [右部符号列表]}，只含能推导出终结符串的产生式
+        nonterminals: 文法中的非终结符集合
+        start: 开始符号
+        minLength: minLength[非终结符] 为它能推导出的最短终结符串的长度
+        minProduction: minProduction[非终结符] 为推导出最短串时使用的右部
+        listProductions: {列表非终结符: [右部以自身结尾的右部]}
+        embedded: 自嵌套的列表非终结符集合
+        maxDepth: 非列表嵌套的最大层数
+        listProbability: 非主干列表继续展开的概率
+    """
+    productions = None
+    nonterminals = None
+    start = None
+    minLength = None
+    minProduction = None
+    listProductions = None
+    embedded = None
+    maxDepth = 8
+    listProbability = 0.5
+
+    def __init__(self, productionFile, maxDepth=8, listProbability=0.5, terminals=None):
+        """
+        Args:
+            productionFile: 二型文法文件，格式同SyntaxAnalyzer
+            terminals: 可以使用的终结符，为None时不限制；右部含有其他终结符的产生式不参与生成，
+                用于避开词法文法中没有定义的单词
+        """
+        self.maxDepth = maxDepth
+        self.listProbability = listProbability
+        self.productions = dict()
+        contents = [eachProduction for eachProductionCFG in json.load(open(productionFile, "r", encoding="utf-8"))
+                    for eachProduction in eachProductionCFG['contents']]
+        self.nonterminals = set(eachProduction['left'] for eachProduction in contents)
+        for eachProduction in contents:
+            right = [i for i in eachProduction['right'].split(" ") if len(i) != 0 and i != "<#>"]
+            if self.start is None:
+                self.start = eachProduction['left']
+            if terminals is not None and \
+                    any(symbol not in self.nonterminals and symbol not in terminals for symbol in right):
+                continue
+            self.productions.setdefault(eachProduction['left'], []).append(right)
+        self.__getMinLength()
+        self.__getLists()
+
+    def __getMinLength(self):
+        """
+        不动点迭代求每个非终结符的最短推导，只在严格变短时更新minProduction，
+        沿minProduction展开一定能结束；最后去掉含有推导不出终结符串的非终结符的产生式
+        """
+        self.minLength = dict()
+        self.minProduction = dict()
+        changed = True
+        while changed:
+            changed = False
+            for left, rights in self.productions.items():
+                for right in rights:
+                    if any(symbol in self.nonterminals and symbol not in self.minLength for symbol in right):
+                        continue
+                    length = sum(self.minLength.get(symbol, 1) for symbol in right)
+                    if left not in self.minLength or length < self.minLength[left]:
+                        self.minLength[left] = length
+                        self.minProduction[left] = right
+                        changed = True
+        self.productions = {left: [right for right in rights
+                                   if all(symbol not in self.nonterminals or symbol in self.minLength
+                                          for symbol in right)]
+                            for left, rights in self.productions.items() if left in self.minLength}
+
+    def __getLists(self):
+        """
+        找出列表非终结符和其中自嵌套的部分
+        """
+        reach = {left: set(symbol for right in rights for symbol in right if symbol in self.productions)
+                 for left, rights in self.productions.items()}
+        changed = True
+        while changed:
+            changed = False
+            for left in reach:
+                extended = reach[left].union(*[reach[symbol] for symbol in reach[left]])
+                if len(extended) != len(reach[left]):
+                    reach[left] = extended
+                    changed = True
+        self.listProductions = dict()
+        self.embedded = set()
+        for left, rights in self.productions.items():
+            for right in rights:
+                if right and right[-1] == left:
+                    self.listProductions.setdefault(left, []).append(right)
+                    if any(symbol in self.productions and left in reach[symbol] for symbol in right[:-1]):
+                        self.embedded.add(left)
+
+    def terminal(self, symbol, rng):
+        """
+        终结符的具体单词，标识符和常量随机生成，其余终结符即单词本身
+        """
+        if symbol == "<identifier>":
+            return "v%d" % rng.randrange(100)
+        if symbol == "<constant>":
+            return str(rng.randrange(1000)) if rng.random() < 0.8 else "%d.%d" % (rng.randrange(100), rng.randrange(10))
+        return symbol
+
+    def generate(self, tokenCount, seed=0):
+        """
+        生成一个token数约为tokenCount的句子
+
+        Returns:
+            单词列表
+        """
+        rng = random.Random(seed)
+        words = list()
+        stack = [(self.start, 0, False)]  # (符号, 嵌套层数, 是否为主干)
+        pending = self.minLength[self.start]  # 栈中符号最短推导的总长度
+        backbone = False
+        while stack:
+            symbol, depth, isBackbone = stack.pop()
+            if symbol not in self.nonterminals:
+                words.append(self.terminal(symbol, rng))
+                pending -= 1
+                continue
+            pending -= self.minLength[symbol]
+            rights = self.productions[symbol]
+            if len(words) + pending >= tokenCount:
+                right = self.minProduction[symbol]
+            elif symbol in self.listProductions and (isBackbone or symbol in self.embedded and not backbone):
+                backbone = isBackbone = True
+                right = rng.choice(self.listProductions[symbol])
+            elif symbol in self.listProductions and depth < self.maxDepth:
+                right = rng.choice(self.listProductions[symbol]) if rng.random() < self.listProbability else \
+                    self.minProduction[symbol]
+            elif depth < self.maxDepth:
+                right = rng.choice(rights)
+            else:
+                right = self.minProduction[symbol]
+            for i in range(len(right) - 1, -1, -1):
+                if right[i] == symbol and i == len(right) - 1:
+                    # 列表的尾部不算一层嵌套，主干的尾部仍是主干
+                    stack.append((symbol, depth, isBackbone))
+                else:
+                    stack.append((right[i], depth + 1, False))
+                pending += self.minLength.get(right[i], 1)
+        return words
+
+    def source(self, tokenCount, seed=0):
+        """
+        Returns:
+            生成的源代码，单词之间以空格分隔，每行TOKENS_PER_LINE个单词
+        """
+        words = self.generate(tokenCount, seed)
+        return "\n".join(" ".join(words[i:i + TOKENS_PER_LINE]) for i in range(0, len(words), TOKENS_PER_LINE)) + "\n"
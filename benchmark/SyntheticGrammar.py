@@ -0,0 +1,127 @@
+import json
+import os
+
+# 运算符使用的字符，不含赋值用的 = 和分隔符
+OPERATOR_CHARS = "+-*/%&|^<>!~?@#$"
+# 关键字由音节拼成，关键字越多，词法DFA中关键字的前缀树越大
+KEYWORD_SYLLABLES = ["ta", "ro", "mi", "ke", "su", "no", "ha", "li"]
+
+
+def keywordName(i):
+    """
+    第i个关键字，k后接至少三个音节，与SentenceGenerator生成的标识符 v数字 不会重复
+    """
+    name = ""
+    for j in range(3):
+        i, rest = divmod(i, len(KEYWORD_SYLLABLES))
+        name += KEYWORD_SYLLABLES[rest]
+    while i > 0:
+        i, rest = divmod(i, len(KEYWORD_SYLLABLES))
+        name += KEYWORD_SYLLABLES[rest]
+    return "k" + name
+
+
+def operatorName(i):
+    """
+    第i个运算符，先用单个字符，用完后用两个字符的组合
+    """
+    if i < len(OPERATOR_CHARS):
+        return OPERATOR_CHARS[i]
+    i -= len(OPERATOR_CHARS)
+    return OPERATOR_CHARS[i // len(OPERATOR_CHARS)] + OPERATOR_CHARS[i % len(OPERATOR_CHARS)]
+
+
+def wordProductions(word):
+    """
+    识别一个固定单词的三型文法产生式
+    """
+    states = [chr(ord("A") + i) for i in range(len(word))]
+    return [states[i] + "-><" + word[i] + ">" + (states[i + 1] if i + 1 < len(word) else "")
+            for i in range(len(word))]
+
+
+def grammarSize(scale):
+    """
+    Returns:
+        (语句种数, 运算符优先级层数, 每层的运算符数)
+    """
+    return 4 * scale, 2 + scale, 2
+
+
+def lexicalGrammar(scale):
+    """
+    规模为scale的三型文法，关键字和运算符的数量随scale增长
+
+    Returns:
+        格式同example/synthesis_test/t3.json
+    """
+    statementCount, levelCount, operatorCount = grammarSize(scale)
+    keywords = [{"description": keywordName(i), "production": wordProductions(keywordName(i))}
+                for i in range(statementCount)]
+    identifiers = [{"description": "identifier",
+                    "production": ["A-><letter>B", "A-><_>B", "B-><letter>B", "B-><digit>B", "B-><_>B",
+                                   "B-><empty>"]}]
+    constants = [{"description": "numbers",
+                  "production": ["A-><digit>B", "B-><digit>B", "B-><.>C", "B-><empty>", "C-><digit>D",
+                                 "D-><digit>D", "D-><empty>"]}]
+    operators = [{"description": "=", "production": ["A-><=>"]}]
+    operators += [{"description": operatorName(i), "production": wordProductions(operatorName(i))}
+                  for i in range(levelCount * operatorCount)]
+    delimiters = [{"description": word, "production": wordProductions(word)} for word in "(){};"]
+    return [{"type": "keyword", "contents": keywords},
+            {"type": "identifier", "contents": identifiers},
+            {"type": "constant", "contents": constants},
+            {"type": "operator", "contents": operators},
+            {"type": "delimiter", "contents": delimiters}]
+
+
+def syntaxGrammar(scale):
+    """
+    规模为scale的二型文法，语句种数和运算符优先级层数随scale增长，文法是LR(1)的
+
+    偶数号语句为 关键字 标识符 = 表达式 ;，奇数号语句为 关键字 ( 表达式 ) { 语句串 }，
+    每层表达式都是左递归的二元运算
+
+    Returns:
+        格式同example/synthesis_test/t2.json
+    """
+    statementCount, levelCount, operatorCount = grammarSize(scale)
+    grammar = [{"description": "CODE", "contents": [{"left": "<CODE>", "right": "<语句串>"}]},
+               {"description": "语句串", "contents": [{"left": "<语句串>", "right": "<语句> <语句串>"},
+                                                   {"left": "<语句串>", "right": "<#>"}]}]
+    statements = list()
+    for i in range(statementCount):
+        if i % 2 == 0:
+            right = "%s <identifier> = <表达式0> ;" % keywordName(i)
+        else:
+            right = "%s ( <表达式0> ) { <语句串> }" % keywordName(i)
+        statements.append({"left": "<语句>", "right": right})
+    grammar.append({"description": "语句", "contents": statements})
+    for level in range(levelCount):
+        left = "<表达式%d>" % level
+        right = "<表达式%d>" % (level + 1)
+        contents = [{"left": left, "right": "%s %s %s" % (left, operatorName(level * operatorCount + i), right)}
+                    for i in range(operatorCount)]
+        contents.append({"left": left, "right": right})
+        grammar.append({"description": "表达式%d" % level, "contents": contents})
+    grammar.append({"description": "因式", "contents": [
+        {"left": "<表达式%d>" % levelCount, "right": "( <表达式0> )"},
+        {"left": "<表达式%d>" % levelCount, "right": "<identifier>"},
+        {"left": "<表达式%d>" % levelCount, "right": "<constant>"}]})
+    return grammar
+
+
+def writeGrammars(scale, directory):
+    """
+    把规模为scale的文法写入directory
+
+    Returns:
+        (三型文法文件, 二型文法文件)
+    """
+    lexicalFile = os.path.join(directory, "synthetic%d_t3.json" % scale)
+    syntaxFile = os.path.join(directory, "synthetic%d_t2.json" % scale)
+    with open(lexicalFile, "w", encoding="utf-8") as f:
+        json.dump(lexicalGrammar(scale), f, ensure_ascii=False, indent=4)
+    with open(syntaxFile, "w", encoding="utf-8") as f:
+        json.dump(syntaxGrammar(scale), f, ensure_ascii=False, indent=4)
+    return lexicalFile, syntaxFile
@@ -0,0 +1,5 @@
+import sys
+
+from benchmark.Benchmark import main
+
+sys.exit(main())
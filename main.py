@@ -1,45 +1,155 @@
 from LexicalAnalyze import *
 from SyntaxAnalyzer import *
+from GrammarCache import GrammarCache
+from BatchCompile import BatchCompile
+from ModuleEmitter import ModuleEmitter
+from TraceSink import TRACE_KINDS, makeSink
+from Stats import STATS_KINDS, Stats, measure
 from optparse import OptionParser
 
 
 def main():
-    argsParser = OptionParser()
+    argsParser = OptionParser(usage="%prog [options] [源文件或目录 ...]")
     argsParser.add_option("-l", "--LexicalFile", dest="lexical", help="用于词法分析的三型文法", metavar="filename")
     argsParser.add_option("-p", "--PlaintextFile", dest="plain", help="进行词法分析的源文件", metavar="filename")
     argsParser.add_option("-s", "--SyntaxFile", dest="syntax", help="用于语法分析的二型文法", metavar="filename")
     argsParser.add_option("--PrintLexicalNFA", dest="lnfa", help="打印词法NFA，参数为keyword，identifier，\n"
-                                                                 "constant，operator，delimiter", metavar="type")
+                                                                 "constant，operator，delimiter，all为合并后的NFA",
+                          metavar="type")
     argsParser.add_option("--PrintLexicalDFA", dest="ldfa", help="打印词法DFA，参数同上", metavar="type")
     argsParser.add_option("--PrintSyntaxDFA", action="store_false", dest="sdfa", help="打印语法DFA")
     argsParser.add_option("--PrintSyntaxTab", action="store_false", dest="stab", help="打印语法分析表")
+    argsParser.add_option("--PrintSyntaxTree", action="store_true", dest="stree", default=False,
+                          help="打印语法树，不能与--Stream一起使用")
+    argsParser.add_option("--ASTShape", dest="astshape", help="构建抽象语法树的规则文件，与--PrintSyntaxTree一起使用",
+                          metavar="filename")
+    argsParser.add_option("--Trace", dest="trace", type="choice", choices=TRACE_KINDS, default="table",
+                          help="分析过程的记录方式，none不记录，table打印完整的表格，ring只打印最后若干条，"
+                               "file逐行写入--TraceFile，默认table", metavar="kind")
+    argsParser.add_option("--TraceFile", dest="tracefile", default="trace.txt",
+                          help="--Trace file时写入的文件，默认trace.txt", metavar="filename")
+    argsParser.add_option("--TraceSize", dest="tracesize", type="int", default=100,
+                          help="--Trace ring时保留的记录数，默认100", metavar="N")
+    argsParser.add_option("--NoMinimize", action="store_false", dest="minimize", default=True,
+                          help="不对词法DFA做最小化")
+    argsParser.add_option("--ReservedWords", action="store_true", dest="reserved", default=False,
+                          help="关键字不进入词法DFA，按标识符等类型识别后查保留字表")
+    argsParser.add_option("--LazyDFA", action="store_true", dest="lazy", default=False,
+                          help="词法DFA的状态在分析时按需构建，不做最小化，--EmitModule时无效")
+    argsParser.add_option("--LazyCacheSize", dest="lazycachesize", type="int", default=LAZY_CACHE_SIZE,
+                          help="--LazyDFA时最多缓存的DFA状态数，超过时清空重建，默认%d" % LAZY_CACHE_SIZE,
+                          metavar="N")
+    argsParser.add_option("--algorithm", dest="algorithm", type="choice", choices=["lr1", "lalr"], default="lr1",
+                          help="语法分析表构建算法，lr1或lalr，默认lr1", metavar="name")
+    argsParser.add_option("--NoCache", action="store_true", dest="nocache", default=False,
+                          help="不使用文法缓存，每次重新构建DFA和分析表")
+    argsParser.add_option("--Stream", action="store_true", dest="stream", default=False,
+                          help="词法分析与语法分析流水线进行，不保存完整的token序列")
+    argsParser.add_option("--jobs", dest="jobs", type="int", default=None,
+                          help="批量分析时的进程数，默认为CPU核数", metavar="N")
+    argsParser.add_option("--EmitModule", dest="emitmodule",
+                          help="把词法DFA和语法分析表导出为独立的Python模块，需要同时指定 -l 和 -s", metavar="filename")
+    argsParser.add_option("--ClearCache", action="store_true", dest="clearcache", default=False,
+                          help="清空文法缓存")
+    argsParser.add_option("--Stats", dest="stats", type="choice", choices=STATS_KINDS,
+                          help="分析结束后打印各阶段的耗时、内存峰值和计数，text为表格，json为json格式",
+                          metavar="kind")
     (options, args) = argsParser.parse_args()
+    stats = Stats() if options.stats is not None else None
+    run(argsParser, options, args, stats)
+    if stats is not None:
+        print(stats.report(options.stats))
+
+
+def run(argsParser, options, args, stats):
+    cache = GrammarCache()
+    if options.clearcache:
+        cache.clear()
+        if options.lexical is None and options.syntax is None:
+            return
+    if options.nocache:
+        cache = None
+    if options.emitmodule is not None:
+        if options.lexical is None or options.syntax is None:
+            print("生成模块需要同时指定 -l 和 -s")
+            return
+        LA = LexicalAnalyze(options.lexical, cache, options.minimize, stats, options.reserved)
+        SA = SyntaxAnalyzer(options.syntax, cache, options.algorithm, stats)
+        with measure(stats, "emit"):
+            ModuleEmitter(LA, SA).emit(options.emitmodule)
+        return
+    if args:
+        # 批量分析，位置参数为源文件或目录
+        if options.lexical is None or options.syntax is None:
+            print("批量分析需要同时指定 -l 和 -s")
+            return
+        LA = LexicalAnalyze(options.lexical, cache, options.minimize, stats, options.reserved,
+                            options.lazycachesize if options.lazy else None)
+        SA = SyntaxAnalyzer(options.syntax, cache, options.algorithm, stats)
+        # 工作进程中的计数无法汇总，批量分析只统计文法构建和总耗时
+        LA.stats = SA.stats = None
+        if stats is not None:
+            stats.stopTracing()
+        batch = BatchCompile(LA, SA, options.jobs)
+        with measure(stats, "batch.run"):
+            results = batch.run(args)
+        print(batch.summary(results))
+        return
+    if options.stream and options.stree:
+        print("--PrintSyntaxTree 需要完整的token序列，不能与 --Stream 同时使用")
+        return
+    traceFile = None
+    if options.trace == "file":
+        traceFile = open(options.tracefile, "w", encoding="utf-8")
+    try:
+        analyze(argsParser, options, cache, traceFile, stats)
+    finally:
+        if traceFile is not None:
+            traceFile.close()
+
+
+def analyze(argsParser, options, cache, traceFile, stats):
     LA = None
     if options.lexical is not None:
-        LA = LexicalAnalyze(options.lexical)
-        if options.plain is not None:
-            LA.analyze(options.plain)
-            LA.show()
+        LA = LexicalAnalyze(options.lexical, cache, options.minimize, stats, options.reserved,
+                            options.lazycachesize if options.lazy else None)
+        if options.plain is not None and not (options.stream and options.syntax is not None):
+            LA.analyze(options.plain, makeSink(options.trace, LEXICAL_TRACE_FIELDS, traceFile, options.tracesize))
         if options.lnfa is not None:
-            if options.lnfa not in LA.NFAs.keys():
+            NFA = LA.getNFA(options.lnfa)
+            if NFA is None:
                 print("该NFA类型不存在：", options.lnfa)
             else:
-                LA.viewXFA(LA.NFAs[options.lnfa], options.lnfa + "_NFA", "NFA")
+                LA.viewXFA(NFA, options.lnfa + "_NFA", "NFA")
         if options.ldfa is not None:
-            if options.ldfa not in LA.DFAs.keys():
+            if options.ldfa != "all" and options.ldfa not in TOKEN_TYPES:
                 print("该DFA类型不存在：", options.ldfa)
             else:
-                LA.viewXFA(LA.DFAs[options.ldfa], options.ldfa + "_DFA", "DFA")
+                LA.viewXFA(LA.getClassDFA(options.ldfa), options.ldfa + "_DFA", "DFA")
         if options.syntax is None:
             return
     if options.syntax is not None:
-        SA = SyntaxAnalyzer(options.syntax)
+        SA = SyntaxAnalyzer(options.syntax, cache, options.algorithm, stats)
         if options.sdfa is not None:
             SA.showDFA()
         if options.stab is not None:
             SA.printTable()
-        if LA is not None and len(LA.TokenStream) != 0:
-            SA.analyze(LA.TokenStream)
+        if LA is not None and options.plain is not None and options.stream:
+            SA.analyze(LA.tokens(options.plain),
+                       makeSink(options.trace, SYNTAX_TRACE_FIELDS, traceFile, options.tracesize))
+        elif LA is not None and LA.TokenStream:
+            shape = None
+            if options.stree and options.astshape is not None:
+                try:
+                    shape = json.load(open(options.astshape, "r", encoding="utf-8"))
+                except Exception as e:
+                    print("语法树规则文件打开失败")
+                    return
+            # 语法树与报告错误在同一遍分析中构建
+            SA.analyze(LA.TokenStream, makeSink(options.trace, SYNTAX_TRACE_FIELDS, traceFile, options.tracesize),
+                       options.stree, shape)
+            if SA.tree is not None:
+                SA.tree.show(LA.TokenStream)
         return
     argsParser.print_help()
 